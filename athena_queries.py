@@ -0,0 +1,106 @@
+import os
+import time
+from collections import deque
+
+# ============================
+# Athena Query Runner
+# ============================
+# Runs many Athena queries at once: up to ATHENA_MAX_CONCURRENCY executions are in flight, all of
+# them polled with one batch_get_query_execution call per round, and rounds are spaced with
+# exponential backoff (back to the initial delay whenever a query finishes). Results are yielded as
+# the queries finish. The Athena client is passed in, so a session client, a plain boto3 client or a
+# local fake all work.
+ATHENA_MAX_CONCURRENCY = int(os.getenv('ATHENA_MAX_CONCURRENCY', '5'))
+POLL_INITIAL_SECONDS = float(os.getenv('ATHENA_POLL_INITIAL_SECONDS', '0.25'))
+POLL_MAX_SECONDS = float(os.getenv('ATHENA_POLL_MAX_SECONDS', '5'))
+TERMINAL_STATES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+# Most ids batch_get_query_execution takes per call
+BATCH_GET_LIMIT = 50
+
+class AthenaQueryRunner:
+    """Submit Athena queries under a concurrency limit and collect their results."""
+
+    def __init__(self, athena_client, output_location=None, workgroup=None, max_concurrency=ATHENA_MAX_CONCURRENCY,
+                 initial_delay=POLL_INITIAL_SECONDS, max_delay=POLL_MAX_SECONDS, sleep=time.sleep):
+        self.athena_client = athena_client
+        self.output_location = output_location
+        self.workgroup = workgroup
+        self.max_concurrency = max(1, max_concurrency)
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+    def run(self, queries, database=None):
+        """Yield (key, result) as each query finishes. queries is {key: sql} or a list (keys are the indexes).
+
+        Polling happens between yields, so a slow consumer delays the next round but never loses a result.
+        """
+        pending = deque(queries.items() if isinstance(queries, dict) else enumerate(queries))
+        in_flight = {}
+        delay = self.initial_delay
+        while pending or in_flight:
+            while pending and len(in_flight) < self.max_concurrency:
+                key, query = pending.popleft()
+                in_flight[self._start(query, database)] = key
+            self.sleep(delay)
+
+            finished = self._finished(list(in_flight))
+            for execution in finished:
+                key = in_flight.pop(execution['QueryExecutionId'])
+                yield key, self._result(execution)
+            delay = self.initial_delay if finished else min(delay * 2, self.max_delay)
+
+    def run_one(self, query, database=None):
+        """Run a single query and return its result."""
+        for _, result in self.run([query], database):
+            return result
+
+    def _start(self, query, database):
+        request = {'QueryString': query}
+        if database:
+            request['QueryExecutionContext'] = {'Database': database}
+        if self.output_location:
+            request['ResultConfiguration'] = {'OutputLocation': self.output_location}
+        if self.workgroup:
+            request['WorkGroup'] = self.workgroup
+        return self.athena_client.start_query_execution(**request)['QueryExecutionId']
+
+    def _finished(self, execution_ids):
+        # Ids Athena leaves unprocessed are simply polled again next round
+        finished = []
+        for start in range(0, len(execution_ids), BATCH_GET_LIMIT):
+            response = self.athena_client.batch_get_query_execution(
+                QueryExecutionIds=execution_ids[start:start + BATCH_GET_LIMIT]
+            )
+            finished += [
+                execution for execution in response.get('QueryExecutions', [])
+                if execution['Status']['State'] in TERMINAL_STATES
+            ]
+        return finished
+
+    def _result(self, execution):
+        status = execution['Status']
+        statistics = execution.get('Statistics', {})
+        result = {
+            'execution_id': execution['QueryExecutionId'],
+            'state': status['State'],
+            'reason': status.get('StateChangeReason'),
+            'data_scanned_bytes': statistics.get('DataScannedInBytes'),
+            'elapsed_ms': statistics.get('TotalExecutionTimeInMillis'),
+            'rows': [],
+        }
+        if status['State'] != 'SUCCEEDED':
+            return result
+
+        request = {'QueryExecutionId': result['execution_id']}
+        while True:
+            response = self.athena_client.get_query_results(**request)
+            result['rows'] += [[cell.get('VarCharValue') for cell in row['Data']] for row in response['ResultSet']['Rows']]
+            if not response.get('NextToken'):
+                return result
+            request['NextToken'] = response['NextToken']
+
+def result_records(result):
+    """Rows of a SELECT result as {column: value}; the first row holds the column names."""
+    header, *rows = result['rows']
+    return [dict(zip(header, row)) for row in rows]
@@ -1,71 +1,627 @@
+import argparse
 import csv
+import datetime
 import gzip
-import shutil
+import io
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import bigquery
 from google.oauth2 import service_account
- 
+
 # Path to your .json key file
-credentials_path = './credenciales.json'
- 
-# Load credentials
-credentials = service_account.Credentials.from_service_account_file(
-    credentials_path,
-)
- 
-# Create a BigQuery client using the credentials
-client = bigquery.Client(credentials=credentials)
-esquema='gestion_bancaria_data'
-tabla='CLIENTES'
-# Ejecutar la consulta
-query = f"SELECT * FROM `xyz.{esquema}.{tabla}`"
-query_job = client.query(query)
-print(query_job.result())
-# Guardar los resultados en un archivo CSV
-with open(f'part-00001-{esquema}_{tabla}.csv', 'w', newline='', encoding='utf-8') as csvfile:
-    csvwriter = csv.writer(csvfile, delimiter='¦')
-
-    # Escribir encabezados (nombres de columnas)
-    headers = [field.name for field in query_job.result().schema]
-    csvwriter.writerow(headers)
-
-    # Escribir filas de datos
-    for row in query_job.result():
-        csvwriter.writerow(row.values())
-
-# Comprimir el archivo CSV en formato gzip
-with open(f'part-00001-{esquema}_{tabla}.csv', 'rb') as f_in:
-    with gzip.open(f'part-00001-{esquema}_{tabla}.csv.gz', 'wb') as f_out:
-        shutil.copyfileobj(f_in, f_out)
-
-
--------------------------------------------------------------------------
+CREDENTIALS_PATH = os.getenv('BIGQUERY_CREDENTIALS_PATH', './credenciales.json')
+PROJECT = os.getenv('BIGQUERY_PROJECT', 'xyz')
+DELIMITER = '¦'
+# 1 = más rápido, 9 = más pequeño; 6 es el valor por defecto de gzip
+GZIP_COMPRESSION_LEVEL = int(os.getenv('GZIP_COMPRESSION_LEVEL', '6'))
+# Filas por página de resultados (una petición a la API por página)
+PAGE_SIZE = int(os.getenv('BIGQUERY_PAGE_SIZE', '50000'))
+# Storage Read API: streams requested per read session, workers draining them, and the size
+# (compressed, on disk) at which a stream's output rolls over to a new part file
+STORAGE_MAX_STREAMS = int(os.getenv('BIGQUERY_STORAGE_MAX_STREAMS', '8'))
+STORAGE_WORKERS = int(os.getenv('BIGQUERY_STORAGE_WORKERS', '8'))
+TARGET_FILE_BYTES = int(os.getenv('EXPORT_TARGET_FILE_MB', '256')) * 1024 ** 2
+# Arrow batches are buffered up to this size before becoming one parquet row group
+PARQUET_ROW_GROUP_BYTES = int(os.getenv('PARQUET_ROW_GROUP_MB', '64')) * 1024 ** 2
+# Incremental mode: per-table watermarks (local JSON file or s3:// URI) and the raw bucket layout
+# whose guay_jocker_db prefix and .parquet suffix fire the S3 -> FIFO queue lambda
+WATERMARK_CHECKPOINT = os.getenv('WATERMARK_CHECKPOINT', './watermarks.json')
+RAW_PREFIX = "guay_jocker_db"
+# Table schemas cached by last-modified time, and get_table calls in flight when refreshing it
+SCHEMA_CATALOG_PATH = os.getenv('SCHEMA_CATALOG_PATH', './schema_catalog.json')
+CATALOG_WORKERS = int(os.getenv('BIGQUERY_CATALOG_WORKERS', '16'))
 
 
-import csv
-import gzip
-import shutil
-from google.cloud import bigquery
-from google.oauth2 import service_account
- 
-# Path to your .json key file
-credentials_path = './credenciales.json'
- 
-# Load credentials
-credentials = service_account.Credentials.from_service_account_file(
-    credentials_path,
-)
- 
-# Create a BigQuery client using the credentials
-client = bigquery.Client(credentials=credentials)
-dataset_name='gestion_bancaria_data'
-table_name='xx'
- 
-# Get the table
-table_ref = client.dataset(dataset_name).table(table_name)
-table = client.get_table(table_ref)
- 
-# Print the schema
-for field in table.schema:
-    print(f'`{field.name.lower()}` {field.field_type.lower()},')
-
--------------------------------------------------------------
+def load_credentials(credentials_path=CREDENTIALS_PATH):
+    return service_account.Credentials.from_service_account_file(
+        credentials_path,
+    )
+
+
+def create_client(credentials_path=CREDENTIALS_PATH):
+    """Create a BigQuery client using the service account credentials."""
+    return bigquery.Client(credentials=load_credentials(credentials_path))
+
+
+# ============================
+# Export a query to CSV (gzip)
+# ============================
+# The result is read once, page by page, and each page goes straight through the csv writer
+# into the gzip stream: no uncompressed CSV on disk and no second pass to compress it.
+def export_query_to_csv_gz(client, query, output_path, compression_level=GZIP_COMPRESSION_LEVEL, page_size=PAGE_SIZE):
+    """Run a query and stream its rows into a gzip-compressed CSV. Returns the export stats."""
+    started = time.perf_counter()
+    rows = client.query(query).result(page_size=page_size)
+
+    row_count = 0
+    with open(output_path, 'wb') as raw_file, \
+            gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=compression_level) as gzip_file, \
+            io.TextIOWrapper(gzip_file, encoding='utf-8', newline='') as csvfile:
+        csvwriter = csv.writer(csvfile, delimiter=DELIMITER)
+
+        # Escribir encabezados (nombres de columnas)
+        csvwriter.writerow([field.name for field in rows.schema])
+
+        # Escribir filas de datos, página a página
+        for page in rows.pages:
+            page_rows = 0
+            for row in page:
+                csvwriter.writerow(row.values())
+                page_rows += 1
+            row_count += page_rows
+            elapsed = time.perf_counter() - started
+            print(f"📄 {row_count} filas ({row_count / elapsed:.0f} filas/s, {raw_file.tell()} bytes comprimidos)")
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        'output_path': output_path,
+        'rows': row_count,
+        'seconds': round(elapsed, 3),
+        'rows_per_s': round(row_count / elapsed, 1) if elapsed else None,
+        'bytes_written': os.path.getsize(output_path),
+    }
+    print(f"✅ {output_path}: {stats['rows']} filas en {stats['seconds']}s "
+          f"({stats['rows_per_s']} filas/s), {stats['bytes_written']} bytes")
+    return stats
+
+
+def export_table(client, esquema, tabla, compression_level=GZIP_COMPRESSION_LEVEL, page_size=PAGE_SIZE):
+    """Export a whole table to part-00001-{esquema}_{tabla}.csv.gz."""
+    query = f"SELECT * FROM `{PROJECT}.{esquema}.{tabla}`"
+    return export_query_to_csv_gz(client, query, f'part-00001-{esquema}_{tabla}.csv.gz', compression_level, page_size)
+
+
+# ============================
+# Sharded export through the Storage Read API
+# ============================
+# A read session splits the table into streams of Arrow record batches. Each stream is drained by
+# a worker into its own part files, rolled over at TARGET_FILE_BYTES, as ¦-delimited gzip CSV or
+# as Parquet (which the raw bucket's .parquet ingestion reads as is). Sources only need a schema,
+# streams() and read(stream), so ArrowTableSource stands in for BigQuery when trying this locally.
+class StorageReadSource:
+    """Streams of a BigQuery table from one Storage Read API session."""
+
+    def __init__(self, credentials, esquema, tabla, max_streams=STORAGE_MAX_STREAMS,
+                 selected_fields=None, row_restriction=None, project=PROJECT):
+        import pyarrow as pa
+        from google.cloud import bigquery_storage
+        from google.cloud.bigquery_storage import types
+
+        self.client = bigquery_storage.BigQueryReadClient(credentials=credentials)
+        requested_session = types.ReadSession(
+            table=f"projects/{project}/datasets/{esquema}/tables/{tabla}",
+            data_format=types.DataFormat.ARROW,
+            read_options=types.ReadSession.TableReadOptions(
+                selected_fields=selected_fields or [],
+                row_restriction=row_restriction or "",
+            ),
+        )
+        self.session = self.client.create_read_session(
+            parent=f"projects/{project}",
+            read_session=requested_session,
+            max_stream_count=max_streams,
+        )
+        self.schema = pa.ipc.read_schema(pa.py_buffer(self.session.arrow_schema.serialized_schema))
+
+    def streams(self):
+        # BigQuery may hand out fewer streams than requested (none for an empty table)
+        return list(self.session.streams)
+
+    def read(self, stream):
+        for page in self.client.read_rows(stream.name).rows(self.session).pages:
+            yield page.to_arrow()
+
+
+class ArrowTableSource:
+    """A local pyarrow Table (or .parquet file) split into contiguous streams, for runs without BigQuery."""
+
+    def __init__(self, table, max_streams=STORAGE_MAX_STREAMS, batch_rows=10000):
+        import pyarrow.parquet as pq
+
+        self.table = pq.read_table(table) if isinstance(table, str) else table
+        self.schema = self.table.schema
+        self.max_streams = max_streams
+        self.batch_rows = batch_rows
+
+    def streams(self):
+        rows_per_stream = -(-self.table.num_rows // self.max_streams) if self.table.num_rows else 0
+        return [
+            (offset, min(rows_per_stream, self.table.num_rows - offset))
+            for offset in range(0, self.table.num_rows, rows_per_stream or 1)
+        ]
+
+    def read(self, stream):
+        offset, length = stream
+        yield from self.table.slice(offset, length).to_batches(max_chunksize=self.batch_rows)
+
+
+class CsvGzipPartWriter:
+    """¦-delimited, gzip-compressed CSV part with a header row."""
+    extension = "csv.gz"
+
+    def __init__(self, path, schema, compression_level=GZIP_COMPRESSION_LEVEL):
+        self.raw_file = open(path, 'wb')
+        self.gzip_file = gzip.GzipFile(fileobj=self.raw_file, mode='wb', compresslevel=compression_level)
+        self.text_file = io.TextIOWrapper(self.gzip_file, encoding='utf-8', newline='')
+        self.csvwriter = csv.writer(self.text_file, delimiter=DELIMITER)
+        self.csvwriter.writerow(schema.names)
+
+    def write(self, batch):
+        # pyarrow's CSV writer only takes single-byte delimiters
+        self.csvwriter.writerows(zip(*(column.to_pylist() for column in batch.columns)))
+
+    def size(self):
+        return self.raw_file.tell()
+
+    def close(self):
+        self.text_file.close()
+        self.gzip_file.close()
+        self.raw_file.close()
+
+
+class ParquetPartWriter:
+    """Snappy Parquet part; batches are buffered into row groups of about PARQUET_ROW_GROUP_BYTES."""
+    extension = "parquet"
+
+    def __init__(self, path, schema, compression_level=None):
+        import pyarrow.parquet as pq
+
+        self.raw_file = open(path, 'wb')
+        self.writer = pq.ParquetWriter(self.raw_file, schema, compression='snappy')
+        self.buffer = []
+        self.buffered_bytes = 0
+
+    def _flush(self):
+        import pyarrow as pa
+
+        if self.buffer:
+            self.writer.write_table(pa.Table.from_batches(self.buffer))
+            self.buffer, self.buffered_bytes = [], 0
+
+    def write(self, batch):
+        self.buffer.append(batch)
+        self.buffered_bytes += batch.nbytes
+        if self.buffered_bytes >= PARQUET_ROW_GROUP_BYTES:
+            self._flush()
+
+    def size(self):
+        # Buffered batches count uncompressed, so a part rolls over a little early rather than late
+        return self.raw_file.tell() + self.buffered_bytes
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+        self.raw_file.close()
+
+
+PART_WRITERS = {"csv": CsvGzipPartWriter, "parquet": ParquetPartWriter}
+
+
+def export_streams(source, output_dir, esquema, tabla, output_format="parquet", workers=STORAGE_WORKERS,
+                   target_file_bytes=TARGET_FILE_BYTES, compression_level=GZIP_COMPRESSION_LEVEL):
+    """Drain every stream of a source into part-NNNNN-{esquema}_{tabla} files with a worker pool. Returns the export stats."""
+    writer_class = PART_WRITERS[output_format]
+    os.makedirs(output_dir, exist_ok=True)
+    part_numbers = itertools.count(1)
+    part_numbers_lock = threading.Lock()
+    started = time.perf_counter()
+
+    def new_part():
+        with part_numbers_lock:
+            part_number = next(part_numbers)
+        path = os.path.join(output_dir, f"part-{part_number:05d}-{esquema}_{tabla}.{writer_class.extension}")
+        return path, writer_class(path, source.schema, compression_level)
+
+    def drain(stream):
+        parts, rows = [], 0
+        path, writer = new_part()
+        for batch in source.read(stream):
+            if batch.num_rows == 0:
+                continue
+            if writer.size() >= target_file_bytes:
+                writer.close()
+                parts.append(path)
+                path, writer = new_part()
+            writer.write(batch)
+            rows += batch.num_rows
+        writer.close()
+        parts.append(path)
+        return parts, rows
+
+    streams = source.streams()
+    print(f"🔀 {len(streams)} stream(s) de {esquema}.{tabla} con {min(workers, len(streams) or 1)} worker(s)")
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(streams)))) as executor:
+        results = list(executor.map(drain, streams))
+
+    elapsed = time.perf_counter() - started
+    files = sorted(path for parts, _ in results for path in parts)
+    row_count = sum(rows for _, rows in results)
+    stats = {
+        'files': files,
+        'streams': len(streams),
+        'rows': row_count,
+        'seconds': round(elapsed, 3),
+        'rows_per_s': round(row_count / elapsed, 1) if elapsed else None,
+        'bytes_written': sum(os.path.getsize(path) for path in files),
+    }
+    print(f"✅ {len(files)} fichero(s) en {output_dir}: {stats['rows']} filas en {stats['seconds']}s "
+          f"({stats['rows_per_s']} filas/s), {stats['bytes_written']} bytes")
+    return stats
+
+
+def export_table_sharded(esquema, tabla, output_dir=".", output_format="parquet", max_streams=STORAGE_MAX_STREAMS,
+                         workers=STORAGE_WORKERS, target_file_bytes=TARGET_FILE_BYTES,
+                         compression_level=GZIP_COMPRESSION_LEVEL, credentials_path=CREDENTIALS_PATH, row_restriction=None):
+    """Export a table (or the rows matching row_restriction) through the Storage Read API."""
+    source = StorageReadSource(load_credentials(credentials_path), esquema, tabla, max_streams, row_restriction=row_restriction)
+    return export_streams(source, output_dir, esquema, tabla, output_format, workers, target_file_bytes, compression_level)
+
+
+# ============================
+# Incremental export from a watermark
+# ============================
+# Each run exports the rows whose watermark column (e.g. source_timestamp, the Hudi precombine
+# field) lies in (checkpoint - lookback, MAX(column)]. The upper bound is read first, so the range
+# is fixed for the whole read and becomes the next checkpoint, which is only saved once every part
+# is closed and fsynced (and uploaded, with --raw-bucket). Rows re-read through the lookback are
+# harmless: Hudi upserts them and keeps the latest by the precombine field. Parts land under
+# guay_jocker_db/{target_table}/{run}/ so an upload to the raw bucket triggers ingestion.
+def load_checkpoints(checkpoint=WATERMARK_CHECKPOINT):
+    """All saved watermarks, {} if the checkpoint does not exist yet."""
+    if checkpoint.startswith("s3://"):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        bucket, _, key = checkpoint[len("s3://"):].partition("/")
+        try:
+            return json.loads(boto3.client('s3').get_object(Bucket=bucket, Key=key)['Body'].read())
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                raise
+            return {}
+    if not os.path.exists(checkpoint):
+        return {}
+    with open(checkpoint, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(table_key, entry, checkpoint=WATERMARK_CHECKPOINT):
+    """Store a table's watermark entry, replacing the checkpoint atomically."""
+    checkpoints = load_checkpoints(checkpoint)
+    checkpoints[table_key] = entry
+    body = json.dumps(checkpoints, indent=2, sort_keys=True)
+    if checkpoint.startswith("s3://"):
+        import boto3
+
+        bucket, _, key = checkpoint[len("s3://"):].partition("/")
+        boto3.client('s3').put_object(Bucket=bucket, Key=key, Body=body.encode('utf-8'), ContentType='application/json')
+        return
+    _write_atomic(checkpoint, body)
+
+
+def _write_atomic(path, body):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _fsync(path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def _to_checkpoint(value):
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+
+
+def _from_checkpoint(field_type, value):
+    if value is None or field_type in ("INTEGER", "INT64"):
+        return value
+    if field_type == "DATE":
+        return datetime.date.fromisoformat(value)
+    return datetime.datetime.fromisoformat(value)
+
+
+def _sql_literal(field_type, value):
+    if field_type in ("INTEGER", "INT64"):
+        return str(int(value))
+    return f"{field_type} '{_to_checkpoint(value)}'"
+
+
+def partition_floor(partition_type, low):
+    """Oldest partition that can hold rows above low; assumes rows land in the partition of their watermark or later."""
+    day = low.date() if isinstance(low, datetime.datetime) else low
+    return f"{partition_type} '{day.isoformat()}'"
+
+
+def incremental_conditions(column, field_type, low, partition_column=None, partition_type=None):
+    """SQL conditions selecting the rows above low, pruned to the partitions that can hold them."""
+    if low is None:
+        return []
+    conditions = [f"`{column}` > {_sql_literal(field_type, low)}"]
+    if partition_column and field_type not in ("INTEGER", "INT64"):
+        conditions.append(f"`{partition_column}` >= {partition_floor(partition_type, low)}")
+    return conditions
+
+
+def incremental_high(client, esquema, tabla, column, conditions, project=PROJECT):
+    """MAX(column) among the rows matching conditions: the upper bound of this run."""
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"SELECT MAX(`{column}`) AS high FROM `{project}.{esquema}.{tabla}` {where}"
+    return next(iter(client.query(query).result())).high
+
+
+def _run_folder(high):
+    if isinstance(high, datetime.datetime):
+        return high.strftime('%Y%m%dT%H%M%S%f')
+    if isinstance(high, datetime.date):
+        return high.strftime('%Y%m%d')
+    return str(high)
+
+
+def export_table_incremental(esquema, tabla, column="source_timestamp", target_table=None, partition_column=None,
+                             lookback=datetime.timedelta(0), output_dir=".", raw_bucket=None,
+                             checkpoint=WATERMARK_CHECKPOINT, max_streams=STORAGE_MAX_STREAMS, workers=STORAGE_WORKERS,
+                             target_file_bytes=TARGET_FILE_BYTES, credentials_path=CREDENTIALS_PATH):
+    """Export the rows changed since the table's checkpoint as Parquet and advance the checkpoint. Returns the export stats."""
+    target_table = target_table or tabla.lower()
+    table_key = f"{esquema}.{tabla}"
+    credentials = load_credentials(credentials_path)
+    client = bigquery.Client(credentials=credentials)
+    field_types = {column["name"]: column["bq_type"] for column in cached_table_schema(client, esquema, tabla)["columns"]}
+    field_type = field_types[column]
+
+    entry = load_checkpoints(checkpoint).get(table_key, {})
+    if entry and entry.get("column") != column:
+        raise ValueError(f"Checkpoint of {table_key} tracks {entry.get('column')}, not {column}")
+    watermark = low = _from_checkpoint(field_type, entry.get("watermark"))
+    if low is not None and field_type not in ("INTEGER", "INT64"):
+        low -= lookback
+    # _PARTITIONTIME and _PARTITIONDATE are pseudo-columns, not part of the schema
+    partition_type = field_types.get(partition_column, "DATE" if partition_column == "_PARTITIONDATE" else "TIMESTAMP")
+    conditions = incremental_conditions(column, field_type, low, partition_column, partition_type)
+    high = incremental_high(client, esquema, tabla, column, conditions)
+    # With a lookback, MAX() finds the old watermark again when nothing new arrived
+    if high is None or (watermark is not None and high <= watermark):
+        print(f"⏭️ {table_key}: sin filas nuevas desde {entry.get('watermark')}")
+        return {'files': [], 'rows': 0, 'watermark': entry.get("watermark")}
+
+    row_restriction = " AND ".join([*conditions, f"`{column}` <= {_sql_literal(field_type, high)}"])
+    print(f"🔖 {table_key}: {row_restriction}")
+
+    run_folder = f"{RAW_PREFIX}/{target_table}/{_run_folder(high)}"
+    source = StorageReadSource(credentials, esquema, tabla, max_streams, row_restriction=row_restriction)
+    stats = export_streams(source, os.path.join(output_dir, run_folder), esquema, tabla, "parquet", workers, target_file_bytes)
+    for path in stats['files']:
+        _fsync(path)
+
+    if raw_bucket:
+        import boto3
+
+        s3_client = boto3.client('s3')
+        for path in stats['files']:
+            key = f"{run_folder}/{os.path.basename(path)}"
+            s3_client.upload_file(path, raw_bucket, key)
+            print(f"⬆️ s3://{raw_bucket}/{key}")
+
+    # Only now is the delta safe to skip next time
+    save_checkpoint(table_key, {
+        "column": column,
+        "watermark": _to_checkpoint(high),
+        "previous_watermark": entry.get("watermark"),
+        "rows": stats['rows'],
+        "files": len(stats['files']),
+        "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }, checkpoint)
+    stats['watermark'] = _to_checkpoint(high)
+    return stats
+
+
+# ============================
+# Schema catalog
+# ============================
+# Schemas of every table in a dataset, with their BigQuery types mapped to Athena/Glue DDL and to
+# the Spark SQL types Hudi writes. One query to the dataset's __TABLES__ returns every table's
+# last-modified time; only tables whose time moved since the cached entry are fetched again,
+# concurrently. Exporters read column types from the catalog instead of calling get_table.
+
+# BigQuery type -> (Athena/Glue, Spark/Hudi). Types with no lossless equivalent become strings.
+TYPE_MAPPING = {
+    "STRING": ("string", "string"),
+    "BYTES": ("binary", "binary"),
+    "INTEGER": ("bigint", "bigint"),
+    "INT64": ("bigint", "bigint"),
+    "FLOAT": ("double", "double"),
+    "FLOAT64": ("double", "double"),
+    "BOOLEAN": ("boolean", "boolean"),
+    "BOOL": ("boolean", "boolean"),
+    "TIMESTAMP": ("timestamp", "timestamp"),
+    "DATETIME": ("timestamp", "timestamp"),
+    "DATE": ("date", "date"),
+    # Neither Athena nor Spark has a time-of-day type
+    "TIME": ("string", "string"),
+    "GEOGRAPHY": ("string", "string"),
+    "JSON": ("string", "string"),
+    "INTERVAL": ("string", "string"),
+    # Up to 76 digits: beyond decimal(38)
+    "BIGNUMERIC": ("string", "string"),
+    "BIGDECIMAL": ("string", "string"),
+}
+
+
+def map_field_type(field, target):
+    """Athena (target=0) or Spark/Hudi (target=1) type of a BigQuery SchemaField, nested and repeated fields included."""
+    field_type = field.field_type.upper()
+    if field_type in ("RECORD", "STRUCT"):
+        # Athena only takes lower-case field names; Spark keeps the source's case
+        names = [sub.name.lower() if target == 0 else sub.name for sub in field.fields]
+        mapped = "struct<" + ",".join(f"{name}:{map_field_type(sub, target)}" for name, sub in zip(names, field.fields)) + ">"
+    elif field_type in ("NUMERIC", "DECIMAL"):
+        # Unparameterized NUMERIC is decimal(38,9)
+        mapped = f"decimal({field.precision or 38},{field.scale if field.scale is not None else 9})"
+    else:
+        mapped = TYPE_MAPPING.get(field_type, ("string", "string"))[target]
+    return f"array<{mapped}>" if field.mode == "REPEATED" else mapped
+
+
+def describe_table(table):
+    """Catalog entry of a fetched BigQuery table."""
+    return {
+        "last_modified": int(table.modified.timestamp() * 1000),
+        "num_rows": table.num_rows,
+        "partitioning": table.time_partitioning.field if table.time_partitioning else None,
+        "columns": [
+            {
+                "name": field.name,
+                "bq_type": field.field_type,
+                "mode": field.mode,
+                "athena_type": map_field_type(field, 0),
+                "spark_type": map_field_type(field, 1),
+            }
+            for field in table.schema
+        ],
+    }
+
+
+def load_catalog(path=SCHEMA_CATALOG_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_catalog(client, dataset_name, path=SCHEMA_CATALOG_PATH, workers=CATALOG_WORKERS, project=PROJECT):
+    """Refresh the cached schemas of every table in a dataset, fetching only the tables that changed."""
+    started = time.perf_counter()
+    catalog = load_catalog(path)
+    modified = {
+        row.table_id: row.last_modified_time
+        for row in client.query(f"SELECT table_id, last_modified_time FROM `{project}.{dataset_name}.__TABLES__`").result()
+    }
+    stale = [
+        table_id for table_id, last_modified in modified.items()
+        if catalog.get(f"{dataset_name}.{table_id}", {}).get("last_modified") != last_modified
+    ]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(stale)))) as executor:
+        fetched = executor.map(lambda table_id: client.get_table(f"{project}.{dataset_name}.{table_id}"), stale)
+        for table_id, table in zip(stale, fetched):
+            catalog[f"{dataset_name}.{table_id}"] = describe_table(table)
+
+    # Tables dropped from the dataset leave the catalog
+    for table_key in [key for key in catalog if key.split(".", 1)[0] == dataset_name]:
+        if table_key.split(".", 1)[1] not in modified:
+            del catalog[table_key]
+    _write_atomic(path, json.dumps(catalog, indent=2, sort_keys=True))
+    print(f"📚 {dataset_name}: {len(modified)} tabla(s), {len(stale)} actualizada(s) en {time.perf_counter() - started:.2f}s")
+    return catalog
+
+
+def table_last_modified(client, esquema, tabla, project=PROJECT):
+    """A table's last-modified time (epoch ms) from the dataset's __TABLES__, or None if it does not exist."""
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("table_id", "STRING", tabla)])
+    rows = client.query(
+        f"SELECT last_modified_time FROM `{project}.{esquema}.__TABLES__` WHERE table_id = @table_id",
+        job_config=job_config,
+    ).result()
+    return next((row.last_modified_time for row in rows), None)
+
+
+def cached_table_schema(client, esquema, tabla, path=SCHEMA_CATALOG_PATH):
+    """A table's catalog entry, fetched (and cached) again when it is missing or the table changed since."""
+    table_key = f"{esquema}.{tabla}"
+    entry = load_catalog(path).get(table_key)
+    # Schema changes move last_modified_time, so one metadata query tells whether the entry is current
+    if entry is None or entry["last_modified"] != table_last_modified(client, esquema, tabla):
+        entry = describe_table(client.get_table(f"{PROJECT}.{esquema}.{tabla}"))
+        catalog = load_catalog(path)
+        catalog[table_key] = entry
+        _write_atomic(path, json.dumps(catalog, indent=2, sort_keys=True))
+    return entry
+
+
+# ============================
+# Print a table's schema
+# ============================
+def print_table_schema(client, dataset_name, table_name):
+    """Print the table's columns as `name` type, lines for a CREATE TABLE."""
+    for column in cached_table_schema(client, dataset_name, table_name)["columns"]:
+        print(f'`{column["name"].lower()}` {column["athena_type"]},')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a BigQuery table to a gzip-compressed CSV.")
+    parser.add_argument("esquema", nargs="?", default="gestion_bancaria_data", help="BigQuery dataset")
+    parser.add_argument("tabla", nargs="?", default="CLIENTES", help="BigQuery table")
+    parser.add_argument("--compression-level", type=int, default=GZIP_COMPRESSION_LEVEL, choices=range(1, 10), metavar="1-9")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Rows per result page")
+    parser.add_argument("--schema", action="store_true", help="Only print the table's schema (from the catalog; --catalog refreshes it)")
+    parser.add_argument("--catalog", action="store_true", help="Refresh the schema catalog of the whole dataset")
+    parser.add_argument("--storage", action="store_true", help="Sharded export through the Storage Read API")
+    parser.add_argument("--format", choices=sorted(PART_WRITERS), default="parquet", help="Part format with --storage")
+    parser.add_argument("--streams", type=int, default=STORAGE_MAX_STREAMS, help="Max read streams with --storage")
+    parser.add_argument("--workers", type=int, default=STORAGE_WORKERS, help="Streams drained in parallel with --storage")
+    parser.add_argument("--target-file-mb", type=int, default=TARGET_FILE_BYTES // 1024 ** 2, help="Part size with --storage")
+    parser.add_argument("--output-dir", default=".", help="Where --storage writes its parts")
+    parser.add_argument("--incremental", action="store_true", help="Only rows above the table's watermark, as Parquet")
+    parser.add_argument("--watermark-column", default="source_timestamp", help="Column the watermark tracks")
+    parser.add_argument("--partition-column", help="Partition column to prune on with --incremental")
+    parser.add_argument("--lookback-minutes", type=int, default=0, help="Re-read this window below the watermark")
+    parser.add_argument("--checkpoint", default=WATERMARK_CHECKPOINT, help="Watermark file (local path or s3:// URI)")
+    parser.add_argument("--target-table", help="Hudi table the parts feed (default: tabla in lower case)")
+    parser.add_argument("--raw-bucket", help="Upload the parts to this raw bucket before advancing the watermark")
+    args = parser.parse_args(argv)
+
+    if args.incremental:
+        export_table_incremental(
+            args.esquema, args.tabla, args.watermark_column, args.target_table, args.partition_column,
+            datetime.timedelta(minutes=args.lookback_minutes), args.output_dir, args.raw_bucket, args.checkpoint,
+            args.streams, args.workers, args.target_file_mb * 1024 ** 2,
+        )
+        return
+
+    if args.storage:
+        export_table_sharded(
+            args.esquema, args.tabla, args.output_dir, args.format, args.streams, args.workers,
+            args.target_file_mb * 1024 ** 2, args.compression_level,
+        )
+        return
+
+    client = create_client()
+    if args.catalog:
+        build_catalog(client, args.esquema)
+    elif args.schema:
+        print_table_schema(client, args.esquema, args.tabla)
+    else:
+        export_table(client, args.esquema, args.tabla, args.compression_level, args.page_size)
+
+
+if __name__ == "__main__":
+    main()
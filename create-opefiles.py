@@ -1,13 +1,443 @@
-import pandas as pd
+import argparse
+import datetime
+import json
+import math
+import os
+import random
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Bytes read per chunk; with the sample, this is all the memory the tool holds
+CHUNK_BYTES = int(os.getenv('OPE_CHUNK_BYTES', str(8 * 1024 * 1024)))
+ENCODING = 'ISO-8859-1'
+DELIMITER = b'|'
+# Parquet output for the raw bucket: guay_jocker_db/{table}/{date}/ is what the S3 -> FIFO queue lambda parses
+RAW_PREFIX = "guay_jocker_db"
+PARQUET_COMPRESSION = os.getenv('OPE_PARQUET_COMPRESSION', 'snappy')
+PARQUET_ROW_GROUP_ROWS = int(os.getenv('OPE_PARQUET_ROW_GROUP_ROWS', '1000000'))
+
+
+class PartWriter:
+  """Writes whole-line blocks to part-NNNN files, rolling over by bytes or rows, under every extension at once.
+
+  The last of max_parts parts takes whatever is left, however big.
+  """
+
+  def __init__(self, output_dir, extensions, part_bytes=None, part_rows=None, max_parts=None):
+    self.output_dir = output_dir
+    self.extensions = extensions
+    self.part_bytes = part_bytes
+    self.part_rows = part_rows
+    self.max_parts = max_parts
+    self.paths = []
+    self.files = []
+    self.part_number = -1
+    self.current_bytes = self.current_rows = 0
+    os.makedirs(output_dir, exist_ok=True)
+    self._next_part()
+
+  def _next_part(self):
+    self._close_part()
+    self.part_number += 1
+    self.current_bytes = self.current_rows = 0
+    for extension in self.extensions:
+      path = os.path.join(self.output_dir, f'part-{self.part_number:04d}.{extension}')
+      self.paths.append(path)
+      self.files.append(open(path, 'wb'))
+
+  def _close_part(self):
+    for f in self.files:
+      f.close()
+    self.files = []
+
+  def _room(self, block):
+    """Bytes of block (ending at a line boundary) that still fit in the current part."""
+    cut = len(block)
+    if self.max_parts and self.part_number == self.max_parts - 1:
+      return cut
+    if self.part_bytes and self.current_bytes + cut > self.part_bytes:
+      cut = block.rfind(b'\n', 0, self.part_bytes - self.current_bytes) + 1
+    if self.part_rows:
+      rows_left = self.part_rows - self.current_rows
+      if block.count(b'\n', 0, cut) > rows_left:
+        cut = 0
+        for _ in range(rows_left):
+          cut = block.index(b'\n', cut) + 1
+    if cut == 0 and self.current_rows == 0:
+      # A single line longer than part_bytes still goes out whole
+      cut = block.find(b'\n') + 1 or len(block)
+    return cut
+
+  def write_block(self, block):
+    while block:
+      cut = self._room(block)
+      if cut == 0:
+        self._next_part()
+        continue
+      for f in self.files:
+        f.write(block[:cut])
+      self.current_bytes += cut
+      self.current_rows += block.count(b'\n', 0, cut)
+      block = block[cut:]
+
+  def close(self):
+    self._close_part()
+
+
+class ReservoirSampler:
+  """Uniform sample of k lines from a stream of whole-line blocks (Algorithm L), in file order."""
+
+  def __init__(self, k, seed=None):
+    self.k = k
+    self.rng = random.Random(seed)
+    self.reservoir = []
+    self.seen = 0
+    self.next_index = None
+    self.w = None
+
+  def _random(self):
+    # (0, 1]: log() of it is always defined
+    return 1.0 - self.rng.random()
+
+  def _skip(self):
+    self.next_index += math.floor(math.log(self._random()) / math.log(1 - self.w)) + 1
+
+  def offer_block(self, block):
+    start = self.seen
+    end = start + block.count(b'\n')
+    # Once the reservoir is full, only blocks holding the next pick are split into lines
+    if len(self.reservoir) < self.k or self.next_index < end:
+      lines = block.split(b'\n')
+      index = start
+      while len(self.reservoir) < self.k and index < end:
+        self.reservoir.append((index, lines[index - start] + b'\n'))
+        index += 1
+        if len(self.reservoir) == self.k:
+          self.w = math.exp(math.log(self._random()) / self.k)
+          self.next_index = index - 1
+          self._skip()
+      while self.next_index is not None and self.next_index < end:
+        self.reservoir[self.rng.randrange(self.k)] = (self.next_index, lines[self.next_index - start] + b'\n')
+        self.w *= math.exp(math.log(self._random()) / self.k)
+        self._skip()
+    self.seen = end
+
+  def write(self, path):
+    with open(path, 'wb') as f:
+      for _, line in sorted(self.reservoir):
+        f.write(line)
+
+
+def select_columns(block, columns, encoding_out=None):
+  """Keep the given |-separated fields of every line, re-encoding from ISO-8859-1 if asked."""
+  lines = block.split(b'\n')[:-1]
+  if columns:
+    lines = [DELIMITER.join(fields[i] if i < len(fields) else b'' for i in columns)
+             for fields in (line.rstrip(b'\r').split(DELIMITER) for line in lines)]
+  out = b'\n'.join(lines) + b'\n'
+  if encoding_out:
+    out = out.decode(ENCODING).encode(encoding_out)
+  return out
+
+
+def iter_blocks(f, chunk_bytes=CHUNK_BYTES):
+  """Blocks of whole lines from a binary file, read chunk_bytes at a time; a last unterminated line comes out alone."""
+  carry = b''
+  while True:
+    chunk = f.read(chunk_bytes)
+    if not chunk:
+      if carry:
+        yield carry
+      return
+    data = carry + chunk
+    cut = data.rfind(b'\n') + 1
+    block, carry = data[:cut], data[cut:]
+    if block:
+      yield block
+
+
+def head(block, n):
+  """The first n lines of a block."""
+  end = 0
+  for _ in range(n):
+    end = block.find(b'\n', end) + 1 or len(block)
+  return block[:end]
+
+
+def split_ope(input_path, output_dir='.', part_bytes=None, part_rows=None, parts=None, sample_rows=0,
+              sample_path=None, extensions=('ope',), columns=None, encoding_out=None, max_rows=None, seed=None):
+  """Read an .ope file once, in CHUNK_BYTES chunks, writing its parts and a row sample in the same pass.
+
+  Without columns or encoding_out, lines are never parsed: bytes go to the parts as read.
+  """
+  started = time.perf_counter()
+  if parts:
+    part_bytes = math.ceil(os.path.getsize(input_path) / parts)
+  writer = PartWriter(output_dir, list(extensions), part_bytes, part_rows, parts)
+  sampler = ReservoirSampler(sample_rows, seed) if sample_rows else None
+  rows = bytes_in = 0
+
+  with open(input_path, 'rb') as f:
+    for block in iter_blocks(f):
+      block_rows = block.count(b'\n') + (not block.endswith(b'\n'))
+      if max_rows is not None and rows + block_rows >= max_rows:
+        block = head(block, max_rows - rows)
+        block_rows = max_rows - rows
+      bytes_in += len(block)
+      if columns or encoding_out:
+        block = select_columns(block if block.endswith(b'\n') else block + b'\n', columns, encoding_out)
+      writer.write_block(block)
+      if sampler:
+        sampler.offer_block(block if block.endswith(b'\n') else block + b'\n')
+      rows += block_rows
+      if rows == max_rows:
+        break
+  writer.close()
+
+  if sampler:
+    sampler.write(sample_path or os.path.join(output_dir, f'sample.{extensions[0]}'))
+  elapsed = time.perf_counter() - started
+  print(f"✅ {rows} filas, {bytes_in} bytes -> {writer.part_number + 1} parte(s) en {elapsed:.2f}s "
+        f"({bytes_in / 1024 ** 2 / elapsed if elapsed else 0:.1f} MB/s)")
+  return {'rows': rows, 'bytes': bytes_in, 'parts': writer.paths, 'seconds': round(elapsed, 3)}
+
+
+# ============================
+# .ope -> Parquet
+# ============================
+# Arrow's CSV reader streams the file in CHUNK_BYTES blocks, transcoding ISO-8859-1 and typing each
+# column as it parses, so no pandas object columns are ever built. The table's schema file names
+# and types the fields, in file order:
+#   {"table": "ta_admin_launch", "trailing_delimiter": false, "null_values": [""],
+#    "columns": [{"name": "id_admin_launch", "type": "int64"},
+#                {"name": "amount", "type": "decimal(18,2)"},
+#                {"name": "source_timestamp", "type": "timestamp", "format": "%Y-%m-%d-%H.%M.%S.%f"},
+#                {"name": "fecha", "type": "date", "format": "%Y%m%d"}]}
+# Types: string, int32, int64, float64, bool, date, timestamp and decimal(p,s). A "format" (strptime,
+# plus a trailing %f for fractional seconds) is only needed for dates and timestamps that are not ISO 8601.
+def load_ope_schema(path):
+  with open(path, encoding='utf-8') as f:
+    return json.load(f)
+
+
+def arrow_type(type_name):
+  import pyarrow as pa
+
+  if type_name.startswith('decimal('):
+    precision, scale = (int(part) for part in type_name[len('decimal('):-1].split(','))
+    return pa.decimal128(precision, scale)
+  return {
+    'string': pa.string(),
+    'int32': pa.int32(),
+    'int64': pa.int64(),
+    'float64': pa.float64(),
+    'bool': pa.bool_(),
+    # Parsed as timestamps (so a format applies), cast to dates per batch
+    'date': pa.timestamp('s'),
+    'timestamp': pa.timestamp('us'),
+  }[type_name]
+
+
+def parse_fraction_timestamps(array, fmt):
+  """Parse strings in a format ending in {sep}%f (e.g. DB2's %Y-%m-%d-%H.%M.%S.%f) to timestamp[us].
+
+  Arrow's strptime has no %f, so the seconds and the fraction are parsed apart and added. The
+  fraction is optional: a value only has one when it holds more separators than the format without it.
+  """
+  import pyarrow as pa
+  import pyarrow.compute as pc
+
+  separator, seconds_format = re.escape(fmt[-3]), fmt[:-3]
+  pattern = (rf'^(?P<seconds>(?:[^{separator}]*{separator}){{{seconds_format.count(fmt[-3])}}}[^{separator}]*)'
+             rf'(?:{separator}(?P<fraction>\d*))?$')
+  parts = pc.extract_regex(array, pattern=pattern)
+  # Values the pattern does not match go to strptime whole, so they fail like any other bad value
+  seconds = pc.coalesce(pc.struct_field(parts, 'seconds'), array)
+  fraction = pc.utf8_slice_codeunits(pc.utf8_rpad(pc.struct_field(parts, 'fraction'), width=6, padding='0'), 0, 6)
+  return pc.add(
+    pc.strptime(seconds, format=seconds_format, unit='us'),
+    pc.coalesce(fraction.cast(pa.int64()), 0).cast(pa.duration('us')),
+  )
+
+
+def ope_to_parquet(input_path, schema, output_path, compression=PARQUET_COMPRESSION, row_group_rows=PARQUET_ROW_GROUP_ROWS):
+  """Convert one .ope file to Parquet with the given schema. Returns its stats."""
+  import pyarrow as pa
+  import pyarrow.csv as pv
+  import pyarrow.parquet as pq
+
+  started = time.perf_counter()
+  columns = schema['columns']
+  names = [column['name'] for column in columns]
+  # A delimiter closing every line reads as one more, always empty, field
+  read_names = names + ['_trailing'] if schema.get('trailing_delimiter') else names
+  date_columns = {column['name'] for column in columns if column['type'] == 'date'}
+  # Fractional seconds are read as strings and parsed per batch; other formats go to the reader
+  fraction_columns = {
+    column['name']: column['format'] for column in columns
+    if column['type'] in ('date', 'timestamp') and column.get('format', '').endswith('%f')
+  }
+  formats = [column['format'] for column in columns if column.get('format') and column['name'] not in fraction_columns]
+  read_types = {
+    column['name']: pa.string() if column['name'] in fraction_columns else arrow_type(column['type'])
+    for column in columns
+  }
+
+  reader = pv.open_csv(
+    input_path,
+    read_options=pv.ReadOptions(encoding=ENCODING, column_names=read_names, block_size=CHUNK_BYTES),
+    parse_options=pv.ParseOptions(delimiter=DELIMITER.decode()),
+    convert_options=pv.ConvertOptions(
+      column_types=read_types,
+      include_columns=names,
+      null_values=schema.get('null_values', ['']),
+      strings_can_be_null=True,
+      timestamp_parsers=[pv.ISO8601, *formats],
+    ),
+  )
+  output_schema = pa.schema([
+    pa.field(column['name'], pa.date32() if column['type'] == 'date' else arrow_type(column['type']))
+    for column in columns
+  ])
+
+  def finish(batch, name):
+    array = batch.column(name)
+    if name in fraction_columns:
+      array = parse_fraction_timestamps(array, fraction_columns[name])
+    if name in date_columns:
+      array = array.cast(pa.date32())
+    return array
+
+  os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+  rows = 0
+  buffer, buffered_rows = [], 0
+  with pq.ParquetWriter(output_path, output_schema, compression=compression) as writer:
+    for batch in reader:
+      if date_columns or fraction_columns:
+        batch = pa.RecordBatch.from_arrays([finish(batch, name) for name in names], schema=output_schema)
+      buffer.append(batch)
+      buffered_rows += batch.num_rows
+      rows += batch.num_rows
+      # Reader blocks are a few MB; row groups are sized for readers, not for the parser
+      if buffered_rows >= row_group_rows:
+        writer.write_table(pa.Table.from_batches(buffer, schema=output_schema), row_group_size=row_group_rows)
+        buffer, buffered_rows = [], 0
+    if buffer:
+      writer.write_table(pa.Table.from_batches(buffer, schema=output_schema), row_group_size=row_group_rows)
+
+  elapsed = time.perf_counter() - started
+  return {
+    'input': input_path,
+    'output': output_path,
+    'rows': rows,
+    'bytes_in': os.path.getsize(input_path),
+    'bytes_out': os.path.getsize(output_path),
+    'seconds': round(elapsed, 3),
+  }
+
+
+def _convert_one(task):
+  return ope_to_parquet(*task)
+
+
+def convert_ope_files(input_paths, schema_path, output_dir='.', table=None, date=None, workers=None,
+                      compression=PARQUET_COMPRESSION, row_group_rows=PARQUET_ROW_GROUP_ROWS, raw_bucket=None):
+  """Convert .ope files in a process pool into guay_jocker_db/{table}/{date}/ under output_dir (and the raw bucket)."""
+  started = time.perf_counter()
+  schema = load_ope_schema(schema_path)
+  table = table or schema['table']
+  date = date or datetime.date.today().strftime('%Y%m%d')
+  folder = f"{RAW_PREFIX}/{table}/{date}"
+  tasks = [
+    (path, schema, os.path.join(output_dir, folder, os.path.splitext(os.path.basename(path))[0] + '.parquet'),
+     compression, row_group_rows)
+    for path in input_paths
+  ]
+
+  results = []
+  with ProcessPoolExecutor(max_workers=workers or min(len(tasks), os.cpu_count() or 1)) as executor:
+    for result in executor.map(_convert_one, tasks):
+      print(f"📦 {result['input']} -> {result['output']}: {result['rows']} filas en {result['seconds']}s "
+            f"({result['rows'] / result['seconds'] if result['seconds'] else 0:.0f} filas/s)")
+      results.append(result)
+
+  if raw_bucket:
+    import boto3
+
+    s3_client = boto3.client('s3')
+    for result in results:
+      key = f"{folder}/{os.path.basename(result['output'])}"
+      s3_client.upload_file(result['output'], raw_bucket, key)
+      print(f"⬆️ s3://{raw_bucket}/{key}")
+
+  elapsed = time.perf_counter() - started
+  rows = sum(result['rows'] for result in results)
+  print(f"✅ {len(results)} fichero(s), {rows} filas en {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} filas/s), "
+        f"{sum(result['bytes_in'] for result in results)} -> {sum(result['bytes_out'] for result in results)} bytes")
+  return results
+
 
 def generate_ope():
 
   #nombres_columnas = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14', '15', '16', '17', '18']
-                      
-  df = pd.read_csv('table1.ope', encoding='ISO-8859-1', delimiter='|', nrows=1000, header=None)
-  df.to_csv('part-0000.csv', sep='|', encoding='ISO-8859-1', index=False, header=False)
-  df.to_csv('part-0000.ope', sep='|', encoding='ISO-8859-1', index=False, header=False)
 
-if __name__ == "__main__":
-  generate_ope()
+  # Primeras 1000 filas de table1.ope en part-0000.csv y part-0000.ope, sin pasar por pandas
+  split_ope('table1.ope', extensions=('csv', 'ope'), max_rows=1000)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Split an .ope extract into part files and sample its rows in one pass, or convert .ope files to Parquet.")
+  parser.add_argument('inputs', nargs='*', help="The .ope file(s) (none: the first 1000 rows of table1.ope, as before)")
+  parser.add_argument('--output-dir', default='.')
+  size = parser.add_mutually_exclusive_group()
+  size.add_argument('--part-mb', type=int, help="Roll over to a new part at this size")
+  size.add_argument('--parts', type=int, help="Split into this many parts of about the same size")
+  parser.add_argument('--part-rows', type=int, help="Roll over to a new part after this many rows")
+  parser.add_argument('--sample-rows', type=int, default=0, help="Also write a uniform sample of this many rows")
+  parser.add_argument('--sample-path', help="Where the sample goes (default: sample.ope in the output dir)")
+  parser.add_argument('--seed', type=int, help="Seed for a reproducible sample")
+  parser.add_argument('--csv', action='store_true', help="Also write every part as part-NNNN.csv")
+  parser.add_argument('--columns', help="Comma-separated field indexes to keep (parses every line)")
+  parser.add_argument('--encoding-out', help="Re-encode from ISO-8859-1 to this encoding (parses every line)")
+  parser.add_argument('--max-rows', type=int, help="Stop after this many rows")
+  parser.add_argument('--parquet', action='store_true', help="Convert the inputs to Parquet instead of splitting them")
+  parser.add_argument('--schema', help="Table schema file (JSON) for --parquet")
+  parser.add_argument('--table', help="Table folder for --parquet (default: the schema's table)")
+  parser.add_argument('--date', help="Date folder for --parquet (default: today, YYYYMMDD)")
+  parser.add_argument('--workers', type=int, help="Files converted in parallel with --parquet")
+  parser.add_argument('--compression', default=PARQUET_COMPRESSION, help="Parquet compression codec")
+  parser.add_argument('--row-group-rows', type=int, default=PARQUET_ROW_GROUP_ROWS, help="Rows per Parquet row group")
+  parser.add_argument('--raw-bucket', help="Also upload the Parquet files to this raw bucket")
+  args = parser.parse_args(argv)
 
+  if args.parquet:
+    if not args.inputs or not args.schema:
+      parser.error("--parquet needs input files and --schema")
+    convert_ope_files(
+      args.inputs, args.schema, args.output_dir, args.table, args.date, args.workers,
+      args.compression, args.row_group_rows, args.raw_bucket,
+    )
+    return
+  if not args.inputs:
+    generate_ope()
+    return
+  if len(args.inputs) > 1:
+    parser.error("splitting takes a single input file")
+  split_ope(
+    args.inputs[0], args.output_dir,
+    part_bytes=args.part_mb * 1024 ** 2 if args.part_mb else None,
+    part_rows=args.part_rows,
+    parts=args.parts,
+    sample_rows=args.sample_rows,
+    sample_path=args.sample_path,
+    extensions=('ope', 'csv') if args.csv else ('ope',),
+    columns=[int(column) for column in args.columns.split(',')] if args.columns else None,
+    encoding_out=args.encoding_out,
+    max_rows=args.max_rows,
+    seed=args.seed,
+  )
+
+
+if __name__ == "__main__":
+  main()
@@ -1,15 +1,25 @@
 import json
+import os
 import boto3
 import urllib.parse
 import urllib3
 import logging
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+
+# Buckets reconciliados en paralelo por invocación (BucketNames)
+MAX_WORKERS = int(os.getenv('NOTIFICATION_MAX_WORKERS', '4'))
 
 # Configuración del cliente S3 y del logger
-s3 = boto3.client('s3')
+# Un único cliente y un único pool HTTP por contenedor, compartidos entre hilos e invocaciones
+s3 = boto3.client('s3', config=Config(max_pool_connections=max(10, MAX_WORKERS)))
+http = urllib3.PoolManager(retries=urllib3.Retry(total=3, backoff_factor=0.5))
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def send_response(event, context, response_status, reason=None):
+VALID_KEYS = ('TopicConfigurations', 'QueueConfigurations', 'LambdaFunctionConfigurations', 'EventBridgeConfiguration')
+
+def send_response(event, context, response_status, reason=None, data=None):
     """Envía una respuesta a CloudFormation con el estado de la operación."""
     response_body = json.dumps({
         'Status': response_status,
@@ -19,15 +29,15 @@ def send_response(event, context, response_status, reason=None):
         'RequestId': event['RequestId'],
         'LogicalResourceId': event['LogicalResourceId'],
         'NoEcho': False,
+        'Data': data or {},
     })
-    
+
     response_url = event['ResponseURL']
     headers = {
         'Content-Type': '',
         'Content-Length': str(len(response_body))
     }
-    
-    http = urllib3.PoolManager()
+
     try:
         response = http.request('PUT', response_url, body=response_body, headers=headers)
         logger.info(f"Response sent: {response.status}, {response.reason}")
@@ -38,9 +48,9 @@ def send_response(event, context, response_status, reason=None):
 
 def merge_configurations(request_type, input_config, current_config):
     """Fusiona la configuración de notificaciones del bucket S3 con la configuración actual."""
-    valid_keys = {'TopicConfigurations', 'QueueConfigurations', 'LambdaFunctionConfigurations', 'EventBridgeConfiguration'}
+    valid_keys = set(VALID_KEYS)
     merged_config = {key: value for key, value in current_config.items() if key in valid_keys}
-    
+
     for key, value in input_config.items():
         if key in valid_keys:
             input_ids = {obj['Id'] for obj in value}
@@ -53,50 +63,116 @@ def merge_configurations(request_type, input_config, current_config):
                     merged_config[key] = filter_config + value
             else:
                 merged_config[key] = value
-                
+
     return merged_config
 
+def normalize_configuration(config):
+    """Forma canónica de una configuración de notificaciones, para comparar la actual con la fusionada.
+
+    S3 omite las listas vacías, devuelve los eventos y reglas de filtro en cualquier orden y
+    escribe los nombres de las reglas con mayúscula ('Prefix'); CloudFormation los pasa tal cual.
+    """
+    normalized = {}
+    for key in VALID_KEYS:
+        if key not in config:
+            continue
+        if key == 'EventBridgeConfiguration':
+            normalized[key] = {}
+            continue
+        entries = []
+        for entry in config[key]:
+            entry = dict(entry)
+            entry['Events'] = sorted(entry.get('Events', []))
+            rules = entry.get('Filter', {}).get('Key', {}).get('FilterRules', [])
+            if rules:
+                entry['Filter'] = {'Key': {'FilterRules': sorted(
+                    ({'Name': rule['Name'].lower(), 'Value': rule['Value']} for rule in rules),
+                    key=lambda rule: (rule['Name'], rule['Value']),
+                )}}
+            else:
+                entry.pop('Filter', None)
+            entries.append(entry)
+        if entries:
+            normalized[key] = sorted(entries, key=lambda entry: entry.get('Id', ''))
+    return normalized
+
 def log(obj):
     """Loguea información de manera estructurada."""
-    logger.info(json.dumps(obj, indent=2))
+    logger.info(json.dumps(obj, indent=2, default=str))
 
 def log_error(obj):
     """Loguea errores de manera estructurada."""
-    logger.error(json.dumps(obj, indent=2))
+    logger.error(json.dumps(obj, indent=2, default=str))
+
+def reconcile_bucket(request_type, bucket_name, notification_configuration):
+    """Aplica la configuración al bucket solo si cambia algo. Devuelve True si escribió."""
+    # Obtener la configuración actual del bucket S3
+    current_configuration = s3.get_bucket_notification_configuration(Bucket=bucket_name)
+    current_configuration.pop('ResponseMetadata', None)
+
+    # Fusionar la nueva configuración con la existente
+    merged_configuration = merge_configurations(request_type, notification_configuration, current_configuration)
+
+    # Sin cambios no hay escritura: cada put vuelve a propagar la configuración y valida todos los destinos
+    if normalize_configuration(merged_configuration) == normalize_configuration(current_configuration):
+        logger.info(f"Notification configuration of {bucket_name} is already up to date, skipping write")
+        return False
+
+    # Loguear la configuración previa y la nueva
+    log({
+        'bucket': bucket_name,
+        'previousConfiguration': current_configuration,
+        'newConfiguration': merged_configuration
+    })
+
+    # Aplicar la nueva configuración al bucket
+    s3.put_bucket_notification_configuration(
+        Bucket=bucket_name,
+        NotificationConfiguration=merged_configuration
+    )
+    return True
+
+def bucket_names(props):
+    """Buckets del recurso: BucketNames (lista) y/o BucketName, sin duplicados y en orden."""
+    names = list(props.get('BucketNames', []))
+    if props.get('BucketName'):
+        names.insert(0, props['BucketName'])
+    return list(dict.fromkeys(names))
 
 def lambda_handler(event, context):
-    """Función principal que maneja la configuración de notificaciones del bucket S3."""
+    """Función principal que maneja la configuración de notificaciones de los buckets S3."""
     logger.info("Received event: " + json.dumps(event, indent=2))
     props = event['ResourceProperties']
-    bucket_name = props['BucketName']
-    
+    request_type = event['RequestType']
+
+    # (tipo de petición, bucket, configuración) a reconciliar
+    tasks = [(request_type, bucket_name, props['NotificationConfiguration']) for bucket_name in bucket_names(props)]
+    if request_type == 'Update':
+        # Los buckets que salen del recurso pierden las notificaciones que tenían
+        old_props = event.get('OldResourceProperties', {})
+        removed = [name for name in bucket_names(old_props) if name not in bucket_names(props)]
+        tasks += [('Delete', bucket_name, old_props['NotificationConfiguration']) for bucket_name in removed]
+
     try:
-        # Obtener la configuración actual del bucket S3
-        current_configuration = s3.get_bucket_notification_configuration(Bucket=bucket_name)
-        
-        # Fusionar la nueva configuración con la existente
-        merged_configuration = merge_configurations(event['RequestType'], props['NotificationConfiguration'], current_configuration)
-        
-        # Preparar los parámetros para actualizar la configuración del bucket
-        put_params = {
-            'Bucket': bucket_name,
-            'NotificationConfiguration': merged_configuration
-        }
-        
-        # Loguear la configuración previa y la nueva
-        log({
-            'bucket': bucket_name,
-            'previousConfiguration': current_configuration,
-            'newConfiguration': merged_configuration
-        })
-        
-        # Aplicar la nueva configuración al bucket
-        s3.put_bucket_notification_configuration(**put_params)
-        
-        # Enviar respuesta de éxito a CloudFormation
-        send_response(event, context, 'SUCCESS')
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(tasks)))) as executor:
+            futures = {task[1]: executor.submit(reconcile_bucket, *task) for task in tasks}
+        results, errors = {}, {}
+        for bucket_name, future in futures.items():
+            try:
+                results[bucket_name] = 'UPDATED' if future.result() else 'UNCHANGED'
+            except Exception as e:
+                errors[bucket_name] = str(e)
+        log({'results': results, 'errors': errors})
+
+        if errors:
+            # Loguear el error y enviar respuesta de fallo a CloudFormation
+            log_error({'failedBuckets': errors})
+            reason = "; ".join(f"{bucket_name}: {error}" for bucket_name, error in errors.items())
+            send_response(event, context, 'FAILED', reason[:1000])
+        else:
+            # Enviar respuesta de éxito a CloudFormation
+            send_response(event, context, 'SUCCESS', data=results)
     except Exception as e:
         # Loguear el error y enviar respuesta de fallo a CloudFormation
         log_error(f"Error processing event: {str(e)}")
         send_response(event, context, 'FAILED', str(e))
-
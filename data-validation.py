@@ -1,15 +1,22 @@
 import boto3
 
-def validate_glue_table_data(glue_database, glue_table):
-    # Specify your AWS region
-    region = 'your_region'
+from athena_queries import AthenaQueryRunner, result_records
+
+# Specify your AWS region and the Athena query output location
+region = 'your_region'
+athena_output_location = 's3://your-athena-query-output-location/'
 
+# Glue types whose name is not an Athena (Trino) type for TRY_CAST
+ATHENA_CAST_TYPES = {
+    'string': 'varchar',
+    'int': 'integer',
+    'float': 'real',
+}
+
+def validate_glue_table_data(glue_database, glue_table):
     # Create a Glue client
     glue_client = boto3.client('glue', region_name=region)
 
-    # Create an Athena client
-    athena_client = boto3.client('athena', region_name=region)
-
     try:
         # Get the metadata of the Glue table
         response = glue_client.get_table(DatabaseName=glue_database, Name=glue_table)
@@ -23,25 +30,13 @@ def validate_glue_table_data(glue_database, glue_table):
             if 'Columns' in storage_descriptor:
                 columns = storage_descriptor['Columns']
 
-                for column in columns:
-                    column_name = column['Name']
-                    column_data_type = column['Type']
-                    is_primary_key = column.get('isPrimaryKey', False)
-
-                    # Validate consistency (column data type)
-                    print(f"Validating data type for column '{column_name}'...")
-                    validate_data_type(glue_database, glue_table, column_name, column_data_type)
-
-                    # Validate completeness (null values)
-                    print(f"Validating null values for column '{column_name}'...")
-                    validate_null_values(glue_database, glue_table, column_name)
-
-                    # Validate integrity (isPrimaryKey)
-                    if is_primary_key:
-                        print(f"Validating primary key for column '{column_name}'...")
-                        validate_primary_key(glue_database, glue_table, column_name)
-                    else:
-                        print(f"Column '{column_name}' is not a primary key.")
+                # Every check of every column in one aggregate query: a single scan of the table
+                print(f"Profiling {len(columns)} column(s) of {glue_database}.{glue_table}...")
+                query = build_profile_query(glue_database, glue_table, columns)
+                row = execute_athena_query(query, glue_database)
+                report = parse_profile(row, columns)
+                print_profile_report(report)
+                return report
 
             else:
                 print("No 'Columns' key found in StorageDescriptor.")
@@ -51,54 +46,95 @@ def validate_glue_table_data(glue_database, glue_table):
     except Exception as e:
         print(f"Error: {str(e)}")
 
-def validate_data_type(glue_database, glue_table, column_name, expected_data_type):
-    # Query Athena to validate data type
-    query = f"SELECT COUNT(*) FROM {glue_database}.{glue_table} WHERE TRY_CAST({column_name} AS {expected_data_type}) IS NULL"
-    result = execute_athena_query(query)
-    
-    if result == 0:
-        print(f"Data type for column '{column_name}' is consistent.")
-    else:
-        print(f"Data type mismatch found in column '{column_name}'.")
-
-def validate_null_values(glue_database, glue_table, column_name):
-    # Query Athena to validate null values
-    query = f"SELECT COUNT(*) FROM {glue_database}.{glue_table} WHERE {column_name} IS NULL"
-    result = execute_athena_query(query)
-    
-    if result == 0:
-        print(f"No null values found in column '{column_name}'.")
-    else:
-        print(f"Null values found in column '{column_name}'.")
-
-def validate_primary_key(glue_database, glue_table, column_name):
-    # Query Athena to validate primary key integrity
-    query = f"SELECT COUNT(*), {column_name} FROM {glue_database}.{glue_table} GROUP BY {column_name} HAVING COUNT(*) > 1"
-    result = execute_athena_query(query)
-    
-    if result == 0:
-        print(f"Primary key for column '{column_name}' is consistent.")
-    else:
-        print(f"Duplicate values found in primary key column '{column_name}'.")
-
-def execute_athena_query(query):
-    # Execute Athena query and return the result count
-    athena_client = boto3.client('athena', region_name=region)
-    query_execution = athena_client.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={'Database': glue_database},
-        ResultConfiguration={'OutputLocation': 's3://your-athena-query-output-location/'}
-    )
-    execution_id = query_execution['QueryExecutionId']
-    
-    # Wait for the query to complete
-    response = None
-    while response is None or response['QueryExecution']['Status']['State'] == 'RUNNING':
-        response = athena_client.get_query_execution(QueryExecutionId=execution_id)
-    
-    # Get the result count
-    result_count = int(response['QueryExecution']['ResultConfiguration']['OutputLocation'].split('/')[-1].split('-')[-1])
-    return result_count
+def validate_glue_tables(glue_database, glue_tables):
+    # Profile several tables at once: one aggregate query per table, run concurrently
+    glue_client = boto3.client('glue', region_name=region)
+    columns = {}
+    for glue_table in glue_tables:
+        columns[glue_table] = glue_client.get_table(DatabaseName=glue_database, Name=glue_table)['Table']['StorageDescriptor']['Columns']
+    queries = {glue_table: build_profile_query(glue_database, glue_table, columns[glue_table]) for glue_table in glue_tables}
+
+    reports = {}
+    runner = AthenaQueryRunner(boto3.client('athena', region_name=region), athena_output_location)
+    for glue_table, result in runner.run(queries, glue_database):
+        print(f"Profile of {glue_database}.{glue_table}: {result['state']}")
+        if result['state'] != 'SUCCEEDED':
+            print(f"Error: {result['reason']}")
+            continue
+        reports[glue_table] = parse_profile(result_records(result)[0], columns[glue_table])
+        print_profile_report(reports[glue_table])
+    return reports
+
+def quote_identifier(name):
+    # Athena identifiers in double quotes, with embedded quotes doubled
+    return '"' + name.replace('"', '""') + '"'
+
+def cast_type(glue_type):
+    # Athena type for TRY_CAST, or None for complex types that cannot be cast from their values
+    glue_type = glue_type.strip().lower()
+    if glue_type.startswith(('array<', 'map<', 'struct<')):
+        return None
+    return ATHENA_CAST_TYPES.get(glue_type, glue_type)
+
+def build_profile_query(glue_database, glue_table, columns):
+    # Aliases are positional (n0, c0, d0...) so any column name is safe in the result
+    expressions = ["count(*) AS total_rows"]
+    for i, column in enumerate(columns):
+        name = quote_identifier(column['Name'])
+        # Validate completeness (null values)
+        expressions.append(f"count_if({name} IS NULL) AS n{i}")
+        # Validate consistency (column data type): non-null values the declared type cannot hold
+        athena_type = cast_type(column['Type'])
+        if athena_type:
+            expressions.append(f"count_if({name} IS NOT NULL AND TRY_CAST({name} AS {athena_type}) IS NULL) AS c{i}")
+        # Validate integrity (isPrimaryKey): non-null values that appear more than once
+        if column.get('isPrimaryKey', False):
+            expressions.append(f"count({name}) - count(DISTINCT {name}) AS d{i}")
+    table = f"{quote_identifier(glue_database)}.{quote_identifier(glue_table)}"
+    return "SELECT " + ",\n       ".join(expressions) + f"\nFROM {table}"
+
+def parse_profile(row, columns):
+    # Per-column report from the single result row of the profile query
+    report = {'total_rows': int(row['total_rows']), 'columns': {}}
+    for i, column in enumerate(columns):
+        report['columns'][column['Name']] = {
+            'type': column['Type'],
+            'null_values': int(row[f'n{i}']),
+            'type_mismatches': int(row[f'c{i}']) if f'c{i}' in row else None,
+            'duplicate_keys': int(row[f'd{i}']) if f'd{i}' in row else None,
+        }
+    return report
+
+def print_profile_report(report):
+    print(f"Rows: {report['total_rows']}")
+    for column_name, checks in report['columns'].items():
+        if checks['type_mismatches'] is None:
+            print(f"Data type for column '{column_name}' ({checks['type']}) is not checked.")
+        elif checks['type_mismatches'] == 0:
+            print(f"Data type for column '{column_name}' is consistent.")
+        else:
+            print(f"Data type mismatch found in column '{column_name}': {checks['type_mismatches']} value(s).")
+
+        if checks['null_values'] == 0:
+            print(f"No null values found in column '{column_name}'.")
+        else:
+            print(f"Null values found in column '{column_name}': {checks['null_values']}.")
+
+        if checks['duplicate_keys'] is None:
+            print(f"Column '{column_name}' is not a primary key.")
+        elif checks['duplicate_keys'] == 0:
+            print(f"Primary key for column '{column_name}' is consistent.")
+        else:
+            print(f"Duplicate values found in primary key column '{column_name}': {checks['duplicate_keys']}.")
+
+def execute_athena_query(query, glue_database):
+    # Execute Athena query and return its first result row as {column: value}
+    runner = AthenaQueryRunner(boto3.client('athena', region_name=region), athena_output_location)
+    result = runner.run_one(query, glue_database)
+    if result['state'] != 'SUCCEEDED':
+        raise RuntimeError(f"Athena query {result['execution_id']} {result['state']}: {result['reason'] or ''}")
+    print(f"Scanned {result['data_scanned_bytes']} byte(s) in {result['elapsed_ms']} ms.")
+    return result_records(result)[0]
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+"""Shared runtime for the stage-b pipeline Lambdas (send-s3-events-to-fifo-queue, trigger-emr-jobs, reconcile-emr-jobs)."""
+from pipeline_runtime.clients import get_client, get_emr_client, reset_clients, set_client
+from pipeline_runtime.config import PipelineConfig, get_config
+from pipeline_runtime.job_specs import (
+    HUDI_SPARK_CONFS,
+    hudi_base_path,
+    hudi_bundle_jars,
+    load_job_spec,
+    publish_job_spec,
+    render_job_spec,
+)
+from pipeline_runtime.logs import emit_metric, printcritical, printdebug, printinfo, timed
+from pipeline_runtime.multitable import build_multi_table_request, latest_completed_instant, record_table_results
+from pipeline_runtime.records import batch_item_failures, fifo_message_group, process_records
+from pipeline_runtime.runs import (
+    RETRYABLE_STATES,
+    TERMINAL_STATES,
+    content_token,
+    get_job_run_record,
+    get_ledger_entry,
+    in_flight_runs,
+    record_job_run,
+    record_ledger_entries,
+    update_job_run_state,
+)
+from pipeline_runtime.scheduler import backlog, drain_backlog, enqueue_job, requested_capacity, table_is_scheduled
+from pipeline_runtime.sizing import (
+    apply_spark_sizing,
+    load_sizing_profiles,
+    measure_input,
+    resolve_profile,
+    size_emr_event,
+    size_spark_job,
+    streamer_checkpoint,
+)
+from pipeline_runtime.state import DynamoDBStateStore, InMemoryStateStore, create_state_store
+
+__all__ = [
+    "DynamoDBStateStore",
+    "HUDI_SPARK_CONFS",
+    "InMemoryStateStore",
+    "PipelineConfig",
+    "RETRYABLE_STATES",
+    "TERMINAL_STATES",
+    "apply_spark_sizing",
+    "backlog",
+    "batch_item_failures",
+    "build_multi_table_request",
+    "content_token",
+    "create_state_store",
+    "drain_backlog",
+    "emit_metric",
+    "enqueue_job",
+    "fifo_message_group",
+    "get_client",
+    "get_config",
+    "get_emr_client",
+    "get_job_run_record",
+    "get_ledger_entry",
+    "hudi_base_path",
+    "hudi_bundle_jars",
+    "in_flight_runs",
+    "latest_completed_instant",
+    "load_job_spec",
+    "load_sizing_profiles",
+    "measure_input",
+    "printcritical",
+    "printdebug",
+    "printinfo",
+    "process_records",
+    "publish_job_spec",
+    "record_job_run",
+    "record_ledger_entries",
+    "record_table_results",
+    "render_job_spec",
+    "requested_capacity",
+    "reset_clients",
+    "resolve_profile",
+    "set_client",
+    "size_emr_event",
+    "size_spark_job",
+    "streamer_checkpoint",
+    "table_is_scheduled",
+    "timed",
+    "update_job_run_state",
+]
@@ -0,0 +1,65 @@
+import threading
+
+from pipeline_runtime.config import get_config
+
+# ============================
+# Lazily Created AWS Clients
+# ============================
+# Clients are built on first use and reused by every later invocation of the container.
+# boto3 itself is only imported then, which keeps it out of the module import time.
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def _client_key(service_name, client_kwargs):
+    return (service_name, tuple(sorted(client_kwargs.items())))
+
+def get_client(service_name, **client_kwargs):
+    """Return the shared boto3 client for a service, creating it with the tuned botocore config on first use."""
+    key = _client_key(service_name, client_kwargs)
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            import boto3
+            from botocore.config import Config
+
+            config = get_config()
+            client = boto3.client(
+                service_name,
+                config=Config(
+                    max_pool_connections=config.max_pool_connections,
+                    connect_timeout=config.connect_timeout,
+                    read_timeout=config.read_timeout,
+                    retries={'mode': 'adaptive', 'max_attempts': config.max_attempts},
+                    tcp_keepalive=True,
+                ),
+                **client_kwargs,
+            )
+            _CLIENTS[key] = client
+    return client
+
+def get_emr_client():
+    """Return the shared emr-serverless client, using the DEV_* credentials when they are set.
+
+    The trigger and the reconciler both go through here, so they submit and track runs in the same account.
+    """
+    config = get_config()
+    client_kwargs = {}
+    if config.dev_access_key:
+        client_kwargs['aws_access_key_id'] = config.dev_access_key
+    if config.dev_secret_key:
+        client_kwargs['aws_secret_access_key'] = config.dev_secret_key
+    if config.dev_region:
+        client_kwargs['region_name'] = config.dev_region
+    return get_client("emr-serverless", **client_kwargs)
+
+def set_client(service_name, client, **client_kwargs):
+    """Register a prebuilt client (e.g. a local fake) to be returned by get_client."""
+    _CLIENTS[_client_key(service_name, client_kwargs)] = client
+
+def reset_clients():
+    """Drop every cached client."""
+    _CLIENTS.clear()
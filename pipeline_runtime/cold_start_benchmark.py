@@ -0,0 +1,85 @@
+"""Cold-start benchmark for the pipeline Lambda handlers.
+
+Every sample runs in a fresh interpreter, so module import, client creation and the first
+invocation are measured the way a new Lambda container sees them:
+
+    python -m pipeline_runtime.cold_start_benchmark send-s3-events-to-fifo-queue.py --event s3_event.json --runs 20
+
+Without --event only the import is measured. With --event the handler runs against whatever
+AWS account the environment points at, so use a dev account.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Runs inside the child interpreter: argv = [handler_path, event_path]
+_CHILD = """
+import importlib.util, json, os, sys, time
+t0 = time.perf_counter()
+spec = importlib.util.spec_from_file_location("lambda_function", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+t1 = time.perf_counter()
+if sys.argv[2]:
+    with open(sys.argv[2]) as f:
+        event = json.load(f)
+    sys.stdout = open(os.devnull, "w")
+    module.lambda_handler(event, None)
+    sys.stdout = sys.__stdout__
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_invoke_ms": (t2 - t1) * 1000}))
+"""
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def run_sample(handler_path, event_path):
+    """Run one cold start in a new interpreter and return its timings in milliseconds."""
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [repo_root, os.environ.get('PYTHONPATH')])))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD, os.path.abspath(handler_path), os.path.abspath(event_path) if event_path else ""],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process_ms"] = (time.perf_counter() - started) * 1000
+    return sample
+
+def summarize(samples):
+    """Min / p50 / p99 / max for every timing in the samples."""
+    summary = {}
+    for metric in samples[0]:
+        values = [sample[metric] for sample in samples]
+        summary[metric] = {
+            "min": round(min(values), 2),
+            "p50": round(percentile(values, 50), 2),
+            "p99": round(percentile(values, 99), 2),
+            "max": round(max(values), 2),
+        }
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import and first-invoke time of a pipeline Lambda handler.")
+    parser.add_argument("handler", help="Path to the handler module, e.g. trigger-emr-jobs.py")
+    parser.add_argument("--event", help="JSON event passed to lambda_handler on the first invoke")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="Append the summary as a JSON line to this file")
+    args = parser.parse_args(argv)
+
+    samples = [run_sample(args.handler, args.event) for _ in range(args.runs)]
+    summary = {"handler": os.path.basename(args.handler), "runs": args.runs, "timings": summarize(samples)}
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(summary) + "\n")
+    return summary
+
+if __name__ == "__main__":
+    main()
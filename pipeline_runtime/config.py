@@ -0,0 +1,52 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+# ============================
+# Environment Configuration
+# ============================
+@dataclass(frozen=True)
+class PipelineConfig:
+    """Environment settings shared by the pipeline Lambdas, parsed once per container."""
+    artifactory_bucket_name: str
+    stage_bucket_name: str
+    emr_application_id: str
+    emr_execution_role_arn: str
+    sqs_queue_url: Optional[str]
+    pipeline_state_table: Optional[str]
+    # Worker threads used to process the records of one invocation
+    max_record_workers: int
+    # botocore connection pool, retry and timeout tuning
+    max_pool_connections: int
+    max_attempts: int
+    connect_timeout: int
+    read_timeout: int
+    # Explicit credentials for the emr-serverless client (local runs against a dev account)
+    dev_access_key: Optional[str]
+    dev_secret_key: Optional[str]
+    dev_region: Optional[str]
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        return cls(
+            artifactory_bucket_name=environ['ARTIFACTORY_BUCKET_NAME'],
+            stage_bucket_name=environ['STAGE_BUCKET_NAME'],
+            emr_application_id=environ['EMR_APPLICATION_ID'],
+            emr_execution_role_arn=environ['EMR_EXECUTION_ROLE_ARN'],
+            sqs_queue_url=environ.get('SQS_QUEUE_URL'),
+            pipeline_state_table=environ.get('PIPELINE_STATE_TABLE'),
+            max_record_workers=int(environ.get('PIPELINE_MAX_RECORD_WORKERS', '8')),
+            max_pool_connections=int(environ.get('AWS_MAX_POOL_CONNECTIONS', '50')),
+            max_attempts=int(environ.get('AWS_CLIENT_MAX_ATTEMPTS', '5')),
+            connect_timeout=int(environ.get('AWS_CLIENT_CONNECT_TIMEOUT', '2')),
+            read_timeout=int(environ.get('AWS_CLIENT_READ_TIMEOUT', '30')),
+            dev_access_key=environ.get('DEV_ACCESS_KEY'),
+            dev_secret_key=environ.get('DEV_SECRET_KEY'),
+            dev_region=environ.get('DEV_REGION'),
+        )
+
+@lru_cache(maxsize=None)
+def get_config():
+    """Return the container-wide PipelineConfig."""
+    return PipelineConfig.from_env()
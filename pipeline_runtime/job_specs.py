@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from pipeline_runtime.clients import get_client
+from pipeline_runtime.config import get_config
+from pipeline_runtime.logs import printinfo
+
+# ============================
+# Job Spec Registry
+# ============================
+# Specs live at props/specs/{spec_id}/{version}.json in the artifactory bucket. The version is a
+# content hash, so a published spec never changes and cached copies never need revalidation.
+JOB_SPEC_PREFIX = "props/specs"
+JOB_SPEC_CACHE_MAX_ENTRIES = int(os.getenv('JOB_SPEC_CACHE_MAX_ENTRIES', '128'))
+_JOB_SPEC_CACHE = OrderedDict()
+_JOB_SPEC_CACHE_LOCK = threading.Lock()
+_PUBLISHED_JOB_SPECS = set()
+
+# Hudi bundles and Spark session confs every Hudi job on the SparkApp runs with
+HUDI_SPARK_CONFS = [
+    "--conf spark.serializer=org.apache.spark.serializer.KryoSerializer",
+    "--conf spark.sql.extensions=org.apache.spark.sql.hudi.HoodieSparkSessionExtension",
+    "--conf spark.sql.catalog.spark_catalog=org.apache.spark.sql.hudi.catalog.HoodieCatalog",
+    "--conf spark.sql.hive.convertMetastoreParquet=false",
+]
+
+def hudi_bundle_jars():
+    """Hudi 0.14.1 bundle jars in the artifactory bucket, in spark.jars order."""
+    bucket = get_config().artifactory_bucket_name
+    return [
+        f"s3://{bucket}/jar/hudi-aws-bundle-0.14.1.jar",
+        f"s3://{bucket}/jar/hudi-utilities-slim-bundle_2.12-0.14.1.jar",
+        f"s3://{bucket}/jar/hudi-spark3.4-bundle_2.12-0.14.1.jar"
+    ]
+
+def hudi_base_path(target_table):
+    """Base path of a table in the stage bucket, as HoodieStreamer and the table services address it."""
+    return f"s3a://{get_config().stage_bucket_name}/guay_jocker_db/{target_table}/"
+
+def job_spec_key(spec_id, version):
+    return f"{JOB_SPEC_PREFIX}/{spec_id}/{version}.json"
+
+def publish_job_spec(spec_id, spec, version):
+    """Upload a job spec version to the artifactory bucket unless it is already there."""
+    from botocore.exceptions import ClientError
+
+    spec_key = job_spec_key(spec_id, version)
+    if spec_key in _PUBLISHED_JOB_SPECS:
+        return
+    bucket = get_config().artifactory_bucket_name
+    s3_client = get_client('s3')
+    try:
+        s3_client.head_object(Bucket=bucket, Key=spec_key)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+            raise
+        printinfo("📦 Publishing job spec s3://%s/%s", bucket, spec_key)
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=spec_key,
+            Body=json.dumps(spec).encode('utf-8'),
+            ContentType='application/json',
+        )
+    _PUBLISHED_JOB_SPECS.add(spec_key)
+
+def load_job_spec(spec_id, version):
+    """Fetch a job spec version from the artifactory bucket, keeping recently used versions in an LRU cache."""
+    cache_key = (spec_id, version)
+    with _JOB_SPEC_CACHE_LOCK:
+        spec = _JOB_SPEC_CACHE.get(cache_key)
+        if spec is not None:
+            _JOB_SPEC_CACHE.move_to_end(cache_key)
+            return spec
+
+    bucket = get_config().artifactory_bucket_name
+    spec_key = job_spec_key(spec_id, version)
+    printinfo("📥 Downloading job spec s3://%s/%s", bucket, spec_key)
+    response = get_client('s3').get_object(Bucket=bucket, Key=spec_key)
+    spec = json.loads(response['Body'].read())
+
+    with _JOB_SPEC_CACHE_LOCK:
+        _JOB_SPEC_CACHE[cache_key] = spec
+        while len(_JOB_SPEC_CACHE) > JOB_SPEC_CACHE_MAX_ENTRIES:
+            _JOB_SPEC_CACHE.popitem(last=False)
+    return spec
+
+def render_job_spec(value, overrides):
+    """Return a copy of a spec with every ${name} placeholder replaced by its per-run override."""
+    if isinstance(value, dict):
+        return {key: render_job_spec(item, overrides) for key, item in value.items()}
+    if isinstance(value, list):
+        return [render_job_spec(item, overrides) for item in value]
+    if isinstance(value, str) and "${" in value:
+        for name, override in overrides.items():
+            value = value.replace(f"${{{name}}}", str(override))
+    return value
@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# ============================
+# Level-Gated Structured Logging
+# ============================
+# Messages use %-style arguments and keyword fields, both only formatted when the level is enabled:
+#     printdebug("S3 Put Event from: %s/%s", s3_bucket, s3_key, records=len(records))
+# Each emitted entry is one JSON line, so CloudWatch Logs Insights can filter on any field.
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+LOG_LEVEL = LEVELS.get(os.getenv('LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', 'SDLF/Pipeline')
+FUNCTION_NAME = os.getenv('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+def _emit(line):
+    # One write per entry keeps lines from concurrent worker threads from interleaving
+    sys.stdout.write(line + "\n")
+
+def _format(level, text, args, fields, frame):
+    entry = {
+        'level': level,
+        'message': text % args if args else text,
+        'line': frame.f_lineno,
+    }
+    entry.update(fields)
+    return json.dumps(entry, default=str, ensure_ascii=False)
+
+def printdebug(text, *args, **fields):
+    if LOG_LEVEL > LEVELS['DEBUG']:
+        return
+    _emit(_format('DEBUG', text, args, fields, sys._getframe(1)))
+
+def printinfo(text, *args, **fields):
+    if LOG_LEVEL > LEVELS['INFO']:
+        return
+    _emit(_format('INFO', text, args, fields, sys._getframe(1)))
+
+def printcritical(text, *args, **fields):
+    frame = sys._getframe(1)
+    _emit(_format('CRITICAL', text, args, fields, frame))
+    raise Exception(f"[CRITICAL ERROR - line {frame.f_lineno}] {text % args if args else text}")
+
+# ============================
+# Stage Timing Metrics
+# ============================
+def emit_metric(name, value, unit='Milliseconds', **dimensions):
+    """Print a CloudWatch embedded metric format line; CloudWatch turns it into a metric without an API call."""
+    dimensions = {'FunctionName': FUNCTION_NAME, **dimensions}
+    _emit(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [sorted(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': unit}],
+            }],
+        },
+        name: value,
+        **dimensions,
+    }))
+
+@contextmanager
+def timed(stage):
+    """Time a handler stage (props_load, message_build, sqs_send, input_sizing, emr_submit, emr_poll) as a StageDuration metric."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        emit_metric('StageDuration', round((time.perf_counter() - started) * 1000, 3), Stage=stage)
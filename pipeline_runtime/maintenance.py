@@ -0,0 +1,183 @@
+from pipeline_runtime.clients import get_client
+from pipeline_runtime.config import get_config
+from pipeline_runtime.job_specs import HUDI_SPARK_CONFS, hudi_bundle_jars
+from pipeline_runtime.logs import printdebug, printinfo
+from pipeline_runtime.sizing import apply_spark_sizing, size_spark_job
+from pipeline_runtime.write_profile import DEFAULT_WRITE_PROFILE, file_size_for
+
+# ============================
+# Hudi Table Maintenance
+# ============================
+# Per-file ingestion leaves tables with many small files and a long timeline. On a schedule, the
+# trigger reads each table's timeline and data files and queues at most one table service run:
+#   clustering  HoodieClusteringJob rewrites small file groups into files of the write profile's size
+#   cleaning    HoodieCleaner removes file versions older than the retained commits
+# Ingestion runs hand cleaning over to these runs (hoodie.clean.automatic=false unless the props
+# template sets it). Archival trims the timeline after every commit, including clustering's
+# replacecommit, so it needs no run of its own; its bounds are passed to both services.
+# Maintenance runs go through the scheduler like ingestion, so they never overlap a table's
+# ingestion runs. Per-table overrides go under "maintenance" in the table's sizing profile.
+CLUSTERING_JOB_CLASS = "org.apache.hudi.utilities.HoodieClusteringJob"
+CLEANER_CLASS = "org.apache.hudi.utilities.HoodieCleaner"
+HUDI_TEMPLATES_PREFIX = "props/templates"
+
+DEFAULT_MAINTENANCE = {
+    # Behind every ingestion priority: a table service can wait, fresh data cannot
+    "priority": 9,
+    # Cluster once a table has this many small file groups and either enough commits since the last
+    # clustering or an average file size below the given share of the target file size
+    "clustering_min_small_files": 10,
+    "clustering_min_commits": 24,
+    "clustering_max_avg_file_ratio": 0.25,
+    "clustering_max_groups": 30,
+    "cleaning_min_commits": 10,
+    "cleaner_commits_retained": 10,
+    # Must stay above cleaner_commits_retained
+    "archive_min_commits": 20,
+    "archive_max_commits": 30,
+}
+
+# Confs that move table services out of the ingestion runs
+ASYNC_SERVICE_CONFS = {
+    "hoodie.clean.automatic": "false",
+}
+
+COMMIT_ACTIONS = ("commit", "deltacommit", "replacecommit")
+
+def maintenance_settings(profile):
+    """Maintenance thresholds for a table's resolved sizing profile, with the file sizes of its write profile."""
+    write_profile = {**DEFAULT_WRITE_PROFILE, **profile.get("write", {})}
+    return {
+        "file_sizes": write_profile["file_sizes"],
+        "small_file_ratio": write_profile["small_file_ratio"],
+        **DEFAULT_MAINTENANCE,
+        **profile.get("maintenance", {}),
+    }
+
+def list_hudi_tables():
+    """Tables with a hudi_{table}.props template in the artifactory bucket."""
+    bucket = get_config().artifactory_bucket_name
+    tables = []
+    paginator = get_client('s3').get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{HUDI_TEMPLATES_PREFIX}/hudi_", Delimiter='/'):
+        for obj in page.get('Contents', []):
+            name = obj['Key'].rsplit('/', 1)[1]
+            if name.endswith('.props'):
+                tables.append(name[len("hudi_"):-len(".props")])
+    return sorted(tables)
+
+def table_health(base_path):
+    """Timeline and file layout of a Hudi table from one listing of its base path."""
+    bucket, _, prefix = base_path.split("://", 1)[1].partition("/")
+    prefix = prefix.rstrip('/') + '/'
+    timeline_prefix = f"{prefix}.hoodie/"
+
+    completed = {}
+    pending_replaces = set()
+    file_groups = {}
+    paginator = get_client('s3').get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            if key.startswith(timeline_prefix):
+                name = key[len(timeline_prefix):]
+                # Archived instants, the metadata table and hoodie.properties are not active instants
+                if '/' in name or not name[:1].isdigit():
+                    continue
+                # {instant_time}.{action} once completed, {instant_time}.{action}.requested|inflight before
+                instant_time, _, action = name.partition('.')
+                if '.' not in action:
+                    completed[instant_time] = action
+                elif action.startswith('replacecommit.'):
+                    pending_replaces.add(instant_time)
+            elif key.endswith('.parquet'):
+                # {partition}/{file_id}_{write_token}_{instant_time}.parquet
+                partition, _, name = key[len(prefix):].rpartition('/')
+                parts = name[:-len('.parquet')].rsplit('_', 2)
+                if len(parts) != 3:
+                    continue
+                file_id, _, instant_time = parts
+                file_groups.setdefault((partition, file_id), []).append((instant_time, obj['Size']))
+
+    last_clustering = max((ts for ts, action in completed.items() if action == 'replacecommit'), default='')
+    last_clean = max((ts for ts, action in completed.items() if action == 'clean'), default='')
+    commits = [ts for ts, action in completed.items() if action in COMMIT_ACTIONS]
+    # Latest version of each file group; older versions are what cleaning removes
+    sizes = [max(versions)[1] for versions in file_groups.values()]
+    return {
+        'exists': bool(completed),
+        'latest_instant': max([*completed, *pending_replaces], default=None),
+        'commits_since_clustering': sum(1 for ts in commits if ts > last_clustering),
+        'commits_since_clean': sum(1 for ts in commits if ts > last_clean),
+        'pending_clustering': sorted(pending_replaces - set(completed)),
+        'file_groups': len(sizes),
+        'stale_files': sum(len(versions) - 1 for versions in file_groups.values()),
+        'bytes': sum(sizes),
+        'sizes': sizes,
+    }
+
+def plan_maintenance(health, settings):
+    """The table service a table needs now ('clustering', 'cleaning' or None) and its target file size."""
+    target_file_bytes = file_size_for(health['bytes'], settings["file_sizes"])
+    if not health['exists']:
+        return None, target_file_bytes
+    if health['pending_clustering']:
+        return "clustering", target_file_bytes
+
+    small_files = sum(1 for size in health['sizes'] if size < target_file_bytes * settings["small_file_ratio"])
+    avg_file_bytes = health['bytes'] / health['file_groups'] if health['file_groups'] else 0
+    if small_files >= settings["clustering_min_small_files"] and (
+        health['commits_since_clustering'] >= settings["clustering_min_commits"]
+        or avg_file_bytes < target_file_bytes * settings["clustering_max_avg_file_ratio"]
+    ):
+        return "clustering", target_file_bytes
+    if health['stale_files'] and health['commits_since_clean'] >= settings["cleaning_min_commits"]:
+        return "cleaning", target_file_bytes
+    return None, target_file_bytes
+
+def build_maintenance_event(target_table, base_path, job_type, health, settings, target_file_bytes, profile):
+    """emr_event for a clustering or cleaning run, in the shape the trigger turns into a start_job_run request."""
+    bucket = get_config().artifactory_bucket_name
+    hoodie_conf = {
+        "hoodie.cleaner.policy": "KEEP_LATEST_COMMITS",
+        "hoodie.cleaner.commits.retained": settings["cleaner_commits_retained"],
+        "hoodie.keep.min.commits": settings["archive_min_commits"],
+        "hoodie.keep.max.commits": settings["archive_max_commits"],
+    }
+    arguments = {"props": f"s3://{bucket}/{HUDI_TEMPLATES_PREFIX}/hudi_{target_table}.props"}
+    input_bytes = input_files = 0
+    if job_type == "clustering":
+        small_file_bytes = int(target_file_bytes * settings["small_file_ratio"])
+        hoodie_conf.update({
+            "hoodie.clustering.plan.strategy.small.file.limit": small_file_bytes,
+            "hoodie.clustering.plan.strategy.target.file.max.bytes": target_file_bytes,
+            "hoodie.clustering.plan.strategy.max.num.groups": settings["clustering_max_groups"],
+        })
+        arguments.update({"base-path": base_path, "table-name": target_table})
+        if health['pending_clustering']:
+            # Finish the plan a failed or timed-out run left behind before planning another one
+            arguments.update({"mode": "execute", "instant-time": health['pending_clustering'][0]})
+        else:
+            arguments["mode"] = "scheduleAndExecute"
+        small_sizes = [size for size in health['sizes'] if size < small_file_bytes]
+        input_bytes, input_files = sum(small_sizes), len(small_sizes)
+        job_class = CLUSTERING_JOB_CLASS
+    else:
+        arguments["target-base-path"] = base_path
+        job_class = CLEANER_CLASS
+    arguments["hoodie-conf"] = hoodie_conf
+
+    emr_event = {
+        "jar": hudi_bundle_jars(),
+        "spark_submit_parameters": [*HUDI_SPARK_CONFS, f"--class {job_class}"],
+        "arguments": arguments,
+        "job": {"job_name": f"Hudi_0.14.0_{job_type}_{target_table}_{health['latest_instant']}"},
+    }
+    # Clustering is sized from the small files it rewrites; cleaning only deletes and gets the smallest tier
+    sizing = size_spark_job(input_bytes, input_files, profile)
+    emr_event = apply_spark_sizing(emr_event, dict(sizing, hoodie_conf={}))
+    printinfo("🧹 Planned %s for %s: %s commit(s) since clustering, %s since clean, %s file group(s) in %s byte(s)",
+              job_type, target_table, health['commits_since_clustering'], health['commits_since_clean'],
+              health['file_groups'], health['bytes'], target_table=target_table)
+    printdebug("Maintenance run arguments", arguments=arguments)
+    return emr_event
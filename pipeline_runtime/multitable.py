@@ -0,0 +1,140 @@
+import os
+import re
+from datetime import datetime, timezone
+
+from pipeline_runtime.clients import get_client
+from pipeline_runtime.config import get_config
+from pipeline_runtime.logs import emit_metric, printinfo
+from pipeline_runtime.runs import RUN_PREFIX, RUN_RECORD_TTL_SECONDS, record_ledger_entries
+
+# ============================
+# Multi-Table Streamer Submissions
+# ============================
+# Tables whose sizing profile sets "multi_table": true are packed by the scheduler into one
+# HoodieMultiTableStreamer run, so small CDC tables share one Spark startup and jar fetch. Each
+# submission gets its own folder under props/multitable/{client_token}/ in the artifactory bucket:
+#     common.properties                      tablesToBeIngested and each table's configFile
+#     {database}_{table}_config.properties   the table's rendered hudi_{table}.props plus its base path
+# HoodieMultiTableStreamer logs a failed table and carries on, so a SUCCESS run does not mean every
+# table ingested; each table's outcome is read from a new completed instant on its timeline.
+MULTI_TABLE_STREAMER_CLASS = "org.apache.hudi.utilities.streamer.HoodieMultiTableStreamer"
+MULTI_TABLE_PROPS_PREFIX = "props/multitable"
+MULTI_TABLE_MAX_TABLES = int(os.getenv('MULTI_TABLE_MAX_TABLES', '10'))
+
+# Per-table arguments; everything else must match for tables to share a submission
+TABLE_ARGUMENTS = ("target-table", "target-base-path", "props", "hoodie-conf")
+COMPLETED_INSTANT_SUFFIXES = (".commit", ".deltacommit")
+
+def pack_key(item):
+    """Tables can share a submission when their common streamer arguments and base path prefix match."""
+    arguments = item['stream']['arguments']
+    common = {key: value for key, value in arguments.items() if key not in TABLE_ARGUMENTS}
+    prefix, _, _ = split_base_path(arguments['target-base-path'])
+    return repr((sorted(common.items()), prefix, item['request']['applicationId'], item['request']['executionRoleArn']))
+
+def split_base_path(base_path):
+    """s3a://bucket/database/table/ -> (s3a://bucket, database, table)."""
+    prefix, database, table = base_path.rstrip('/').rsplit('/', 2)
+    return prefix, database, table
+
+def _render_properties(conf):
+    return "".join(f"{key}={value}\n" for key, value in conf.items())
+
+def build_multi_table_request(items, client_token):
+    """Upload the props files for a pack of backlog items and build its start_job_run request.
+
+    Returns the request and, per table, what the reconciler needs to map the outcome back.
+    """
+    s3_client = get_client('s3')
+    bucket = get_config().artifactory_bucket_name
+    folder = f"{MULTI_TABLE_PROPS_PREFIX}/{client_token}"
+
+    common_props = {}
+    tables = {}
+    for item in items:
+        arguments = item['stream']['arguments']
+        base_path = arguments['target-base-path']
+        _, database, table = split_base_path(base_path)
+        table_conf = dict(arguments.get('hoodie-conf', {}))
+        table_conf['hoodie.streamer.ingestion.targetBasePath'] = base_path
+        config_key = f"{folder}/{database}_{table}_config.properties"
+        s3_client.put_object(Bucket=bucket, Key=config_key, Body=_render_properties(table_conf).encode('utf-8'))
+        common_props[f"hoodie.streamer.ingestion.{database}.{table}.configFile"] = f"s3://{bucket}/{config_key}"
+        tables[item['target_table']] = {
+            'base_path': base_path,
+            'message_tokens': item['run'].get('message_tokens', []),
+            'message_ids': item['run'].get('message_ids', []),
+            's3_folders': item['run'].get('s3_folders', []),
+        }
+    common_props['hoodie.streamer.ingestion.tablesToBeIngested'] = ",".join(
+        "{1}.{2}".format(*split_base_path(table['base_path'])) for table in tables.values()
+    )
+    common_key = f"{folder}/common.properties"
+    s3_client.put_object(Bucket=bucket, Key=common_key, Body=_render_properties(common_props).encode('utf-8'))
+
+    # Tables run one after another in the same Spark application, so it needs the largest table's resources
+    largest = max(items, key=lambda item: (item['vcpu'], item['memory_gb']))
+    spark_submit = largest['request']['jobDriver']['sparkSubmit']
+    spark_submit_parameters = re.sub(r"--class\s+\S+", f"--class {MULTI_TABLE_STREAMER_CLASS}", spark_submit['sparkSubmitParameters'])
+
+    arguments = {key: value for key, value in largest['stream']['arguments'].items() if key not in TABLE_ARGUMENTS}
+    prefix, _, _ = split_base_path(largest['stream']['arguments']['target-base-path'])
+    entry_point_arguments = [
+        "--props", f"s3://{bucket}/{common_key}",
+        "--config-folder", f"s3://{bucket}/{folder}",
+        "--base-path-prefix", prefix,
+    ]
+    for key, value in arguments.items():
+        if isinstance(value, bool):
+            if value:
+                entry_point_arguments.append(f"--{key}")
+        else:
+            entry_point_arguments.extend([f"--{key}", f"{value}"])
+
+    request = {
+        'applicationId': largest['request']['applicationId'],
+        'clientToken': client_token,
+        'executionRoleArn': largest['request']['executionRoleArn'],
+        'jobDriver': {
+            'sparkSubmit': {
+                'entryPoint': spark_submit['entryPoint'],
+                'entryPointArguments': entry_point_arguments,
+                'sparkSubmitParameters': spark_submit_parameters,
+            },
+        },
+        'executionTimeoutMinutes': largest['request']['executionTimeoutMinutes'],
+        'name': f"Hudi_0.14.0_multitable_{len(tables)}_tables_{client_token[:12]}",
+    }
+    printinfo("📦 Packed %s table(s) into one multi-table streamer run", len(tables), tables=sorted(tables))
+    return request, tables
+
+def latest_completed_instant(base_path, since):
+    """Newest completed commit/deltacommit on a table's timeline written at or after `since` (epoch seconds)."""
+    bucket, _, prefix = base_path.split("://", 1)[1].partition("/")
+    timeline_prefix = f"{prefix.rstrip('/')}/.hoodie/"
+    since = datetime.fromtimestamp(since, tz=timezone.utc)
+    latest = None
+    paginator = get_client('s3').get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=timeline_prefix, Delimiter='/'):
+        for obj in page.get('Contents', []):
+            name = obj['Key'][len(timeline_prefix):]
+            if name.endswith(COMPLETED_INSTANT_SUFFIXES) and obj['LastModified'] >= since:
+                instant = name.split('.', 1)[0]
+                latest = max(latest or instant, instant)
+    return latest
+
+def record_table_results(store, run, state):
+    """Map a finished multi-table run back to its tables and their messages' ledger entries."""
+    results = {}
+    for target_table, table in run['tables'].items():
+        instant = latest_completed_instant(table['base_path'], run['submitted_at']) if state == 'SUCCESS' else None
+        table_state = 'SUCCESS' if instant else 'FAILED'
+        results[target_table] = {'state': table_state, 'instant': instant}
+        record_ledger_entries(store, table['message_tokens'], run['job_run_id'], table_state)
+        emit_metric('TableIngestion', 1, unit='Count', State=table_state)
+        if table_state == 'FAILED':
+            printinfo("❌ Table %s has no new commit from multi-table run %s", target_table, run['job_run_id'],
+                      target_table=target_table, message_ids=table['message_ids'])
+    run['table_results'] = results
+    store.put(f"{RUN_PREFIX}{run['job_run_id']}", run, RUN_RECORD_TTL_SECONDS)
+    return results
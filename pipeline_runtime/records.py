@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline_runtime.config import get_config
+
+# ============================
+# Concurrent Record Processing
+# ============================
+def process_records(records, process_record, max_workers=None):
+    """Run process_record over every record in a bounded thread pool.
+
+    Returns (record, result, error) tuples in input order; error is None for records that succeeded.
+    One failing record never stops the others.
+    """
+    if not records:
+        return []
+    max_workers = min(max_workers or get_config().max_record_workers, len(records))
+    outcomes = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(process_record, record) for record in records]
+        for record, future in zip(records, futures):
+            try:
+                outcomes.append((record, future.result(), None))
+            except Exception as e:
+                outcomes.append((record, None, e))
+    return outcomes
+
+def fifo_message_group(record):
+    """MessageGroupId of an SQS record (None outside FIFO queues)."""
+    return record.get('attributes', {}).get('MessageGroupId')
+
+def batch_item_failures(outcomes, item_identifier=lambda record: record['messageId'], message_group=None):
+    """Build the partial batch response that makes the event source retry only the failed records.
+
+    outcomes must be in delivery order. With message_group (e.g. fifo_message_group), every record
+    after a failed one in the same group is reported as failed too, so FIFO redelivery keeps the
+    group's order instead of deleting newer messages ahead of the failed one.
+    """
+    failed_groups = set()
+    failures = []
+    for record, _, error in outcomes:
+        group = message_group(record) if message_group else None
+        if error is not None or (group is not None and group in failed_groups):
+            failures.append({"itemIdentifier": item_identifier(record)})
+            if group is not None:
+                failed_groups.add(group)
+    return {"batchItemFailures": failures}
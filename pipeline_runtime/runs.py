@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import time
+
+# ============================
+# EMR Job Run Tracking
+# ============================
+# Submitted runs are recorded under run#{job_run_id} so completion can be tracked outside the
+# trigger Lambda, by the reconciler (batched list_job_runs) or by job-state-change events.
+RUN_PREFIX = "run#"
+# Runs stay under this index until they reach a terminal state
+IN_FLIGHT_INDEX = "run#in-flight"
+TERMINAL_STATES = {"SUCCESS", "FAILED", "CANCELLED"}
+RUN_RECORD_TTL_SECONDS = int(os.getenv('RUN_RECORD_TTL_SECONDS', str(7 * 24 * 3600)))
+
+# Each queued message's run is also recorded in a ledger under ledger#{message_token}, so a
+# redelivered message is recognised before any EMR call. Messages whose run ended FAILED or
+# CANCELLED may be submitted again.
+LEDGER_PREFIX = "ledger#"
+RETRYABLE_STATES = {"FAILED", "CANCELLED"}
+
+def content_token(*parts):
+    """Deterministic 64-character token for JSON-serializable parts (fits start_job_run's clientToken)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def get_ledger_entry(store, message_token):
+    """The ledger entry ({job_run_id, state}) of the message's latest run, or None."""
+    return store.get(f"{LEDGER_PREFIX}{message_token}")
+
+def record_ledger_entries(store, message_tokens, job_run_id, state='SUBMITTED'):
+    for message_token in message_tokens:
+        store.put(
+            f"{LEDGER_PREFIX}{message_token}",
+            {'job_run_id': job_run_id, 'state': state},
+            RUN_RECORD_TTL_SECONDS,
+        )
+
+def record_job_run(store, job_run_id, application_id, **metadata):
+    """Record a newly submitted run as SUBMITTED, with its submission metadata."""
+    now = int(time.time())
+    item = {
+        'job_run_id': job_run_id,
+        'application_id': application_id,
+        'state': 'SUBMITTED',
+        'submitted_at': now,
+        'updated_at': now,
+        **metadata,
+    }
+    store.put(f"{RUN_PREFIX}{job_run_id}", item, RUN_RECORD_TTL_SECONDS, index=IN_FLIGHT_INDEX)
+    return item
+
+def get_job_run_record(store, job_run_id):
+    return store.get(f"{RUN_PREFIX}{job_run_id}")
+
+def in_flight_runs(store):
+    """Every recorded run that has not reached a terminal state."""
+    return [item for _, item in store.query(IN_FLIGHT_INDEX) if item['state'] not in TERMINAL_STATES]
+
+def update_job_run_state(store, job_run_id, state):
+    """Move a recorded run to a new state. Returns (item, changed); item is None if the run is not tracked."""
+    item = get_job_run_record(store, job_run_id)
+    if item is None or item['state'] == state:
+        return item, False
+    now = int(time.time())
+    item['state'] = state
+    item['updated_at'] = now
+    if state in TERMINAL_STATES:
+        item['completed_at'] = now
+    index = None if state in TERMINAL_STATES else IN_FLIGHT_INDEX
+    store.put(f"{RUN_PREFIX}{job_run_id}", item, RUN_RECORD_TTL_SECONDS, index=index)
+    record_ledger_entries(store, item.get('message_tokens', []), job_run_id, state)
+    return item, True
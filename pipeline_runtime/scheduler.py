@@ -0,0 +1,225 @@
+import os
+import re
+import time
+
+from pipeline_runtime.logs import emit_metric, printdebug, printinfo
+from pipeline_runtime.multitable import MULTI_TABLE_MAX_TABLES, build_multi_table_request, pack_key
+from pipeline_runtime.runs import content_token, in_flight_runs, record_job_run, record_ledger_entries
+from pipeline_runtime.sizing import MAX_CAPACITY_MEMORY_GB, MAX_CAPACITY_VCPU, worker_memory_gb
+
+# ============================
+# Capacity-Aware Job Scheduler
+# ============================
+# Prepared start_job_run requests wait under backlog#{client_token}, listed through the state
+# store's backlog index, until the SparkApp has room for them. Admission order:
+#   1. priority from the table's sizing profile (lower first: hot CDC tables ahead of reloads)
+#   2. oldest enqueued first
+# A table never has more than one run in flight (Hudi has a single writer per table), which also
+# keeps one busy table from taking the whole application. Tables in multi-table mode are packed
+# with the compatible ones queued behind them into one HoodieMultiTableStreamer run. The backlog
+# is drained under a lock, by the trigger after it enqueues and by the reconciler whenever runs finish.
+# A failed submission stays queued and is retried with exponential backoff; an item that still fails
+# after SCHEDULER_MAX_SUBMIT_ATTEMPTS moves to backlog-failed#{client_token} and is counted in the
+# BacklogDeadLettered metric, which the template alarms on.
+BACKLOG_PREFIX = "backlog#"
+BACKLOG_INDEX = "backlog"
+DEAD_LETTER_PREFIX = "backlog-failed#"
+SCHEDULER_LOCK_KEY = "scheduler#lock"
+SCHEDULER_LOCK_TTL_SECONDS = int(os.getenv('SCHEDULER_LOCK_TTL_SECONDS', '120'))
+SCHEDULER_MAX_SUBMIT_ATTEMPTS = int(os.getenv('SCHEDULER_MAX_SUBMIT_ATTEMPTS', '5'))
+# Wait before the next attempt doubles from this after every failure
+SCHEDULER_RETRY_BACKOFF_SECONDS = float(os.getenv('SCHEDULER_RETRY_BACKOFF_SECONDS', '60'))
+
+# EMR Serverless defaults for confs a job spec leaves unset
+DEFAULT_SPARK_CONF = {
+    "spark.driver.cores": "4",
+    "spark.driver.memory": "14g",
+    "spark.executor.cores": "4",
+    "spark.executor.memory": "14g",
+    "spark.executor.instances": "3",
+}
+
+def parse_spark_conf(spark_submit_parameters):
+    """The --conf key=value pairs of a sparkSubmitParameters string, over DEFAULT_SPARK_CONF."""
+    conf = dict(DEFAULT_SPARK_CONF)
+    conf.update(re.findall(r"--conf\s+([^=\s]+)=(\S*)", spark_submit_parameters))
+    return conf
+
+def memory_gb(value):
+    """Spark memory setting (2g, 2048m) in GB."""
+    number, unit = re.fullmatch(r"(\d+(?:\.\d+)?)([gGmM]?)", value).groups()
+    return float(number) / 1024 if unit.lower() == "m" else float(number)
+
+def requested_capacity(spark_submit_parameters):
+    """vCPU and worker memory (GB) a job asks of the application: driver plus executor instances."""
+    conf = parse_spark_conf(spark_submit_parameters)
+    executors = int(conf.get("spark.dynamicAllocation.maxExecutors", conf["spark.executor.instances"]))
+    vcpu = int(conf["spark.driver.cores"]) + executors * int(conf["spark.executor.cores"])
+    memory = (
+        worker_memory_gb(memory_gb(conf["spark.driver.memory"]))
+        + executors * worker_memory_gb(memory_gb(conf["spark.executor.memory"]))
+    )
+    return vcpu, memory
+
+def enqueue_job(store, target_table, request, priority, stream=None, multi_table=False, **run_metadata):
+    """Add a prepared start_job_run request to the backlog. Its clientToken doubles as the backlog key.
+
+    stream holds the streamer arguments a multi-table submission is rebuilt from.
+    """
+    vcpu, memory = requested_capacity(request['jobDriver']['sparkSubmit']['sparkSubmitParameters'])
+    item = {
+        'target_table': target_table,
+        'priority': priority,
+        'enqueued_at': time.time(),
+        'vcpu': vcpu,
+        'memory_gb': memory,
+        'attempts': 0,
+        'multi_table': bool(multi_table and stream),
+        'stream': stream,
+        'request': request,
+        'run': run_metadata,
+    }
+    store.put(f"{BACKLOG_PREFIX}{request['clientToken']}", item, index=BACKLOG_INDEX)
+    printinfo("🗂️ Queued %s (%s vCPU / %s GB, priority %s)", request['name'], vcpu, memory, priority,
+              target_table=target_table)
+    return item
+
+def backlog(store):
+    """(key, item) pairs of the queued jobs in admission order."""
+    return sorted(store.query(BACKLOG_INDEX), key=lambda entry: (entry[1]['priority'], entry[1]['enqueued_at']))
+
+def table_is_scheduled(store, target_table):
+    """Whether a table already has a run queued in the backlog or in flight."""
+    if any(item['target_table'] == target_table for _, item in store.query(BACKLOG_INDEX)):
+        return True
+    return any(
+        target_table == run.get('target_table') or target_table in run.get('target_tables', [])
+        for run in in_flight_runs(store)
+    )
+
+def _submit(store, client, key, item):
+    request = item['request']
+    response = client.start_job_run(**request)
+    run_id = response['jobRunId']
+    run = record_job_run(
+        store, run_id, request['applicationId'],
+        target_table=item['target_table'],
+        vcpu=item['vcpu'],
+        memory_gb=item['memory_gb'],
+        priority=item['priority'],
+        **item['run'],
+    )
+    record_ledger_entries(store, item['run'].get('message_tokens', []), run_id)
+    store.delete(key)
+    wait = round(time.time() - item['enqueued_at'], 3)
+    printinfo("🚦 Admitted %s as run %s after %ss in the backlog", request['name'], run_id, wait,
+              target_table=item['target_table'])
+    emit_metric('BacklogWait', wait, unit='Seconds')
+    return run
+
+def _submit_pack(store, client, pack):
+    """Submit a pack of multi-table items as one run covering all of their tables and messages."""
+    keys = sorted(key for key, _ in pack)
+    items = [item for _, item in pack]
+    request, tables = build_multi_table_request(items, content_token(*keys))
+    response = client.start_job_run(**request)
+    run_id = response['jobRunId']
+    message_tokens = [token for table in tables.values() for token in table['message_tokens']]
+    run = record_job_run(
+        store, run_id, request['applicationId'],
+        job_name=request['name'],
+        target_tables=sorted(tables),
+        tables=tables,
+        vcpu=max(item['vcpu'] for item in items),
+        memory_gb=max(item['memory_gb'] for item in items),
+        priority=min(item['priority'] for item in items),
+        message_tokens=message_tokens,
+    )
+    record_ledger_entries(store, message_tokens, run_id)
+    now = time.time()
+    for key, item in pack:
+        store.delete(key)
+        emit_metric('BacklogWait', round(now - item['enqueued_at'], 3), unit='Seconds')
+    printinfo("🚦 Admitted %s table(s) as multi-table run %s", len(tables), run_id, target_tables=sorted(tables))
+    return run
+
+def _record_submit_failure(store, key, item, error):
+    item['attempts'] += 1
+    item['last_error'] = str(error)
+    if item['attempts'] < SCHEDULER_MAX_SUBMIT_ATTEMPTS:
+        backoff = SCHEDULER_RETRY_BACKOFF_SECONDS * 2 ** (item['attempts'] - 1)
+        item['retry_at'] = time.time() + backoff
+        printinfo("❌ Submitting %s failed (attempt %s), retrying in %ss: %s", item['request']['name'], item['attempts'],
+                  backoff, error, target_table=item['target_table'])
+        store.put(key, item, index=BACKLOG_INDEX)
+        emit_metric('BacklogSubmitRetry', 1, unit='Count')
+        return
+    printinfo("☠️ Giving up on %s after %s attempts: %s", item['request']['name'], item['attempts'], error,
+              target_table=item['target_table'])
+    store.put(f"{DEAD_LETTER_PREFIX}{key[len(BACKLOG_PREFIX):]}", item)
+    store.delete(key)
+    record_ledger_entries(store, item['run'].get('message_tokens', []), None, 'FAILED')
+    emit_metric('BacklogDeadLettered', 1, unit='Count')
+
+def drain_backlog(store, client):
+    """Submit queued jobs while the application has capacity. Returns the run records admitted."""
+    if not store.put_if_absent(SCHEDULER_LOCK_KEY, {'locked_at': time.time()}, SCHEDULER_LOCK_TTL_SECONDS):
+        printdebug("Backlog is being drained by another invocation")
+        return []
+
+    admitted = []
+    try:
+        runs = in_flight_runs(store)
+        used_vcpu = sum(run.get('vcpu', 0) for run in runs)
+        used_memory = sum(run.get('memory_gb', 0) for run in runs)
+        busy_tables = {run.get('target_table') for run in runs}
+        busy_tables.update(table for run in runs for table in run.get('target_tables', []))
+
+        queued = backlog(store)
+        now = time.time()
+        # Items backing off after a failed submission neither run nor hold the line
+        ready = [(key, item) for key, item in queued if item.get('retry_at', 0) <= now]
+        packed = set()
+        for index, (key, item) in enumerate(ready):
+            if key in packed or item['target_table'] in busy_tables:
+                continue
+            over_capacity = used_vcpu + item['vcpu'] > MAX_CAPACITY_VCPU or used_memory + item['memory_gb'] > MAX_CAPACITY_MEMORY_GB
+            # An idle application admits anything, so a job bigger than the whole capacity cannot block the backlog
+            if over_capacity and (used_vcpu or used_memory):
+                # Hold the line so smaller jobs behind it cannot starve it
+                printinfo("⏳ %s waits for capacity: %s/%s vCPU and %s/%s GB in use", item['request']['name'],
+                          used_vcpu, MAX_CAPACITY_VCPU, used_memory, MAX_CAPACITY_MEMORY_GB)
+                break
+
+            pack = [(key, item)]
+            if item['multi_table']:
+                for other_key, other in ready[index + 1:]:
+                    if len(pack) >= MULTI_TABLE_MAX_TABLES:
+                        break
+                    if (other['multi_table'] and other_key not in packed
+                            and other['target_table'] not in busy_tables
+                            and other['target_table'] not in {packed_item['target_table'] for _, packed_item in pack}
+                            and other['vcpu'] <= item['vcpu'] and other['memory_gb'] <= item['memory_gb']
+                            and pack_key(other) == pack_key(item)):
+                        pack.append((other_key, other))
+
+            try:
+                if len(pack) > 1:
+                    admitted.append(_submit_pack(store, client, pack))
+                else:
+                    admitted.append(_submit(store, client, key, item))
+            except Exception as e:
+                for failed_key, failed_item in pack:
+                    _record_submit_failure(store, failed_key, failed_item, e)
+                continue
+            for packed_key, packed_item in pack:
+                packed.add(packed_key)
+                busy_tables.add(packed_item['target_table'])
+            used_vcpu += item['vcpu']
+            used_memory += item['memory_gb']
+
+        emit_metric('BacklogDepth', len(queued) - len(packed), unit='Count')
+        emit_metric('CapacityInUse', used_vcpu, unit='Count', Resource='vCPU')
+        return admitted
+    finally:
+        store.delete(SCHEDULER_LOCK_KEY)
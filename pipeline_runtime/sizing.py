@@ -0,0 +1,233 @@
+import json
+import math
+import os
+import threading
+import time
+
+from pipeline_runtime.clients import get_client
+from pipeline_runtime.config import get_config
+from pipeline_runtime.logs import printdebug, printinfo
+
+# ============================
+# Spark Resource Sizing
+# ============================
+# HoodieStreamer runs are sized from the parquet bytes and file count they will read: the objects
+# under the source root newer than the table's last streamer checkpoint.
+# Profiles are tuned per table in props/sizing/spark_profiles.json (artifactory bucket):
+#     {"default": {"max_executors": 8}, "tables": {"orders": {"bytes_per_executor": 536870912}}}
+# A table profile overrides "default", which overrides DEFAULT_PROFILE. Each tier applies to inputs
+# up to max_input_bytes (null = no limit) and sets the worker shapes. "priority" orders the
+# scheduler's backlog (lower runs first); "multi_table" lets the scheduler pack the table with
+# others into one HoodieMultiTableStreamer run; "write" overrides the Hudi write profile thresholds
+# (see pipeline_runtime.write_profile).
+SIZING_PROFILES_KEY = "props/sizing/spark_profiles.json"
+SIZING_PROFILES_CACHE_TTL_SECONDS = int(os.getenv('SPARK_SIZING_PROFILES_TTL_SECONDS', '300'))
+
+# Must match SparkApp MaximumCapacity in template.yaml
+MAX_CAPACITY_VCPU = int(os.getenv('SPARK_MAX_CAPACITY_VCPU', '32'))
+MAX_CAPACITY_MEMORY_GB = int(os.getenv('SPARK_MAX_CAPACITY_MEMORY_GB', '128'))
+# EMR Serverless sizes a worker as spark memory plus the memory overhead, rounded up to whole GB
+MEMORY_OVERHEAD_FACTOR = 0.1
+# Where HoodieStreamer keeps its source checkpoint in commit metadata (newest key first)
+STREAMER_CHECKPOINT_KEYS = ("streamer.checkpoint.key.v2", "deltastreamer.checkpoint.key")
+STREAMER_COMMIT_ACTIONS = ("commit", "deltacommit")
+
+GIB = 1024 ** 3
+MIB = 1024 ** 2
+
+DEFAULT_PROFILE = {
+    "priority": 5,
+    "multi_table": False,
+    "bytes_per_executor": 1 * GIB,
+    "files_per_executor": 500,
+    "min_executors": 1,
+    "max_executors": 16,
+    "bytes_per_partition": 128 * MIB,
+    "min_shuffle_partitions": 2,
+    "max_shuffle_partitions": 2000,
+    "tiers": [
+        {"max_input_bytes": 256 * MIB, "driver_cores": 1, "driver_memory_gb": 2, "executor_cores": 1, "executor_memory_gb": 2},
+        {"max_input_bytes": 4 * GIB, "driver_cores": 2, "driver_memory_gb": 2, "executor_cores": 2, "executor_memory_gb": 4},
+        {"max_input_bytes": None, "driver_cores": 2, "driver_memory_gb": 4, "executor_cores": 4, "executor_memory_gb": 12},
+    ],
+}
+
+# Confs owned by the sizer; any value for them in the job spec is replaced
+SIZED_SPARK_CONFS = (
+    "spark.driver.cores",
+    "spark.driver.memory",
+    "spark.executor.cores",
+    "spark.executor.memory",
+    "spark.executor.instances",
+    "spark.dynamicAllocation.maxExecutors",
+    "spark.sql.shuffle.partitions",
+    "spark.default.parallelism",
+)
+# Hudi parallelism is only filled in when the table's props template leaves it unset
+SIZED_HOODIE_CONFS = (
+    "hoodie.upsert.shuffle.parallelism",
+    "hoodie.insert.shuffle.parallelism",
+    "hoodie.bulkinsert.shuffle.parallelism",
+)
+
+_SIZING_PROFILES = {}
+_SIZING_PROFILES_LOCK = threading.Lock()
+
+def load_sizing_profiles():
+    """Fetch the sizing profiles document, re-reading it at most once per TTL. Missing document = defaults only."""
+    from botocore.exceptions import ClientError
+
+    now = time.time()
+    with _SIZING_PROFILES_LOCK:
+        if _SIZING_PROFILES and now - _SIZING_PROFILES['checked_at'] < SIZING_PROFILES_CACHE_TTL_SECONDS:
+            return _SIZING_PROFILES['profiles']
+
+    bucket = get_config().artifactory_bucket_name
+    try:
+        response = get_client('s3').get_object(Bucket=bucket, Key=SIZING_PROFILES_KEY)
+        profiles = json.loads(response['Body'].read())
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+        printdebug("No sizing profiles at s3://%s/%s, using defaults", bucket, SIZING_PROFILES_KEY)
+        profiles = {}
+
+    with _SIZING_PROFILES_LOCK:
+        _SIZING_PROFILES.update(profiles=profiles, checked_at=now)
+    return profiles
+
+def resolve_profile(target_table, profiles=None):
+    """Merge DEFAULT_PROFILE, the document's default and the table's own profile."""
+    profiles = load_sizing_profiles() if profiles is None else profiles
+    return {
+        **DEFAULT_PROFILE,
+        **profiles.get("default", {}),
+        **profiles.get("tables", {}).get(target_table, {}),
+    }
+
+def split_s3_uri(uri):
+    bucket, _, prefix = uri.split("://", 1)[1].partition("/")
+    return bucket, prefix
+
+def streamer_checkpoint(base_path):
+    """Source checkpoint of the table's latest HoodieStreamer commit, or None before its first commit.
+
+    ParquetDFSSource checkpoints the newest modification time it read, in epoch milliseconds.
+    """
+    bucket, prefix = split_s3_uri(base_path)
+    timeline_prefix = f"{prefix.rstrip('/')}/.hoodie/"
+    s3_client = get_client('s3')
+    instants = []
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=timeline_prefix, Delimiter='/'):
+        for obj in page.get('Contents', []):
+            name = obj['Key'][len(timeline_prefix):]
+            # Completed ingestion instants only: {instant_time}.commit or .deltacommit
+            instant_time, _, action = name.partition('.')
+            if instant_time.isdigit() and action in STREAMER_COMMIT_ACTIONS:
+                instants.append(obj['Key'])
+    # Table services commit too, without a checkpoint: walk back to the newest ingestion commit
+    for key in sorted(instants, reverse=True):
+        metadata = json.loads(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read() or b'{}')
+        extra = metadata.get('extraMetadata') or {}
+        for checkpoint_key in STREAMER_CHECKPOINT_KEYS:
+            if extra.get(checkpoint_key):
+                return int(extra[checkpoint_key])
+    return None
+
+def measure_input(folders, newer_than=None):
+    """Total bytes and file count of the parquet objects under the given s3:// folders.
+
+    newer_than (epoch milliseconds) keeps only the objects modified after a streamer checkpoint.
+    """
+    s3_client = get_client('s3')
+    total_bytes = total_files = 0
+    for folder in folders:
+        bucket, prefix = split_s3_uri(folder)
+        for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if not obj['Key'].endswith('.parquet'):
+                    continue
+                # Hudi compares modification times in whole milliseconds
+                if newer_than is not None and int(obj['LastModified'].timestamp() * 1000) <= newer_than:
+                    continue
+                total_bytes += obj['Size']
+                total_files += 1
+    return total_bytes, total_files
+
+def worker_memory_gb(spark_memory_gb):
+    return math.ceil(spark_memory_gb * (1 + MEMORY_OVERHEAD_FACTOR))
+
+def size_spark_job(input_bytes, input_files, profile):
+    """Pick driver/executor shapes, executor count and shuffle parallelism for an input, within MaximumCapacity."""
+    tier = next(
+        tier for tier in profile["tiers"]
+        if tier.get("max_input_bytes") is None or input_bytes <= tier["max_input_bytes"]
+    )
+
+    wanted = max(
+        math.ceil(input_bytes / profile["bytes_per_executor"]),
+        math.ceil(input_files / profile["files_per_executor"]),
+    )
+    executors = min(max(wanted, profile["min_executors"]), profile["max_executors"])
+
+    # Whatever the driver leaves of the application capacity bounds the executor count
+    fit_by_cpu = (MAX_CAPACITY_VCPU - tier["driver_cores"]) // tier["executor_cores"]
+    fit_by_memory = (
+        (MAX_CAPACITY_MEMORY_GB - worker_memory_gb(tier["driver_memory_gb"]))
+        // worker_memory_gb(tier["executor_memory_gb"])
+    )
+    if min(fit_by_cpu, fit_by_memory) < 1:
+        raise ValueError(f"Sizing tier {tier} does not fit in {MAX_CAPACITY_VCPU} vCPU / {MAX_CAPACITY_MEMORY_GB} GB")
+    executors = min(executors, fit_by_cpu, fit_by_memory)
+
+    total_cores = executors * tier["executor_cores"]
+    partitions = max(math.ceil(input_bytes / profile["bytes_per_partition"]), total_cores, profile["min_shuffle_partitions"])
+    partitions = min(partitions, profile["max_shuffle_partitions"])
+
+    spark_conf = {
+        "spark.driver.cores": tier["driver_cores"],
+        "spark.driver.memory": f"{tier['driver_memory_gb']}g",
+        "spark.executor.cores": tier["executor_cores"],
+        "spark.executor.memory": f"{tier['executor_memory_gb']}g",
+        "spark.executor.instances": executors,
+        "spark.dynamicAllocation.maxExecutors": executors,
+        "spark.sql.shuffle.partitions": partitions,
+        "spark.default.parallelism": partitions,
+    }
+    hoodie_conf = {key: partitions for key in SIZED_HOODIE_CONFS}
+    return {
+        "input_bytes": input_bytes,
+        "input_files": input_files,
+        "spark_conf": spark_conf,
+        "hoodie_conf": hoodie_conf,
+    }
+
+def apply_spark_sizing(emr_event, sizing):
+    """Return a copy of emr_event with the sized confs replacing the job spec's resource settings."""
+    spark_submit_parameters = [
+        parameter for parameter in emr_event.get("spark_submit_parameters", [])
+        if not any(parameter.startswith(f"--conf {key}=") for key in SIZED_SPARK_CONFS)
+    ]
+    # Keep --class last, after the sized confs
+    class_parameters = [parameter for parameter in spark_submit_parameters if parameter.startswith("--class ")]
+    spark_submit_parameters = [parameter for parameter in spark_submit_parameters if parameter not in class_parameters]
+    spark_submit_parameters += [f"--conf {key}={value}" for key, value in sizing["spark_conf"].items()]
+    spark_submit_parameters += class_parameters
+
+    arguments = dict(emr_event.get("arguments", {}))
+    arguments["hoodie-conf"] = {**sizing["hoodie_conf"], **arguments.get("hoodie-conf", {})}
+    return dict(emr_event, spark_submit_parameters=spark_submit_parameters, arguments=arguments)
+
+def size_emr_event(emr_event, target_table, folders, measured=None):
+    """Measure a run's input folders (unless already measured) and size its Spark resources from the table's profile."""
+    input_bytes, input_files = measured or measure_input(folders)
+    sizing = size_spark_job(input_bytes, input_files, resolve_profile(target_table))
+    printinfo(
+        "📐 Sized %s for %s byte(s) in %s file(s): %s executor(s) x %s core(s) / %s",
+        target_table, input_bytes, input_files,
+        sizing["spark_conf"]["spark.executor.instances"],
+        sizing["spark_conf"]["spark.executor.cores"],
+        sizing["spark_conf"]["spark.executor.memory"],
+        target_table=target_table, spark_conf=sizing["spark_conf"],
+    )
+    return apply_spark_sizing(emr_event, sizing), sizing
@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+
+from pipeline_runtime.clients import get_client
+from pipeline_runtime.config import get_config
+
+# ============================
+# Pipeline State Stores
+# ============================
+# Both stores keep JSON-serializable items under string keys. Keys are namespaced by a prefix
+# (coalesce#..., run#...) so one table serves every feature. Items stored with a TTL are
+# treated as absent once they expire; items stored without one never expire.
+# Items the hot path has to list (in-flight runs, the backlog) are also put under an index name
+# and read back with query(index): in DynamoDB that is a sparse GSI keyed on the index name, so
+# listing them never reads the ledger and run history sharing the table. An item rewritten
+# without an index leaves it.
+class InMemoryStateStore:
+    """State store kept in the container's memory, used for tests and when no table is configured."""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        current = self._items.get(key)
+        if current and (current['expires_at'] is None or current['expires_at'] > now):
+            return current
+        return None
+
+    def get(self, key):
+        """Return the item stored under key, or None."""
+        with self._lock:
+            current = self._live(key, time.time())
+            return json.loads(json.dumps(current['item'])) if current else None
+
+    def put(self, key, item, ttl_seconds=None, index=None):
+        """Store item under key (and index, if given), replacing any existing item."""
+        now = time.time()
+        with self._lock:
+            self._items[key] = {'item': item, 'expires_at': now + ttl_seconds if ttl_seconds else None, 'index': index}
+
+    def put_if_absent(self, key, item, ttl_seconds=None, index=None):
+        """Store item under key unless an unexpired item already exists. Returns True if stored."""
+        now = time.time()
+        with self._lock:
+            if self._live(key, now):
+                return False
+            self._items[key] = {'item': item, 'expires_at': now + ttl_seconds if ttl_seconds else None, 'index': index}
+            return True
+
+    def query(self, index):
+        """Return (key, item) pairs for every unexpired item stored under index, in key order."""
+        now = time.time()
+        with self._lock:
+            return [
+                (key, json.loads(json.dumps(self._items[key]['item'])))
+                for key in sorted(self._items)
+                if self._items[key]['index'] == index and self._live(key, now)
+            ]
+
+    def scan(self, prefix):
+        """Return (key, item) pairs for every unexpired item whose key starts with prefix."""
+        now = time.time()
+        with self._lock:
+            return [
+                (key, json.loads(json.dumps(self._items[key]['item'])))
+                for key in list(self._items)
+                if key.startswith(prefix) and self._live(key, now)
+            ]
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+class DynamoDBStateStore:
+    """State store backed by a DynamoDB table with a string `pk` hash key and an `expires_at` TTL attribute.
+
+    Indexed items carry an `idx` attribute, the hash key of the table's `by-index` GSI (range key `pk`).
+    """
+
+    INDEX_NAME = "by-index"
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    @staticmethod
+    def _to_item(key, item, ttl_seconds, index=None):
+        record = {'pk': {'S': key}, 'data': {'S': json.dumps(item)}}
+        if ttl_seconds:
+            record['expires_at'] = {'N': str(int(time.time()) + ttl_seconds)}
+        if index:
+            record['idx'] = {'S': index}
+        return record
+
+    @staticmethod
+    def _is_live(record, now):
+        return 'expires_at' not in record or int(record['expires_at']['N']) > now
+
+    def get(self, key):
+        """Return the item stored under key, or None."""
+        response = get_client('dynamodb').get_item(
+            TableName=self.table_name, Key={'pk': {'S': key}}, ConsistentRead=True,
+        )
+        record = response.get('Item')
+        if record and self._is_live(record, int(time.time())):
+            return json.loads(record['data']['S'])
+        return None
+
+    def put(self, key, item, ttl_seconds=None, index=None):
+        """Store item under key (and index, if given), replacing any existing item."""
+        get_client('dynamodb').put_item(TableName=self.table_name, Item=self._to_item(key, item, ttl_seconds, index))
+
+    def put_if_absent(self, key, item, ttl_seconds=None, index=None):
+        """Store item under key unless an unexpired item already exists. Returns True if stored."""
+        dynamodb = get_client('dynamodb')
+        try:
+            dynamodb.put_item(
+                TableName=self.table_name,
+                Item=self._to_item(key, item, ttl_seconds, index),
+                ConditionExpression='attribute_not_exists(pk) OR expires_at < :now',
+                ExpressionAttributeValues={':now': {'N': str(int(time.time()))}},
+            )
+            return True
+        except dynamodb.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def scan(self, prefix):
+        """Return (key, item) pairs for every unexpired item whose key starts with prefix."""
+        now = int(time.time())
+        paginator = get_client('dynamodb').get_paginator('scan')
+        items = []
+        for page in paginator.paginate(
+            TableName=self.table_name,
+            FilterExpression='begins_with(pk, :prefix)',
+            ExpressionAttributeValues={':prefix': {'S': prefix}},
+        ):
+            for record in page.get('Items', []):
+                if self._is_live(record, now):
+                    items.append((record['pk']['S'], json.loads(record['data']['S'])))
+        return items
+
+    def query(self, index):
+        """Return (key, item) pairs for every unexpired item stored under index, in key order."""
+        now = int(time.time())
+        paginator = get_client('dynamodb').get_paginator('query')
+        items = []
+        for page in paginator.paginate(
+            TableName=self.table_name,
+            IndexName=self.INDEX_NAME,
+            KeyConditionExpression='idx = :index',
+            ExpressionAttributeValues={':index': {'S': index}},
+        ):
+            for record in page.get('Items', []):
+                if self._is_live(record, now):
+                    items.append((record['pk']['S'], json.loads(record['data']['S'])))
+        return items
+
+    def delete(self, key):
+        get_client('dynamodb').delete_item(TableName=self.table_name, Key={'pk': {'S': key}})
+
+def create_state_store(table_name=None):
+    """Build a state store: DynamoDB when a table (or PIPELINE_STATE_TABLE) is set, in-memory otherwise."""
+    table_name = table_name or get_config().pipeline_state_table
+    if table_name:
+        return DynamoDBStateStore(table_name)
+    return InMemoryStateStore()
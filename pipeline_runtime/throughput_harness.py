@@ -0,0 +1,598 @@
+"""Local end-to-end throughput harness for the S3 -> SQS -> EMR pipeline.
+
+Drives the real send-s3-events-to-fifo-queue, trigger-emr-jobs and reconcile-emr-jobs handlers
+in-process against fakes for S3, FIFO SQS (message-group ordering, content-based deduplication)
+and EMR Serverless (configurable job durations), so throughput and latency can be compared
+between versions without deploying:
+
+    python -m pipeline_runtime.throughput_harness --objects 10000 --tables 50 --output throughput.jsonl
+
+Every run reports objects/s, enqueue-to-submit latency percentiles, API calls per operation,
+EMR runs started and the uploaded objects no successful run ingested (also counted as an error). With --output the result is appended as a JSON line tagged with the git
+revision, and compared with the last stored result for the same parameters.
+"""
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from pipeline_runtime.cold_start_benchmark import percentile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HARNESS_ENV = {
+    "SQS_QUEUE_URL": "https://sqs.local/000000000000",
+    "ARTIFACTORY_BUCKET_NAME": "artifactory",
+    "STAGE_BUCKET_NAME": "stage",
+    "RAW_BUCKET_NAME": "raw",
+    "EMR_APPLICATION_ID": "app-local",
+    "EMR_EXECUTION_ROLE_ARN": "arn:aws:iam::000000000000:role/emr-local",
+    "JOB_TRACKING_MODE": "async",
+    "LOG_LEVEL": "WARNING",
+}
+
+PROPS_TEMPLATE = """hoodie.table.name={table}
+hoodie.datasource.write.table.name={table}
+hoodie.datasource.write.operation=upsert
+hoodie.datasource.write.recordkey.field=id
+hoodie.datasource.write.precombine.field=source_timestamp
+hoodie.streamer.source.dfs.root=${{s3_folder_uri}}
+hoodie.datasource.hive_sync.table={table}
+"""
+
+SQS_VISIBILITY_TIMEOUT_SECONDS = 960
+SQS_DEDUPLICATION_INTERVAL_SECONDS = 300
+
+# ============================
+# API Call Accounting
+# ============================
+class CallCounter:
+    """Thread-safe count of fake AWS API calls by service:Operation."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, service, operation):
+        with self._lock:
+            self.calls[f"{service}:{operation}"] += 1
+
+def _client_error(code, operation):
+    from botocore.exceptions import ClientError
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+class _Paginator:
+    def __init__(self, pages):
+        self._pages = pages
+
+    def paginate(self, **kwargs):
+        return self._pages(**kwargs)
+
+# ============================
+# Fake S3
+# ============================
+class FakeS3:
+    """Objects in memory, with ETags, conditional GETs and paginated listings."""
+
+    def __init__(self, count):
+        self._count = count
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def put(self, bucket, key, body):
+        body = body if isinstance(body, bytes) else body.encode('utf-8')
+        with self._lock:
+            self._objects[(bucket, key)] = {
+                'body': body,
+                'etag': '"%s"' % hashlib.md5(body).hexdigest(),
+                'last_modified': datetime.now(timezone.utc),
+            }
+
+    def read(self, bucket, key):
+        return self._objects[(bucket, key)]['body'].decode('utf-8')
+
+    def objects(self, bucket, prefix):
+        """(key, last_modified) of every object under a prefix, without counting an API call."""
+        with self._lock:
+            return [(key, obj['last_modified']) for (obj_bucket, key), obj in self._objects.items()
+                    if obj_bucket == bucket and key.startswith(prefix)]
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        self._count('s3', 'GetObject')
+        obj = self._objects.get((Bucket, Key))
+        if obj is None:
+            raise _client_error('NoSuchKey', 'GetObject')
+        if IfNoneMatch == obj['etag']:
+            raise _client_error('304', 'GetObject')
+        return {'Body': io.BytesIO(obj['body']), 'ETag': obj['etag']}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._count('s3', 'HeadObject')
+        obj = self._objects.get((Bucket, Key))
+        if obj is None:
+            raise _client_error('404', 'HeadObject')
+        return {'ETag': obj['etag'], 'ContentLength': len(obj['body'])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._count('s3', 'PutObject')
+        self.put(Bucket, Key, Body)
+        return {}
+
+    def _list_pages(self, Bucket, Prefix='', Delimiter=None):
+        with self._lock:
+            keys = sorted(key for bucket, key in self._objects if bucket == Bucket and key.startswith(Prefix))
+        if Delimiter:
+            keys = [key for key in keys if Delimiter not in key[len(Prefix):]]
+        for start in range(0, max(len(keys), 1), 1000):
+            self._count('s3', 'ListObjectsV2')
+            yield {'Contents': [
+                {'Key': key, 'Size': len(self._objects[(Bucket, key)]['body']),
+                 'LastModified': self._objects[(Bucket, key)]['last_modified']}
+                for key in keys[start:start + 1000]
+            ]}
+
+    def get_paginator(self, operation):
+        return _Paginator(self._list_pages)
+
+# ============================
+# Fake FIFO SQS
+# ============================
+class FakeFifoSQS:
+    """FIFO queues: in-order delivery per message group, one in-flight batch per group, content-based deduplication."""
+
+    def __init__(self, count):
+        self._count = count
+        self._queues = {}
+        self._dedup = {}
+        self._lock = threading.Lock()
+        self.sent_at = {}
+        self.deduplicated = 0
+        self.redelivered = 0
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self._count('sqs', 'SendMessageBatch')
+        now = time.perf_counter()
+        successful = []
+        with self._lock:
+            queue = self._queues.setdefault(QueueUrl, [])
+            for entry in Entries:
+                dedup_id = entry.get('MessageDeduplicationId') or hashlib.sha256(entry['MessageBody'].encode('utf-8')).hexdigest()
+                previous = self._dedup.get((QueueUrl, dedup_id))
+                if previous and now - previous['at'] < SQS_DEDUPLICATION_INTERVAL_SECONDS:
+                    self.deduplicated += 1
+                    successful.append({'Id': entry['Id'], 'MessageId': previous['message_id']})
+                    continue
+                message_id = f"m-{len(self.sent_at)}"
+                queue.append({
+                    'messageId': message_id,
+                    'body': entry['MessageBody'],
+                    'group': entry['MessageGroupId'],
+                    'visible_at': now,
+                    'receive_count': 0,
+                })
+                self._dedup[(QueueUrl, dedup_id)] = {'at': now, 'message_id': message_id}
+                self.sent_at[message_id] = now
+                successful.append({'Id': entry['Id'], 'MessageId': message_id})
+        return {'Successful': successful, 'Failed': []}
+
+    def receive(self, queue_url, max_messages=10):
+        """What the Lambda event source mapping receives: a batch respecting message-group order."""
+        now = time.perf_counter()
+        with self._lock:
+            queue = self._queues.get(queue_url, [])
+            if not queue:
+                return []
+            self._count('sqs', 'ReceiveMessage')
+            blocked_groups = {message['group'] for message in queue if message['visible_at'] > now}
+            batch = []
+            for message in queue:
+                if len(batch) >= max_messages:
+                    break
+                if message['group'] in blocked_groups:
+                    continue
+                if message['visible_at'] > now:
+                    continue
+                batch.append(message)
+            for message in batch:
+                message['visible_at'] = now + SQS_VISIBILITY_TIMEOUT_SECONDS
+                message['receive_count'] += 1
+                if message['receive_count'] > 1:
+                    self.redelivered += 1
+            return batch
+
+    def settle(self, queue_url, batch, failed_ids):
+        """Delete the messages that succeeded and make the failed ones visible again."""
+        with self._lock:
+            self._count('sqs', 'DeleteMessageBatch')
+            queue = self._queues[queue_url]
+            done = {message['messageId'] for message in batch} - set(failed_ids)
+            queue[:] = [message for message in queue if message['messageId'] not in done]
+            for message in queue:
+                if message['messageId'] in failed_ids:
+                    message['visible_at'] = time.perf_counter()
+
+    def queue_urls(self):
+        with self._lock:
+            return [url for url, queue in self._queues.items() if queue]
+
+# ============================
+# Fake EMR Serverless
+# ============================
+class FakeEMRServerless:
+    """Job runs that succeed (or fail at --job-failure-rate) after startup + per-table seconds.
+
+    Like ParquetDFSSource, each run reads the objects under its tables' source roots that are newer
+    than the table's checkpoint, listed when the run starts. Successful runs mark those objects
+    ingested, move the checkpoint to the newest of them and write a completed commit carrying it on
+    each target table's timeline in the fake S3.
+    """
+
+    def __init__(self, count, s3, startup_seconds, table_seconds, failure_rate, rng):
+        self._count = count
+        self._s3 = s3
+        self._startup_seconds = startup_seconds
+        self._table_seconds = table_seconds
+        self._failure_rate = failure_rate
+        self._rng = rng
+        self._runs = {}
+        self._by_token = {}
+        self._checkpoints = {}
+        self._lock = threading.Lock()
+        self.started_at = {}
+        self.ingested = set()
+
+    def _read_properties(self, uri):
+        bucket, _, key = uri.split('://', 1)[1].partition('/')
+        return dict(line.split('=', 1) for line in self._s3.read(bucket, key).splitlines() if '=' in line)
+
+    def _tables(self, request):
+        """{base_path: hoodie conf} of the tables a run writes."""
+        arguments = request['jobDriver']['sparkSubmit']['entryPointArguments']
+        if '--target-base-path' in arguments:
+            conf = dict(
+                arguments[index + 1].split('=', 1)
+                for index, argument in enumerate(arguments) if argument == '--hoodie-conf'
+            )
+            return {arguments[arguments.index('--target-base-path') + 1]: conf}
+        common = self._read_properties(arguments[arguments.index('--props') + 1])
+        tables = {}
+        for name, value in common.items():
+            if name.endswith('.configFile'):
+                conf = self._read_properties(value)
+                tables[conf['hoodie.streamer.ingestion.targetBasePath']] = conf
+        return tables
+
+    def _source_objects(self, base_path, conf):
+        """Objects under the source root newer than the table's checkpoint: {key: last_modified}."""
+        source_root = conf.get('hoodie.streamer.source.dfs.root')
+        if not source_root:
+            return {}
+        bucket, _, prefix = source_root.split('://', 1)[1].partition('/')
+        checkpoint = self._checkpoints.get(base_path)
+        return {
+            f"{bucket}/{key}": last_modified
+            for key, last_modified in self._s3.objects(bucket, prefix)
+            if checkpoint is None or last_modified > checkpoint
+        }
+
+    def start_job_run(self, **request):
+        self._count('emr-serverless', 'StartJobRun')
+        with self._lock:
+            run_id = self._by_token.get(request['clientToken'])
+            if run_id is not None:
+                return {'jobRunId': run_id}
+            run_id = f"run-{len(self._runs):05d}"
+            tables = self._tables(request)
+            now = time.perf_counter()
+            self._runs[run_id] = {
+                'state': 'RUNNING',
+                'created_at': datetime.now(timezone.utc),
+                'finishes_at': now + self._startup_seconds + self._table_seconds * len(tables),
+                'final_state': 'FAILED' if self._rng.random() < self._failure_rate else 'SUCCESS',
+                'base_paths': list(tables),
+                'sources': {base_path: self._source_objects(base_path, conf) for base_path, conf in tables.items()},
+                'notified': False,
+            }
+            self._by_token[request['clientToken']] = run_id
+            self.started_at[run_id] = now
+        return {'jobRunId': run_id}
+
+    def _refresh(self, run_id):
+        run = self._runs[run_id]
+        if run['state'] == 'RUNNING' and time.perf_counter() >= run['finishes_at']:
+            run['state'] = run['final_state']
+            if run['state'] == 'SUCCESS':
+                instant = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')[:17]
+                for base_path in run['base_paths']:
+                    source_objects = run['sources'][base_path]
+                    if source_objects:
+                        self.ingested.update(source_objects)
+                        self._checkpoints[base_path] = max(self._checkpoints.get(base_path, min(source_objects.values())),
+                                                           max(source_objects.values()))
+                    extra_metadata = {}
+                    if base_path in self._checkpoints:
+                        checkpoint_ms = int(self._checkpoints[base_path].timestamp() * 1000)
+                        extra_metadata['deltastreamer.checkpoint.key'] = str(checkpoint_ms)
+                    bucket, _, prefix = base_path.split('://', 1)[1].partition('/')
+                    self._s3.put(bucket, f"{prefix.rstrip('/')}/.hoodie/{instant}.commit",
+                                 json.dumps({'extraMetadata': extra_metadata}))
+        return run
+
+    def get_job_run(self, applicationId, jobRunId):
+        self._count('emr-serverless', 'GetJobRun')
+        with self._lock:
+            return {'jobRun': {'jobRunId': jobRunId, 'state': self._refresh(jobRunId)['state']}}
+
+    def _list_pages(self, applicationId, createdAtAfter=None, **kwargs):
+        self._count('emr-serverless', 'ListJobRuns')
+        with self._lock:
+            yield {'jobRuns': [
+                {'id': run_id, 'state': self._refresh(run_id)['state']}
+                for run_id, run in self._runs.items()
+                if createdAtAfter is None or run['created_at'] >= createdAtAfter
+            ]}
+
+    def get_paginator(self, operation):
+        return _Paginator(self._list_pages)
+
+    def state_change_events(self):
+        """EventBridge job-state-change events for runs that finished since the last call."""
+        events = []
+        with self._lock:
+            for run_id in self._runs:
+                run = self._refresh(run_id)
+                if run['state'] != 'RUNNING' and not run['notified']:
+                    run['notified'] = True
+                    events.append({
+                        'source': 'aws.emr-serverless',
+                        'detail-type': 'EMR Serverless Job Run State Change',
+                        'detail': {'jobRunId': run_id, 'state': run['state'], 'applicationId': HARNESS_ENV['EMR_APPLICATION_ID']},
+                    })
+        return events
+
+    def running(self):
+        with self._lock:
+            return sum(1 for run_id in self._runs if self._refresh(run_id)['state'] == 'RUNNING')
+
+# ============================
+# Workload and Pipeline Drive
+# ============================
+def load_handler(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def s3_notification(bucket, keys):
+    return {'Records': [{'s3': {'bucket': {'name': bucket}, 'object': {'key': key}}} for key in keys]}
+
+def generate_events(objects, tables, folders_per_table, records_per_event, rng):
+    """S3 notification events for `objects` parquet uploads spread over tables and their date folders."""
+    keys = []
+    for index in range(objects):
+        table = f"table_{rng.randrange(tables):03d}"
+        folder = f"2024-03-{1 + rng.randrange(folders_per_table):02d}"
+        keys.append(f"raw_db/{table}/{folder}/part-{index:06d}.parquet")
+    return [keys[start:start + records_per_event] for start in range(0, len(keys), records_per_event)]
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "-C", REPO_ROOT, "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_harness(args):
+    """Push the synthetic workload through the pipeline until nothing is left to run, then check every object was ingested."""
+    for key in ("PIPELINE_STATE_TABLE", "DEV_ACCESS_KEY", "DEV_SECRET_KEY", "DEV_REGION"):
+        os.environ.pop(key, None)
+    os.environ.update(HARNESS_ENV)
+    os.environ["COALESCE_WINDOW_SECONDS"] = str(args.coalesce_window)
+
+    import pipeline_runtime
+    from pipeline_runtime.config import get_config
+    from pipeline_runtime.runs import RUN_PREFIX
+    get_config.cache_clear()
+    pipeline_runtime.reset_clients()
+
+    rng = random.Random(args.seed)
+    count = CallCounter()
+    s3 = FakeS3(count)
+    sqs = FakeFifoSQS(count)
+    emr = FakeEMRServerless(count, s3, args.job_startup_seconds, args.job_table_seconds, args.job_failure_rate, rng)
+    for table in range(args.tables):
+        name = f"table_{table:03d}"
+        s3.put(HARNESS_ENV["ARTIFACTORY_BUCKET_NAME"], f"props/templates/hudi_{name}.props", PROPS_TEMPLATE.format(table=name))
+    if args.multi_table:
+        s3.put(HARNESS_ENV["ARTIFACTORY_BUCKET_NAME"], "props/sizing/spark_profiles.json", json.dumps({"default": {"multi_table": True}}))
+    pipeline_runtime.set_client('s3', s3)
+    pipeline_runtime.set_client('sqs', sqs)
+    pipeline_runtime.set_client('emr-serverless', emr)
+
+    events = generate_events(args.objects, args.tables, args.folders_per_table, args.records_per_event, rng)
+    raw_bucket = HARNESS_ENV["RAW_BUCKET_NAME"]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sender = load_handler("send_s3_events_to_fifo_queue", "send-s3-events-to-fifo-queue.py")
+        trigger = load_handler("trigger_emr_jobs", "trigger-emr-jobs.py")
+        reconciler = load_handler("reconcile_emr_jobs", "reconcile-emr-jobs.py")
+    # One table in AWS; one shared store here
+    store = pipeline_runtime.InMemoryStateStore()
+    sender.state_store = trigger.state_store = reconciler.state_store = store
+
+    errors = Counter()
+    pending_events = [(keys, 0) for keys in events]
+    uploaded = set()
+    started = time.perf_counter()
+    last_reconcile = last_flush = started
+    sender_seconds = 0.0
+
+    with contextlib.redirect_stdout(io.StringIO()) as captured:
+        while True:
+            # S3 -> sender (asynchronous invokes are retried twice on error)
+            tick, pending_events = pending_events[:args.events_per_tick], pending_events[args.events_per_tick:]
+            for keys, attempt in tick:
+                for key in keys:
+                    s3.put(raw_bucket, key, b"PAR1")
+                    uploaded.add(f"{raw_bucket}/{key}")
+                invoked = time.perf_counter()
+                try:
+                    sender.lambda_handler(s3_notification(raw_bucket, keys), None)
+                except Exception:
+                    errors['sender'] += 1
+                    if attempt < 2:
+                        pending_events.append((keys, attempt + 1))
+                sender_seconds += time.perf_counter() - invoked
+
+            # EventBridge -> sender (follow-ups for objects that arrived inside a coalesce window)
+            if time.perf_counter() - last_flush >= args.flush_interval:
+                sender.lambda_handler({'flush': {}}, None)
+                last_flush = time.perf_counter()
+
+            # SQS -> trigger (event source mapping, reserved concurrency 1)
+            for queue_url in sqs.queue_urls():
+                batch = sqs.receive(queue_url, args.sqs_batch_size)
+                if not batch:
+                    continue
+                sqs_event = {'Records': [
+                    {'messageId': message['messageId'], 'body': message['body'],
+                     'attributes': {'MessageGroupId': message['group']}}
+                    for message in batch
+                ]}
+                try:
+                    response = trigger.lambda_handler(sqs_event, None)
+                    failed_ids = [failure['itemIdentifier'] for failure in response.get('batchItemFailures', [])]
+                except Exception:
+                    errors['trigger'] += 1
+                    failed_ids = [message['messageId'] for message in batch]
+                errors['trigger_items'] += len(failed_ids)
+                sqs.settle(queue_url, batch, failed_ids)
+
+            # EMR -> reconciler (state-change events, plus the schedule)
+            for state_change in emr.state_change_events():
+                reconciler.lambda_handler(state_change, None)
+            if time.perf_counter() - last_reconcile >= args.reconcile_interval:
+                reconciler.lambda_handler({'source': 'aws.events', 'detail-type': 'Scheduled Event'}, None)
+                last_reconcile = time.perf_counter()
+
+            backlog = pipeline_runtime.backlog(store)
+            if not pending_events and not sqs.queue_urls() and not backlog and not emr.running() \
+                    and not pipeline_runtime.in_flight_runs(store) and not store.query(sender.COALESCE_PENDING_INDEX):
+                break
+            if time.perf_counter() - started > args.timeout:
+                errors['timeout'] += 1
+                break
+            if not tick:
+                time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    # Enqueue-to-submit latency of every message a run covered
+    latencies = []
+    runs = [run for _, run in store.scan(RUN_PREFIX)]
+    for run in runs:
+        message_ids = list(run.get('message_ids', []))
+        for table in run.get('tables', {}).values():
+            message_ids.extend(table['message_ids'])
+        submitted = emr.started_at.get(run['job_run_id'])
+        latencies.extend((submitted - sqs.sent_at[message_id]) * 1000 for message_id in message_ids if message_id in sqs.sent_at)
+    last_submit = max(emr.started_at.values(), default=started)
+
+    # Uploaded objects no successful run read: dropped events, failed runs nothing retried
+    not_ingested = sorted(uploaded - emr.ingested)
+    if not_ingested:
+        errors['not_ingested'] += len(not_ingested)
+
+    return {
+        "objects": args.objects,
+        "events": len(events),
+        "elapsed_s": round(elapsed, 3),
+        "objects_per_s": round(args.objects / max(last_submit - started, 1e-9), 1),
+        "sender_events_per_s": round(len(events) / max(sender_seconds, 1e-9), 1),
+        "messages_sent": len(sqs.sent_at),
+        "messages_deduplicated": sqs.deduplicated,
+        "messages_redelivered": sqs.redelivered,
+        "emr_runs": len(emr.started_at),
+        "multi_table_runs": sum(1 for run in runs if run.get('tables')),
+        "objects_ingested": len(uploaded & emr.ingested),
+        "objects_not_ingested": len(not_ingested),
+        "not_ingested_sample": not_ingested[:10],
+        "enqueue_to_submit_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p90": round(percentile(latencies, 90), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2),
+        } if latencies else None,
+        "api_calls": dict(sorted(count.calls.items())),
+        "api_calls_total": sum(count.calls.values()),
+        "errors": dict(errors),
+        "log_lines": captured.getvalue().count("\n"),
+    }
+
+COMPARED_RESULTS = ("objects_per_s", "sender_events_per_s", "emr_runs", "api_calls_total")
+
+def compare(previous, current):
+    """Relative change of the headline results against a previous stored run."""
+    changes = {}
+    for name in COMPARED_RESULTS:
+        before, after = previous["results"].get(name), current["results"].get(name)
+        if before:
+            changes[name] = f"{(after - before) / before:+.1%}"
+    before = (previous["results"].get("enqueue_to_submit_ms") or {}).get("p99")
+    after = (current["results"].get("enqueue_to_submit_ms") or {}).get("p99")
+    if before and after:
+        changes["enqueue_to_submit_p99"] = f"{(after - before) / before:+.1%}"
+    return {"against": previous.get("revision"), "changes": changes}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the S3 -> SQS -> EMR pipeline handlers against in-process AWS fakes.")
+    parser.add_argument("--objects", type=int, default=10000)
+    parser.add_argument("--tables", type=int, default=50)
+    parser.add_argument("--folders-per-table", type=int, default=3)
+    parser.add_argument("--records-per-event", type=int, default=1, help="S3 records per notification event")
+    parser.add_argument("--events-per-tick", type=int, default=200, help="S3 events delivered between trigger polls")
+    parser.add_argument("--sqs-batch-size", type=int, default=10)
+    parser.add_argument("--coalesce-window", type=int, default=5, help="COALESCE_WINDOW_SECONDS (60 in the template)")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="Seconds between scheduled coalesce flushes")
+    parser.add_argument("--job-startup-seconds", type=float, default=0.2)
+    parser.add_argument("--job-table-seconds", type=float, default=0.05)
+    parser.add_argument("--job-failure-rate", type=float, default=0.0)
+    parser.add_argument("--multi-table", action="store_true", help="Enable multi-table mode for every table")
+    parser.add_argument("--reconcile-interval", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Append the result as a JSON line to this file and compare with the previous one")
+    args = parser.parse_args(argv)
+
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "timeout")}
+    result = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": params,
+        "results": run_harness(args),
+    }
+    if args.output:
+        previous = None
+        if os.path.exists(args.output):
+            with open(args.output) as f:
+                history = [json.loads(line) for line in f if line.strip()]
+            previous = next((entry for entry in reversed(history) if entry["params"] == params), None)
+        if previous:
+            result["comparison"] = compare(previous, result)
+        with open(args.output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    print(json.dumps(result, indent=2))
+    return result
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Hudi write profiles: operation, index and file sizing chosen from the target table's size.
+
+The profile is layered over the flattened hudi_{table}.props template; keys set explicitly in the
+template win over the generated ones. To see what a template turns into for a given table size:
+
+    python -m pipeline_runtime.write_profile hudi_ta_admin_launch.props --table-bytes 80000000000 --input-bytes 500000000
+"""
+import argparse
+import math
+import os
+import threading
+import time
+
+from pipeline_runtime.clients import get_client
+from pipeline_runtime.logs import printdebug, printinfo
+
+# ============================
+# Write Profile Generator
+# ============================
+# - First load (no hoodie.properties yet): bulk_insert, with one output file per max_file_size of input
+# - Delta: upsert, with the index picked from the table size
+#     below simple_index_max_bytes   SIMPLE        (joining a small table beats maintaining blooms)
+#     below bloom_index_max_bytes    BLOOM
+#     above                          RECORD_INDEX  (record-level index in the metadata table)
+#   A table that already has a record index keeps it, so it never flaps around the threshold.
+# Per-table overrides go under "write" in the table's sizing profile (props/sizing/spark_profiles.json).
+TABLE_STATS_TTL_SECONDS = int(os.getenv('HUDI_TABLE_STATS_TTL_SECONDS', '3600'))
+
+GIB = 1024 ** 3
+MIB = 1024 ** 2
+
+DEFAULT_WRITE_PROFILE = {
+    "simple_index_max_bytes": 1 * GIB,
+    "bloom_index_max_bytes": 50 * GIB,
+    # (table size upper bound, max parquet file size); the last entry has no bound
+    "file_sizes": [[1 * GIB, 64 * MIB], [50 * GIB, 128 * MIB], [None, 256 * MIB]],
+    # Files below this share of the max size take new inserts instead of a new file being written
+    "small_file_ratio": 0.75,
+    "bytes_per_upsert_partition": 128 * MIB,
+    "bytes_per_index_partition": 256 * MIB,
+    "max_parallelism": 2000,
+}
+
+_TABLE_STATS = {}
+_TABLE_STATS_LOCK = threading.Lock()
+
+def _parse_properties(content):
+    props = {}
+    for line in content.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#") and "=" in line:
+            key, value = line.split("=", 1)
+            props[key.strip()] = value.strip()
+    return props
+
+def table_stats(base_path):
+    """Existence, data bytes and table config of a Hudi table, cached per container for TABLE_STATS_TTL_SECONDS."""
+    from botocore.exceptions import ClientError
+
+    now = time.time()
+    with _TABLE_STATS_LOCK:
+        cached = _TABLE_STATS.get(base_path)
+        if cached and cached['exists'] and now - cached['checked_at'] < TABLE_STATS_TTL_SECONDS:
+            return cached
+
+    bucket, _, prefix = base_path.split("://", 1)[1].partition("/")
+    prefix = prefix.rstrip('/') + '/'
+    s3_client = get_client('s3')
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=f"{prefix}.hoodie/hoodie.properties")
+        table_config = _parse_properties(response['Body'].read().decode('utf-8'))
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+        # Not cached: the first load is about to create it
+        return {'exists': False, 'bytes': 0, 'table_config': {}, 'checked_at': now}
+
+    total_bytes = 0
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith('.parquet') and '/.hoodie/' not in obj['Key']:
+                total_bytes += obj['Size']
+    stats = {'exists': True, 'bytes': total_bytes, 'table_config': table_config, 'checked_at': now}
+    with _TABLE_STATS_LOCK:
+        _TABLE_STATS[base_path] = stats
+    return stats
+
+def file_size_for(table_bytes, file_sizes):
+    """Max parquet file size for a table of table_bytes under the given file_sizes tiers."""
+    return next(size for bound, size in file_sizes if bound is None or table_bytes < bound)
+
+def generate_write_profile(table_bytes, input_bytes, first_load, table_config=None, profile=None):
+    """Return (operation, hoodie confs) for a write of input_bytes into a table of table_bytes."""
+    profile = {**DEFAULT_WRITE_PROFILE, **(profile or {})}
+    table_config = table_config or {}
+    max_file_size = file_size_for(table_bytes + input_bytes, profile["file_sizes"])
+    conf = {
+        "hoodie.parquet.max.file.size": max_file_size,
+        "hoodie.parquet.small.file.limit": int(max_file_size * profile["small_file_ratio"]),
+    }
+
+    if first_load:
+        parallelism = min(max(1, math.ceil(input_bytes / max_file_size)), profile["max_parallelism"])
+        conf.update({
+            "hoodie.datasource.write.operation": "bulk_insert",
+            "hoodie.bulkinsert.shuffle.parallelism": parallelism,
+            # A first load can merge several CDC folders: keep one version per key, by the ordering field, like upsert
+            "hoodie.combine.before.insert": "true",
+        })
+        return "BULK_INSERT", conf
+
+    parallelism = min(max(2, math.ceil(input_bytes / profile["bytes_per_upsert_partition"])), profile["max_parallelism"])
+    conf.update({
+        "hoodie.datasource.write.operation": "upsert",
+        "hoodie.upsert.shuffle.parallelism": parallelism,
+        "hoodie.insert.shuffle.parallelism": parallelism,
+    })
+
+    has_record_index = "record_index" in table_config.get("hoodie.table.metadata.partitions", "")
+    index_parallelism = min(max(2, math.ceil(table_bytes / profile["bytes_per_index_partition"])), profile["max_parallelism"])
+    if has_record_index or table_bytes >= profile["bloom_index_max_bytes"]:
+        conf.update({
+            "hoodie.index.type": "RECORD_INDEX",
+            "hoodie.metadata.enable": "true",
+            "hoodie.metadata.record.index.enable": "true",
+        })
+    elif table_bytes >= profile["simple_index_max_bytes"]:
+        conf.update({
+            "hoodie.index.type": "BLOOM",
+            "hoodie.bloom.index.parallelism": index_parallelism,
+        })
+    else:
+        conf.update({
+            "hoodie.index.type": "SIMPLE",
+            "hoodie.simple.index.parallelism": index_parallelism,
+        })
+    return "UPSERT", conf
+
+def apply_write_profile(emr_event, operation, conf):
+    """Return a copy of emr_event using the profile's operation and confs, keeping keys the template sets explicitly."""
+    arguments = dict(emr_event.get("arguments", {}))
+    template_conf = dict(arguments.get("hoodie-conf", {}))
+    # The template's hard-coded operation is what the profile replaces
+    template_conf.pop("hoodie.datasource.write.operation", None)
+    arguments["hoodie-conf"] = {**conf, **template_conf}
+    arguments["op"] = operation
+    return dict(emr_event, arguments=arguments)
+
+def profile_emr_event(emr_event, target_table, input_bytes, pending_write=False, profile=None):
+    """Pick and apply the write profile for a run of input_bytes into the emr_event's target table.
+
+    pending_write marks a table with a run already queued or in flight: its first load is on the
+    way, so this run must upsert rather than bulk insert the same keys again.
+    """
+    base_path = emr_event["arguments"]["target-base-path"]
+    stats = table_stats(base_path)
+    first_load = not stats['exists'] and not pending_write
+    operation, conf = generate_write_profile(stats['bytes'], input_bytes, first_load, stats['table_config'], profile)
+    printinfo("✍️ Write profile for %s: %s with %s", target_table, operation, conf.get("hoodie.index.type", "no index"),
+              target_table=target_table, table_bytes=stats['bytes'], input_bytes=input_bytes)
+    printdebug("Write profile confs", conf=conf)
+    return apply_write_profile(emr_event, operation, conf)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print a hudi_{table}.props template with its generated write profile applied.")
+    parser.add_argument("template", help="Path to a hudi_{table}.props template")
+    parser.add_argument("--table-bytes", type=int, default=0, help="Current data size of the target table")
+    parser.add_argument("--input-bytes", type=int, default=0, help="Size of the data being written")
+    parser.add_argument("--first-load", action="store_true", help="The target table does not exist yet")
+    args = parser.parse_args(argv)
+
+    with open(args.template) as f:
+        template = _parse_properties(f.read())
+    operation, conf = generate_write_profile(args.table_bytes, args.input_bytes, args.first_load)
+    emr_event = apply_write_profile({"arguments": {"hoodie-conf": template}}, operation, conf)
+    print(f"# --op {operation}")
+    for key, value in emr_event["arguments"]["hoodie-conf"].items():
+        print(f"{key}={value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import json
+from datetime import datetime, timezone
+
+from pipeline_runtime import (
+    TERMINAL_STATES,
+    create_state_store,
+    drain_backlog,
+    emit_metric,
+    get_emr_client,
+    in_flight_runs,
+    printcritical,
+    printdebug,
+    printinfo,
+    record_table_results,
+    timed,
+    update_job_run_state,
+)
+
+# ============================
+# Run State Store
+# ============================
+state_store = create_state_store()
+
+# Look a little further back than the oldest in-flight run to absorb clock skew
+CREATED_AT_MARGIN_SECONDS = 300
+
+# ============================
+# Job Run State Transitions
+# ============================
+def apply_job_run_state(job_run_id, state):
+    """Record a run's new state and emit a completion metric when it reaches a terminal state."""
+    item, changed = update_job_run_state(state_store, job_run_id, state)
+    if item is None:
+        printdebug("Ignoring state change for untracked run %s", job_run_id)
+        return None
+    if changed and state in TERMINAL_STATES:
+        duration = item['completed_at'] - item['submitted_at']
+        printinfo("🏁 Job run %s finished with %s after %ss", job_run_id, state, duration,
+                  job_name=item.get('job_name'), target_table=item.get('target_table') or item.get('target_tables'))
+        emit_metric('JobRunCompleted', 1, unit='Count', State=state)
+        emit_metric('JobRunDuration', duration, unit='Seconds', State=state)
+        if item.get('tables'):
+            # A multi-table run's state alone does not say which of its tables ingested
+            record_table_results(state_store, item, state)
+    return item
+
+# ============================
+# Batched Reconciliation
+# ============================
+@timed('emr_poll')
+def reconcile_in_flight_runs():
+    """Refresh every in-flight run with one paginated list_job_runs per application instead of a get_job_run per run."""
+    runs = in_flight_runs(state_store)
+    if not runs:
+        return 0
+
+    client = get_emr_client()
+    runs_by_application = {}
+    for run in runs:
+        runs_by_application.setdefault(run['application_id'], []).append(run)
+
+    updated = 0
+    for application_id, application_runs in runs_by_application.items():
+        oldest = min(run['submitted_at'] for run in application_runs) - CREATED_AT_MARGIN_SECONDS
+        states = {}
+        paginator = client.get_paginator('list_job_runs')
+        for page in paginator.paginate(
+            applicationId=application_id,
+            createdAtAfter=datetime.fromtimestamp(oldest, tz=timezone.utc),
+        ):
+            for job_run in page.get('jobRuns', []):
+                states[job_run['id']] = job_run['state']
+
+        for run in application_runs:
+            state = states.get(run['job_run_id'])
+            if state is None:
+                state = client.get_job_run(applicationId=application_id, jobRunId=run['job_run_id'])['jobRun']['state']
+            if state != run['state']:
+                apply_job_run_state(run['job_run_id'], state)
+                updated += 1
+
+    printinfo("🔄 Reconciled %s in-flight run(s), %s changed state", len(runs), updated)
+    return updated
+
+# ============================
+# Backlog Admission
+# ============================
+def admit_queued_jobs():
+    """Hand capacity freed by finished runs to the scheduler's backlog."""
+    with timed('emr_submit'):
+        admitted = drain_backlog(state_store, get_emr_client())
+    return [run['job_run_id'] for run in admitted]
+
+# ============================
+# Main Lambda Handler
+# ============================
+def lambda_handler(event, context):
+    """Track EMR Serverless job completion from job-state-change events or a scheduled batch reconciliation."""
+    try:
+        if event.get('source') == 'aws.emr-serverless':
+            detail = event['detail']
+            printdebug("Job run state change", detail=detail)
+            apply_job_run_state(detail['jobRunId'], detail['state'])
+            admitted = admit_queued_jobs() if detail['state'] in TERMINAL_STATES else []
+            return {'statusCode': 200, 'body': json.dumps({'jobRunId': detail['jobRunId'], 'state': detail['state'], 'admitted': admitted})}
+
+        updated = reconcile_in_flight_runs()
+        admitted = admit_queued_jobs()
+        return {'statusCode': 200, 'body': json.dumps({'updated': updated, 'admitted': admitted})}
+
+    except Exception as e:
+        printcritical("❌ Failed to reconcile EMR job runs: %s", e)
@@ -1,6 +1,7 @@
 import boto3
 import configparser
-import time
+
+from athena_queries import AthenaQueryRunner
 
 def read_aws_config(file_path='/home/almerco/datalakehouse/jupyter-notebooks/credentials/credentials'):
     # Create a ConfigParser object
@@ -28,65 +29,39 @@ def create_boto3_session(access_key_id, secret_access_key, region):
 
 
 
-def wait_for_query_completion(query_execution_id,athena_client):
-    while True:
-        response = athena_client.get_query_execution(QueryExecutionId=query_execution_id)
-        state = response['QueryExecution']['Status']['State']
-        if state in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-            return state
-        time.sleep(1)  # Wait for 1 second before checking again
-
-
-
 def export_ddl_to_txt(database_name, output_folder, aws_session):
     # Create Glue client
     glue_client = aws_session.client('glue')
     athena_client = aws_session.client('athena')
 
     # Get list of table names in the database
-    response = glue_client.get_tables(DatabaseName=database_name)
-    table_names = [table['Name'] for table in response['TableList']]
+    table_names = []
+    for page in glue_client.get_paginator('get_tables').paginate(DatabaseName=database_name):
+        table_names += [table['Name'] for table in page['TableList']]
     print(table_names)
-    # Iterate over each table
-    for table_name in table_names:
-        # Get DDL for the table
-        #if table_name = 'chatbot__tiempo_promedio_agente_bot':
-        #    break
-        
-        # Define the Athena query
-        query = f"SHOW CREATE TABLE {database_name}.{table_name}"
-        
-        # Execute the query
-        response = athena_client.start_query_execution(
-            QueryString=query,
-            QueryExecutionContext={'Database': database_name},
-            ResultConfiguration={'OutputLocation': 'athena-bucket/'}
-        )
-        
-        # Get query results
-        query_execution_id = response['QueryExecutionId']
-        # Wait for query to complete
-        wait_for_query_completion(query_execution_id,athena_client)
-        
-        # Get query results
-        result_response = athena_client.get_query_results(QueryExecutionId=query_execution_id)
-        print(result_response)
-        # Extract DDL from the query results
-        ddl_rows = result_response['ResultSet']['Rows'][1:]
-        ddl = '\n'.join([row['Data'][0]['VarCharValue'] for row in ddl_rows])
-        
+
+    # Define the Athena queries, run up to ATHENA_MAX_CONCURRENCY at a time
+    queries = {table_name: f"SHOW CREATE TABLE {database_name}.{table_name}" for table_name in table_names}
+    runner = AthenaQueryRunner(athena_client, 'athena-bucket/')
+
+    # Each DDL is written as soon as its query completes
+    for table_name, result in runner.run(queries, database_name):
+        if result['state'] != 'SUCCEEDED':
+            print(f"DDL for table {database_name}.{table_name} not exported: {result['state']} {result['reason'] or ''}")
+            continue
+
+        # Extract DDL from the query results (the first line is replaced by the CREATE line below);
+        # blank DDL lines come back as cells without a value
+        ddl = '\n'.join(row[0] or '' for row in result['rows'][1:])
+
         # Write DDL to a text file
         output_file = f"{output_folder}/{table_name}.txt"
 
-        # Create the text file
-        #open(output_file, 'w').close()  # Create an empty text file
-
         with open(output_file, 'w') as f:
             f.write(f"CREATE EXTERNAL TABLE `{table_name}` (\n{ddl}")
         
         print(f"DDL for table {database_name}{table_name} exported to '{output_file}'")
 
-
 access_key, secret_key, aws_region = read_aws_config()
 aws_session = create_boto3_session(access_key, secret_key, aws_region)
 
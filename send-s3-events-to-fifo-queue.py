@@ -1,37 +1,62 @@
 import json
-import boto3
+import hashlib
 import os
-import sys
+import threading
+import time
+from collections import OrderedDict
 from io import StringIO
 
-# ============================
-# Custom Logging Functions
-# ============================
-def printdebug(text):
-    print(f"[DEBUG - line {str(sys._getframe().f_back.f_lineno)}] {text}")
-
-def printinfo(text):
-    print(f"[INFO - line {str(sys._getframe().f_back.f_lineno)}] {text}")
-
-def printcritical(text):
-    print(f"[CRITICAL ERROR - line {str(sys._getframe().f_back.f_lineno)}] {text}")
-    raise Exception(f"[CRITICAL ERROR - line {str(sys._getframe().f_back.f_lineno)}] {text}")
+from pipeline_runtime import (
+    HUDI_SPARK_CONFS,
+    create_state_store,
+    get_client,
+    get_config,
+    hudi_base_path,
+    hudi_bundle_jars,
+    printcritical,
+    printdebug,
+    printinfo,
+    process_records,
+    publish_job_spec,
+    timed,
+)
 
 # ============================
-# Initialize AWS Clients
+# Environment Configuration
 # ============================
-sqs = boto3.client('sqs')
-s3_client = boto3.client('s3')
+config = get_config()
 
 # SQS FIFO Queue URL (from environment variables)
-SQS_QUEUE_URL = os.environ['SQS_QUEUE_URL']
+if not config.sqs_queue_url:
+    raise KeyError('SQS_QUEUE_URL')
+SQS_QUEUE_URL = config.sqs_queue_url
 
 # S3 Bucket for Hudi Props
-ARTIFACTORY_BUCKET_NAME = os.environ['ARTIFACTORY_BUCKET_NAME']
+ARTIFACTORY_BUCKET_NAME = config.artifactory_bucket_name
 HUDI_PROPS_PREFIX = "props"
-STAGE_BUCKET_NAME = os.environ['STAGE_BUCKET_NAME']
-EMR_APPLICATION_ID = os.environ['EMR_APPLICATION_ID']
-EMR_EXECUTION_ROLE_ARN = os.environ['EMR_EXECUTION_ROLE_ARN']
+STAGE_BUCKET_NAME = config.stage_bucket_name
+EMR_APPLICATION_ID = config.emr_application_id
+EMR_EXECUTION_ROLE_ARN = config.emr_execution_role_arn
+
+# SQS batching (send_message_batch accepts at most 10 entries per call)
+SQS_BATCH_SIZE = 10
+SQS_MAX_MESSAGE_BYTES = 262144
+SQS_SEND_MAX_ATTEMPTS = int(os.getenv('SQS_SEND_MAX_ATTEMPTS', '3'))
+
+# Parsed Hudi props templates kept across warm invocations (LRU, revalidated by ETag after the TTL)
+HUDI_PROPS_CACHE_TTL_SECONDS = int(os.getenv('HUDI_PROPS_CACHE_TTL_SECONDS', '300'))
+HUDI_PROPS_CACHE_MAX_ENTRIES = int(os.getenv('HUDI_PROPS_CACHE_MAX_ENTRIES', '128'))
+_HUDI_PROPS_CACHE = OrderedDict()
+_HUDI_PROPS_CACHE_LOCK = threading.Lock()
+
+# Job specs built from the cached templates
+_JOB_SPEC_CACHE = {}
+
+# Folder-level coalescing: events for a (table, folder) within the window produce a single message,
+# plus one follow-up for the newest object seen after it, sent by the scheduled flush once the window closes
+COALESCE_WINDOW_SECONDS = int(os.getenv('COALESCE_WINDOW_SECONDS', '60'))
+COALESCE_PENDING_PREFIX = "coalesce-pending#"
+COALESCE_PENDING_INDEX = "coalesce#pending"
 
 
 # ============================
@@ -45,128 +70,387 @@ def extract_s3_folder(s3_bucket, s3_key):
     """Construct the S3 folder path excluding the filename."""
     return f"s3://{s3_bucket}/" + '/'.join(s3_key.split('/')[:-1]) + '/'
 
+def build_queue_url(message_group_id):
+    """Build the FIFO queue URL for a table."""
+    return f"{SQS_QUEUE_URL}/sdlf-analytics-{message_group_id}_queue.fifo"
+
+# ============================
+# Folder Coalescing Window
+# ============================
+state_store = create_state_store()
+
+def claim_coalesce_window(target_table, s3_folder_uri, s3_bucket, s3_key):
+    """Claim the debounce window for a folder. Returns False if a message was already enqueued within it."""
+    if COALESCE_WINDOW_SECONDS <= 0:
+        return True
+    return state_store.put_if_absent(
+        f"coalesce#{target_table}#{s3_folder_uri}",
+        {'target_table': target_table, 's3_folder': s3_folder_uri, 's3_bucket': s3_bucket, 's3_key': s3_key,
+         'claimed_at': int(time.time())},
+        COALESCE_WINDOW_SECONDS,
+    )
+
+def defer_to_window_close(target_table, s3_folder_uri, s3_bucket, s3_key):
+    """Keep an object that arrived inside a claimed window for the flush to send once the window closes.
+
+    The run queued when the window opened may already have listed the folder, so a later object
+    needs a message of its own. Returns False if the window closed in the meantime.
+    """
+    window = state_store.get(f"coalesce#{target_table}#{s3_folder_uri}")
+    if window is None:
+        return False
+    # A retried event for the object the window was opened with is already enqueued
+    if window.get('s3_key') == s3_key:
+        return True
+    # One pending item per window: the newest object wins, and a new window never overwrites an older one's
+    state_store.put(
+        f"{COALESCE_PENDING_PREFIX}{target_table}#{s3_folder_uri}#{window['claimed_at']}",
+        {'target_table': target_table, 's3_folder': s3_folder_uri, 's3_bucket': s3_bucket, 's3_key': s3_key,
+         'window_claimed_at': window['claimed_at'], 'due_at': window['claimed_at'] + COALESCE_WINDOW_SECONDS},
+        index=COALESCE_PENDING_INDEX,
+    )
+    return True
+
+def release_coalesce_window(target_table, s3_folder_uri):
+    """Release a folder's debounce window so the next event enqueues it again."""
+    if COALESCE_WINDOW_SECONDS > 0:
+        state_store.delete(f"coalesce#{target_table}#{s3_folder_uri}")
+
+# ============================
+# Function to Send Batches to SQS
+# ============================
+@timed('sqs_send')
+def send_messages_in_batches(queue_url, entries):
+    """Send entries with send_message_batch in chunks of 10, retrying failed entries individually.
+
+    Returns (sent, failed): {Id: MessageId} for the entries SQS accepted and {Id: reason} for the
+    ones it did not, so one failing chunk never takes the chunks already sent down with it.
+    """
+    sent, failed = {}, {}
+    for start in range(0, len(entries), SQS_BATCH_SIZE):
+        pending = entries[start:start + SQS_BATCH_SIZE]
+        attempt = 1
+        while pending:
+            try:
+                response = get_client('sqs').send_message_batch(QueueUrl=queue_url, Entries=pending)
+            except Exception as e:
+                # botocore already retried the call; none of this chunk's entries were sent
+                printinfo("⚠️ Batch of %s entries to %s failed: %s", len(pending), queue_url, e)
+                failed.update((entry['Id'], str(e)) for entry in pending)
+                break
+            for success in response.get('Successful', []):
+                sent[success['Id']] = success['MessageId']
+
+            failures = response.get('Failed', [])
+            if not failures:
+                break
+
+            retryable_ids = set()
+            for failure in failures:
+                printinfo("⚠️ Batch entry %s failed on attempt %s: %s - %s", failure['Id'], attempt, failure.get('Code'), failure.get('Message'))
+                # Sender faults (invalid entries) fail the same way on every attempt
+                if failure.get('SenderFault') or attempt >= SQS_SEND_MAX_ATTEMPTS:
+                    failed[failure['Id']] = f"{failure.get('Code')}: {failure.get('Message')}"
+                else:
+                    retryable_ids.add(failure['Id'])
+
+            pending = [entry for entry in pending if entry['Id'] in retryable_ids]
+            if pending:
+                time.sleep(0.1 * 2 ** (attempt - 1))
+            attempt += 1
+
+    return sent, failed
+
+# ============================
+# Hudi Props Template Cache
+# ============================
+def parse_hudi_props(props_content):
+    """Flatten props file content into a key-value dictionary, skipping comments and blank lines."""
+    parsed_props = {}
+    for line in props_content.strip().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "=" in line:
+            key, value = line.split("=", 1)
+            parsed_props[key.strip()] = value.strip()
+    return parsed_props
+
+@timed('props_load')
+def load_hudi_props_template(target_table):
+    """Return the parsed props template for a table, revalidating the cached copy by ETag once its TTL expires."""
+    from botocore.exceptions import ClientError
+
+    now = time.monotonic()
+    with _HUDI_PROPS_CACHE_LOCK:
+        cached = _HUDI_PROPS_CACHE.get(target_table)
+        if cached and now - cached['checked_at'] < HUDI_PROPS_CACHE_TTL_SECONDS:
+            _HUDI_PROPS_CACHE.move_to_end(target_table)
+            return cached['props']
+
+    template_props_key = f"{HUDI_PROPS_PREFIX}/templates/hudi_{target_table}.props"
+    request = {'Bucket': ARTIFACTORY_BUCKET_NAME, 'Key': template_props_key}
+    if cached:
+        request['IfNoneMatch'] = cached['etag']
+
+    try:
+        printinfo("📥 Downloading template Hudi props from s3://%s/%s", ARTIFACTORY_BUCKET_NAME, template_props_key)
+        response = get_client('s3').get_object(**request)
+        cached = {
+            'props': parse_hudi_props(response['Body'].read().decode('utf-8')),
+            'etag': response['ETag'],
+        }
+    except ClientError as e:
+        if not cached or e.response['Error']['Code'] not in ('304', 'NotModified'):
+            raise
+        printdebug("♻️ Template Hudi props for %s not modified, reusing cached copy", target_table)
+
+    cached = dict(cached, checked_at=now)
+    with _HUDI_PROPS_CACHE_LOCK:
+        _HUDI_PROPS_CACHE[target_table] = cached
+        _HUDI_PROPS_CACHE.move_to_end(target_table)
+        while len(_HUDI_PROPS_CACHE) > HUDI_PROPS_CACHE_MAX_ENTRIES:
+            _HUDI_PROPS_CACHE.popitem(last=False)
+    return cached['props']
+
+# ============================
+# Job Spec Registry
+# ============================
+def build_job_spec(target_table):
+    """Build the EMR job spec for a table; run-specific values stay as ${...} placeholders."""
+    flattened_props = load_hudi_props_template(target_table)
+    cached = _JOB_SPEC_CACHE.get(target_table)
+    if cached and cached['template'] is flattened_props:
+        return cached['spec'], cached['version']
+
+    spec = {
+        "jar": hudi_bundle_jars(),
+        "spark_submit_parameters": [
+            *HUDI_SPARK_CONFS,
+            "--conf spark.driver.memory=2g",
+            "--conf spark.executor.memory=3g",
+            "--conf spark.executor.cores=2",
+            "--conf spark.executor.instances=1",
+            "--class org.apache.hudi.utilities.streamer.HoodieStreamer"
+        ],
+        "arguments": {
+            "table-type": "COPY_ON_WRITE",
+            "op": "UPSERT",
+            "enable-sync": True,#False,
+            "source-ordering-field": "source_timestamp",
+            "source-class": "org.apache.hudi.utilities.sources.ParquetDFSSource",
+            "target-table": f"{target_table}",
+            "target-base-path": hudi_base_path(target_table),
+            "props": f"s3://{ARTIFACTORY_BUCKET_NAME}/props/templates/empty-streamer.props",
+            "sync-tool-classes": "org.apache.hudi.aws.sync.AwsGlueCatalogSyncTool",
+            "hoodie-conf": flattened_props
+        },
+        "job": {
+            "job_name": f"Hudi_0.14.0_{target_table}_${{date_string}}",
+            "created_by": "Kevin Almerco",
+            "created_at": "2024-03-20",
+            "ApplicationId": EMR_APPLICATION_ID,
+            "ExecutionTime": 600,
+            "JobActive": True,
+            "JobStatusPolling": True,
+            "JobDescription": "Ingest data from parquet source (MySQL data)",
+            "ExecutionArn": EMR_EXECUTION_ROLE_ARN
+        }
+    }
+
+    version = hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    _JOB_SPEC_CACHE[target_table] = {'template': flattened_props, 'spec': spec, 'version': version}
+    return spec, version
+
 # ============================
-# Function to Update Hudi Props
+# Function to Build a Folder's Message
 # ============================
-def load_and_flatten_hudi_props(target_table, s3_bucket, s3_key, s3_folder_uri):
-    """Load and flatten props file content from S3 into a key-value dictionary."""
+@timed('message_build')
+def build_folder_entry(message_group_id, s3_folder_uri, group, defer=True):
+    """Claim a folder's debounce window and build its SQS batch entry. Returns None if already enqueued.
+
+    With defer, an object arriving inside the window is kept for the flush instead of being enqueued now.
+    """
+    s3_bucket = group["s3_bucket"]
+    s3_key = group["s3_keys"][-1]
+    date_string=s3_key.split(os.path.basename(s3_key))[0].split("/")[-2]
+
+    printdebug("Extracted MessageGroupId and S3 Folder URI", message_group_id=message_group_id, s3_folder=s3_folder_uri)
+
+    # ✅ Step 2: Folders already enqueued within the debounce window get a follow-up when it closes
+    for _ in range(2):
+        if claim_coalesce_window(message_group_id, s3_folder_uri, s3_bucket, s3_key):
+            break
+        if not defer:
+            # A newer event claimed the folder after the window closed; its message covers this object
+            return None
+        if defer_to_window_close(message_group_id, s3_folder_uri, s3_bucket, s3_key):
+            printinfo("⏳ Folder %s already enqueued within the last %ss, deferring %s object(s) to the window close", s3_folder_uri, COALESCE_WINDOW_SECONDS, len(group['s3_keys']))
+            return None
+    else:
+        raise RuntimeError(f"Could not claim or defer the coalesce window of {s3_folder_uri}")
+
     try:
-        template_props_key = f"{HUDI_PROPS_PREFIX}/templates/hudi_{target_table}.props"
-        printinfo(f"📥 Downloading template Hudi props from s3://{ARTIFACTORY_BUCKET_NAME}/{template_props_key}")
-        response = s3_client.get_object(Bucket=ARTIFACTORY_BUCKET_NAME, Key=template_props_key)
-        props_content = response['Body'].read().decode('utf-8')
-
-        # Replace placeholder and flatten to dict
-        flattened_props = {}
-        for line in props_content.strip().splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"):
+        # ✅ Step 3: Resolve the table's job spec version
+        try:
+            spec, version = build_job_spec(message_group_id)
+            publish_job_spec(message_group_id, spec, version)
+        except Exception as e:
+            printcritical("❌ Failed to build job spec for %s: %s", message_group_id, e)
+
+        # ✅ Step 4: Construct message referencing the job spec with per-run overrides
+        sqs_message = {
+            "s3_folder": s3_folder_uri,
+            "target_table": message_group_id,
+            "object_count": len(group["s3_keys"]),
+            "job_spec": {
+                "id": message_group_id,
+                "version": version,
+                "overrides": {
+                    "s3_folder_uri": s3_folder_uri,
+                    "RAW_BUCKET_NAME_AND_KEY": f"{s3_bucket}/{s3_key}",
+                    "date_string": date_string
+                }
+            }
+        }
+        message_body = json.dumps(sqs_message)
+        if len(message_body.encode('utf-8')) > SQS_MAX_MESSAGE_BYTES:
+            printcritical("❌ Message for %s exceeds %s bytes", s3_folder_uri, SQS_MAX_MESSAGE_BYTES)
+    except Exception:
+        # Let the retried event enqueue this folder again
+        release_coalesce_window(message_group_id, s3_folder_uri)
+        raise
+
+    return {
+        'MessageBody': message_body,
+        'MessageGroupId': message_group_id,
+    }
+
+# ============================
+# Function to Enqueue Coalesced Folders
+# ============================
+def enqueue_folder_groups(folder_groups, defer=True):
+    """Build and send one message per (table, folder) group. Returns the folder keys that failed."""
+    # ✅ Steps 2-4: Build every folder's message concurrently (template fetch and spec publish are I/O-bound)
+    build_outcomes = process_records(
+        list(folder_groups.items()),
+        lambda item: build_folder_entry(item[0][0], item[0][1], item[1], defer),
+    )
+
+    # ✅ Step 5: Group the built messages by their table's FIFO queue
+    entries_by_queue = {}
+    sources = {}
+    failed_folders = []
+    for (folder_key, group), entry, error in build_outcomes:
+        if error is not None:
+            printinfo("❌ Failed to build message for %s: %s", folder_key[1], error)
+            failed_folders.append(folder_key)
+            continue
+        if entry is None:
+            continue
+        entry['Id'] = str(len(sources))
+        entries_by_queue.setdefault(build_queue_url(folder_key[0]), []).append(entry)
+        sources[entry['Id']] = (group["s3_bucket"], group["s3_keys"][-1], folder_key)
+
+    # ✅ Step 6: Send Messages to SQS FIFO in batches, one worker per queue
+    send_outcomes = process_records(
+        list(entries_by_queue.items()),
+        lambda item: send_messages_in_batches(*item),
+    )
+    for (queue_url, entries), outcome, error in send_outcomes:
+        sent, failed = outcome if error is None else ({}, {entry['Id']: str(error) for entry in entries})
+        for entry in entries:
+            s3_bucket, s3_key, folder_key = sources[entry['Id']]
+            if entry['Id'] not in sent:
+                release_coalesce_window(*folder_key)
+                failed_folders.append(folder_key)
                 continue
-            if "=" in line:
-                key, value = line.split("=", 1)
-                if "${RAW_BUCKET_NAME_AND_KEY}" in value:
-                    value = value.replace("${RAW_BUCKET_NAME_AND_KEY}", f"{s3_bucket}/{s3_key}")
-                if "${s3_folder_uri}" in value:
-                    value = value.replace("${s3_folder_uri}", s3_folder_uri)
-                flattened_props[key.strip()] = value.strip()
+            printinfo(
+                "📤 Sent event to SQS FIFO: %s", queue_url,
+                bucket=s3_bucket, key=s3_key, group_id=folder_key[0],
+                message_id=sent[entry['Id']], message_bytes=len(entry['MessageBody']),
+            )
+            printdebug("MessageBody: %s", entry['MessageBody'])
+        if failed:
+            printinfo("❌ Failed to send %s of %s message(s) to %s", len(failed), len(entries), queue_url,
+                      errors=sorted(set(failed.values())))
 
-        printdebug(f"🔧 Flattened hoodie-conf: {json.dumps(flattened_props)}")
-        return flattened_props
+    return failed_folders
 
-    except Exception as e:
-        printcritical(f"❌ Failed to load and flatten props file: {e}")
+# ============================
+# Scheduled Flush of Closed Windows
+# ============================
+def flush_coalesce_windows():
+    """Send the follow-up message of every closed window that saw objects after its first one."""
+    now = time.time()
+    due = OrderedDict()
+    for key, pending in state_store.query(COALESCE_PENDING_INDEX):
+        if pending['due_at'] <= now:
+            due.setdefault((pending['target_table'], pending['s3_folder']), []).append((key, pending))
+
+    folder_groups = OrderedDict()
+    for folder_key, items in list(due.items()):
+        newest = max(items, key=lambda entry: entry[1]['due_at'])[1]
+        window = state_store.get(f"coalesce#{folder_key[0]}#{folder_key[1]}")
+        if window is not None and window['claimed_at'] <= newest['window_claimed_at']:
+            # The window expires on whole seconds, so it can outlive due_at by up to one; flush it next time
+            del due[folder_key]
+        elif window is None:
+            folder_groups[folder_key] = {"s3_bucket": newest['s3_bucket'], "s3_keys": [newest['s3_key']]}
+        # A window claimed after this one belongs to a newer event, whose message covers these objects
+    failed_folders = enqueue_folder_groups(folder_groups, defer=False) if folder_groups else []
+
+    # Pending objects of failed folders stay for the next flush
+    for folder_key, items in due.items():
+        if folder_key not in failed_folders:
+            for key, _ in items:
+                state_store.delete(key)
+    printinfo("🧹 Flushed %s closed window(s), %s failed", len(folder_groups), len(failed_folders))
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'flushed': len(folder_groups) - len(failed_folders), 'failed': [folder for _, folder in failed_folders]}),
+    }
 
 # ============================
 # Main Lambda Handler
 # ============================
 def lambda_handler(event, context):
     """Lambda handler triggered by S3 PUT event to update Hudi props and send event to SQS."""
+    # Scheduled flush of closed coalesce windows (EventBridge schedule with a "flush" input)
+    if "flush" in event:
+        return flush_coalesce_windows()
+
     try:
         printinfo("🚀 Received S3 Event")
 
+        # ✅ Step 1: Coalesce records by (table, folder) within this invocation
+        folder_groups = OrderedDict()
         for record in event['Records']:
             s3_bucket = record['s3']['bucket']['name']
             s3_key = record['s3']['object']['key']
-            date_string=s3_key.split(os.path.basename(s3_key))[0].split("/")[-2]
-            printdebug(f"S3 Put Event from: {s3_bucket}/{s3_key}")
+            printdebug("S3 Put Event from: %s/%s", s3_bucket, s3_key)
 
-            # ✅ Step 1: Extract Group ID and Folder Path
             message_group_id = extract_message_group_id(s3_key)
             s3_folder_uri = extract_s3_folder(s3_bucket, s3_key)
+            group = folder_groups.setdefault((message_group_id, s3_folder_uri), {
+                "s3_bucket": s3_bucket,
+                "s3_keys": [],
+            })
+            group["s3_keys"].append(s3_key)
 
-            printdebug(f"Extracted MessageGroupId: {message_group_id}")
-            printdebug(f"Extracted S3 Folder URI: {s3_folder_uri}")
-
-            # ✅ Step 2: Load and flatten Hudi props
-            flattened_props = load_and_flatten_hudi_props(message_group_id, s3_bucket, s3_key, s3_folder_uri)
-            target_table = message_group_id
-            event = {
-                "jar": [
-                    f"s3://{ARTIFACTORY_BUCKET_NAME}/jar/hudi-aws-bundle-0.14.1.jar",
-                    f"s3://{ARTIFACTORY_BUCKET_NAME}/jar/hudi-utilities-slim-bundle_2.12-0.14.1.jar",
-                    f"s3://{ARTIFACTORY_BUCKET_NAME}/jar/hudi-spark3.4-bundle_2.12-0.14.1.jar"
-                ],
-                "spark_submit_parameters": [
-                    "--conf spark.serializer=org.apache.spark.serializer.KryoSerializer",
-                    "--conf spark.sql.extensions=org.apache.spark.sql.hudi.HoodieSparkSessionExtension",
-                    "--conf spark.sql.catalog.spark_catalog=org.apache.spark.sql.hudi.catalog.HoodieCatalog",
-                    "--conf spark.sql.hive.convertMetastoreParquet=false",
-                    "--conf spark.driver.memory=2g",
-                    "--conf spark.executor.memory=3g",
-                    "--conf spark.executor.cores=2",
-                    "--conf spark.executor.instances=1",
-                    "--class org.apache.hudi.utilities.streamer.HoodieStreamer"
-                ],
-                "arguments": {
-                    "table-type": "COPY_ON_WRITE",
-                    "op": "UPSERT",
-                    "enable-sync": True,#False,
-                    "source-ordering-field": "source_timestamp",
-                    "source-class": "org.apache.hudi.utilities.sources.ParquetDFSSource",
-                    "target-table": f"{target_table}",
-                    "target-base-path": f"s3a://{STAGE_BUCKET_NAME}/guay_jocker_db/{target_table}/",
-                    "props": f"s3://{ARTIFACTORY_BUCKET_NAME}/props/templates/empty-streamer.props",
-                    "sync-tool-classes": "org.apache.hudi.aws.sync.AwsGlueCatalogSyncTool",
-                    "hoodie-conf": flattened_props
-                },
-                "job": {
-                    "job_name": f"Hudi_0.14.0_{target_table}_{date_string}",
-                    "created_by": "Kevin Almerco",
-                    "created_at": "2024-03-20",
-                    "ApplicationId": EMR_APPLICATION_ID,
-                    "ExecutionTime": 600,
-                    "JobActive": True,
-                    "JobStatusPolling": True,
-                    "JobDescription": "Ingest data from parquet source (MySQL data)",
-                    "ExecutionArn": EMR_EXECUTION_ROLE_ARN
-                }
-            }
-
-            # ✅ Step 3: Construct and send message with hoodie-conf
-            sqs_message = {
-                "s3_folder": s3_folder_uri,
-                "target_table": message_group_id,
-                "emr_event": event
-            }
+        printinfo("🧮 Coalesced %s record(s) into %s folder(s)", len(event['Records']), len(folder_groups))
 
-            # ✅ Step 3: Send Message to SQS FIFO
-            response = sqs.send_message(
-                QueueUrl=f"{SQS_QUEUE_URL}/sdlf-analytics-{message_group_id}_queue.fifo",
-                MessageBody=json.dumps(sqs_message),
-                MessageGroupId=message_group_id,
-            )
+        # ✅ Steps 2-6: Build and send every folder's message
+        failed_folders = enqueue_folder_groups(folder_groups)
 
-            printinfo(
-                f"📤 Sent event to SQS FIFO: "+f"{SQS_QUEUE_URL}/sdlf-analytics-{message_group_id}_queue.fifo\n"
-                f"MessageBody: {json.dumps(sqs_message)}\n"
-                f"Bucket: {s3_bucket}, Key: {s3_key}\n"
-                f"GroupId: {message_group_id}, MessageId: {response['MessageId']}"
-            )
+    except Exception as e:
+        printcritical("❌ Failed to process S3 event: %s", e)
 
-        return {
-            'statusCode': 200,
-            'body': json.dumps('S3 event successfully sent to SQS FIFO and Hudi props updated.')
-        }
+    # Folders that were sent keep their window claim, so the retried event only enqueues the failed ones
+    if failed_folders:
+        printcritical("❌ Failed to enqueue %s of %s folder(s)", len(failed_folders), len(folder_groups), folders=[folder for _, folder in failed_folders])
 
-    except Exception as e:
-        printcritical(f"❌ Failed to process S3 event: {e}")
+    return {
+        'statusCode': 200,
+        'body': json.dumps('S3 event successfully sent to SQS FIFO and Hudi props updated.')
+    }
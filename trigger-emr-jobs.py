@@ -1,130 +1,413 @@
 import os
 import time
-import uuid
 import json
-import boto3
-import sys
+from collections import OrderedDict
 
-# Logging Helpers
-def printdebug(text):
-    print(f"[DEBUG - line {str(sys._getframe().f_back.f_lineno)}] {text}")
+from pipeline_runtime import (
+    RETRYABLE_STATES,
+    TERMINAL_STATES,
+    batch_item_failures,
+    content_token,
+    create_state_store,
+    drain_backlog,
+    emit_metric,
+    enqueue_job,
+    fifo_message_group,
+    get_config,
+    get_emr_client,
+    get_ledger_entry,
+    hudi_base_path,
+    load_job_spec,
+    measure_input,
+    printcritical,
+    printdebug,
+    printinfo,
+    process_records,
+    record_ledger_entries,
+    record_table_results,
+    render_job_spec,
+    resolve_profile,
+    size_emr_event,
+    streamer_checkpoint,
+    table_is_scheduled,
+    timed,
+    update_job_run_state,
+)
+from pipeline_runtime.maintenance import (
+    ASYNC_SERVICE_CONFS,
+    build_maintenance_event,
+    list_hudi_tables,
+    maintenance_settings,
+    plan_maintenance,
+    table_health,
+)
+from pipeline_runtime.write_profile import profile_emr_event
 
-def printinfo(text):
-    print(f"[INFO - line {str(sys._getframe().f_back.f_lineno)}] {text}")
 
-def printcritical(text):
-    print(f"[CRITICAL ERROR - line {str(sys._getframe().f_back.f_lineno)}] {text}")
-    raise Exception(f"[CRITICAL ERROR - line {str(sys._getframe().f_back.f_lineno)}] {text}")
+# Environment Variables
+config = get_config()
+ARTIFACTORY_BUCKET_NAME = config.artifactory_bucket_name
+STAGE_BUCKET_NAME = config.stage_bucket_name
+SQS_QUEUE_URL = config.sqs_queue_url  # Optional
+EMR_APPLICATION_ID = config.emr_application_id
+EMR_EXECUTION_ROLE_ARN = config.emr_execution_role_arn
 
+# "async" records the run and returns (completion is tracked by reconcile-emr-jobs);
+# "poll" keeps the previous behaviour of waiting in the Lambda for runs it admits that ask for JobStatusPolling
+JOB_TRACKING_MODE = os.getenv('JOB_TRACKING_MODE', 'async')
+
+# Size driver/executors from the input folders; "false" keeps the resources written in the job spec
+SPARK_SIZING_ENABLED = os.getenv('SPARK_SIZING_ENABLED', 'true').lower() == 'true'
+# Pick operation, index and file sizing from the target table; "false" keeps the props template as is
+HUDI_WRITE_PROFILE_ENABLED = os.getenv('HUDI_WRITE_PROFILE_ENABLED', 'true').lower() == 'true'
+# Run clustering and cleaning as scheduled table services instead of inside ingestion runs
+HUDI_MAINTENANCE_ENABLED = os.getenv('HUDI_MAINTENANCE_ENABLED', 'true').lower() == 'true'
+
+state_store = create_state_store()
 
-# Environment Variables
-ARTIFACTORY_BUCKET_NAME = os.environ['ARTIFACTORY_BUCKET_NAME']
-STAGE_BUCKET_NAME = os.environ['STAGE_BUCKET_NAME']
-SQS_QUEUE_URL = os.getenv("SQS_QUEUE_URL")  # Optional
-EMR_APPLICATION_ID = os.environ['EMR_APPLICATION_ID']
-EMR_EXECUTION_ROLE_ARN = os.environ['EMR_EXECUTION_ROLE_ARN']
 
 # ===========================
 # Extract `emr_event` from SQS message
 # ===========================
 def extract_emr_event(sqs_record):
+    """Return the parsed SQS body and the emr_event it describes."""
     try:
         # Step 1: Deserialize outer SQS body
         raw_body = sqs_record['body']
-        printdebug(f"Raw body: {raw_body[:100]}...")  # Trimmed for display
+        printdebug("Raw body: %s...", raw_body[:100])  # Trimmed for display
         parsed_body = json.loads(raw_body)
 
-        # Step 2: Get `emr_event` section
-        emr_event = parsed_body['emr_event']
-        printinfo(f"✅ Extracted emr_event successfully")
+        # Step 2: Resolve the referenced job spec (messages from older senders embed `emr_event`)
+        if 'job_spec' in parsed_body:
+            job_spec = parsed_body['job_spec']
+            spec = load_job_spec(job_spec['id'], job_spec['version'])
+            emr_event = render_job_spec(spec, job_spec.get('overrides', {}))
+        else:
+            emr_event = parsed_body['emr_event']
+        printinfo("✅ Extracted emr_event successfully")
 
-        return emr_event
+        return parsed_body, emr_event
 
     except Exception as e:
-        printcritical(f"❌ Failed to parse emr_event from SQS record: {e}")
+        printcritical("❌ Failed to parse emr_event from SQS record: %s", e)
+
+
+def message_token(target_table, parsed_body, raw_body):
+    """Identify a queued message by its content, so SQS redeliveries and Lambda retries map to the same token."""
+    if 'job_spec' in parsed_body:
+        job_spec = parsed_body['job_spec']
+        # The newest object key tells a later upload to the same folder apart from a redelivery
+        source_object = job_spec.get('overrides', {}).get('RAW_BUCKET_NAME_AND_KEY')
+        return content_token(target_table, parsed_body.get('s3_folder'), job_spec['version'], source_object)
+    return content_token(target_table, raw_body)
+
+
+# ===========================
+# Merge queued messages per table
+# ===========================
+def common_folder(folders):
+    """Deepest folder containing every given folder (the folder itself when there is only one)."""
+    split_folders = [folder.rstrip('/').split('/') for folder in folders]
+    common = []
+    for parts in zip(*split_folders):
+        if len(set(parts)) != 1:
+            break
+        common.append(parts[0])
+    return '/'.join(common) + '/'
+
+def table_source_root(folder):
+    """Table prefix of a queued folder: s3://bucket/<prefix>/<table>/, the table being the key's second folder."""
+    scheme, _, path = folder.partition('://')
+    parts = path.rstrip('/').split('/')
+    # Bucket, first folder and table folder; shallower folders are their own root
+    return f"{scheme}://" + '/'.join(parts[:3]) + '/'
 
+def merge_table_messages(messages):
+    """Merge the queued messages of one table into a single emr_event reading all of their folders.
+
+    ParquetDFSSource lists the source root recursively and only reads files newer than the last
+    commit checkpoint. The checkpoint is kept per table, so a run reading one date folder would move
+    it past files already uploaded to the table's other folders; every run reads the table's prefix.
+    Returns the emr_event, the queued folders and that source root (None without folders).
+    """
+    folders = sorted({message["s3_folder"] for message in messages if message["s3_folder"]})
+    # The newest message carries the latest job spec version and date
+    emr_event = messages[-1]["emr_event"]
+    source_root = None
+    if folders:
+        source_root = common_folder([table_source_root(folder) for folder in folders])
+        hoodie_conf = dict(emr_event.get("arguments", {}).get("hoodie-conf", {}))
+        hoodie_conf["hoodie.streamer.source.dfs.root"] = source_root
+        emr_event = dict(emr_event, arguments=dict(emr_event["arguments"], **{"hoodie-conf": hoodie_conf}))
+        printinfo("🧩 Merged %s message(s) over %s folder(s) into one run reading %s", len(messages), len(folders), source_root)
+    return emr_event, folders, source_root
 
 def check_job_status(client, run_id, applicationId):
-    printdebug(f"Checking job status for run ID: {run_id}")
+    printdebug("Checking job status for run ID: %s", run_id)
     response = client.get_job_run(applicationId=applicationId, jobRunId=run_id)
     return response['jobRun']['state']
 
 
+def build_job_run_request(emr_event, client_token):
+    """Turn an emr_event into the start_job_run request the scheduler submits."""
+    jar = emr_event.get("jar", [])
+    spark_submit_parameters = ' '.join(emr_event.get("spark_submit_parameters", []))
+    spark_submit_parameters = f'--conf spark.jars={",".join(jar)} {spark_submit_parameters}'
+
+    arguments = emr_event.get("arguments", {})
+    job = emr_event.get("job", {})
+
+    JobName = job.get("job_name")
+    ApplicationId = job.get("ApplicationId", EMR_APPLICATION_ID)
+    ExecutionTime = job.get("ExecutionTime")
+    ExecutionArn = job.get("ExecutionArn", EMR_EXECUTION_ROLE_ARN)
+
+    printdebug("Preparing entry point arguments for job: %s", JobName)
+    entryPointArguments = []
+    for key, value in arguments.items():
+        if key == "hoodie-conf":
+            for hoodie_key, hoodie_value in value.items():
+                entryPointArguments.extend(["--hoodie-conf", f"{hoodie_key}={hoodie_value}"])
+        elif isinstance(value, bool):
+            if value:
+                entryPointArguments.append(f"--{key}")
+        else:
+            entryPointArguments.extend([f"--{key}", f"{value}"])
+
+    return {
+        'applicationId': ApplicationId,
+        'clientToken': client_token,
+        'executionRoleArn': ExecutionArn,
+        'jobDriver': {
+            'sparkSubmit': {
+                'entryPoint': "local:///usr/lib/spark/examples/jars/spark-examples.jar",
+                'entryPointArguments': entryPointArguments,
+                'sparkSubmitParameters': spark_submit_parameters
+            },
+        },
+        'executionTimeoutMinutes': 600,
+        'name': JobName
+    }
+
+
+def schedule_table_batch(client, target_table, messages):
+    """Queue one EMR Serverless job covering every queued message of a table in the scheduler's backlog."""
+    # Skip messages whose run is already queued, submitted, running or successful; rerun failed ones
+    pending, retried_run_ids, duplicate_states = [], [], []
+    for message in messages:
+        entry = get_ledger_entry(state_store, message["token"])
+        if entry is None or entry["state"] in RETRYABLE_STATES:
+            pending.append(message)
+            if entry is not None and entry["job_run_id"]:
+                retried_run_ids.append(entry["job_run_id"])
+        else:
+            duplicate_states.append(entry)
+    if duplicate_states:
+        printinfo("⏭️ %s message(s) for %s already covered by a queued or submitted run", len(duplicate_states), target_table,
+                  job_run_ids=sorted({entry["job_run_id"] for entry in duplicate_states if entry["job_run_id"]}))
+    if not pending:
+        return {"jobRunId": duplicate_states[-1]["job_run_id"], "duplicate": True}
+    messages = pending
+
+    emr_event, folders, source_root = merge_table_messages(messages)
+    message_ids = [message["record"].get("messageId") for message in messages]
+    message_tokens = sorted(message["token"] for message in messages)
+
+    profile = resolve_profile(target_table)
+    measured = None
+    if (SPARK_SIZING_ENABLED or HUDI_WRITE_PROFILE_ENABLED) and source_root:
+        with timed('input_sizing'):
+            # What the run will read: the whole source root, past the table's last checkpoint
+            measured = measure_input([source_root], newer_than=streamer_checkpoint(hudi_base_path(target_table)))
+            # The write profile goes first so its Hudi parallelism counts as set when sizing fills in defaults
+            if HUDI_WRITE_PROFILE_ENABLED:
+                emr_event = profile_emr_event(
+                    emr_event, target_table, measured[0],
+                    pending_write=table_is_scheduled(state_store, target_table),
+                    profile=profile.get("write"),
+                )
+            if SPARK_SIZING_ENABLED:
+                emr_event, _ = size_emr_event(emr_event, target_table, [source_root], measured)
+
+    if HUDI_MAINTENANCE_ENABLED:
+        # Cleaning runs as a scheduled table service; a template that sets hoodie.clean.automatic keeps its value
+        arguments = emr_event.get("arguments", {})
+        hoodie_conf = {**ASYNC_SERVICE_CONFS, **arguments.get("hoodie-conf", {})}
+        emr_event = dict(emr_event, arguments=dict(arguments, **{"hoodie-conf": hoodie_conf}))
+
+    # Same messages, same token: a retried submission returns the existing run
+    request = build_job_run_request(emr_event, content_token(target_table, message_tokens, sorted(retried_run_ids)))
+    arguments = emr_event.get("arguments", {})
+    job = emr_event.get("job", {})
+
+    enqueue_job(
+        state_store, target_table, request,
+        priority=profile["priority"],
+        stream={"arguments": arguments},
+        multi_table=profile["multi_table"],
+        job_name=request['name'],
+        s3_folders=folders,
+        message_ids=message_ids,
+        message_tokens=message_tokens,
+        input_bytes=measured[0] if measured else None,
+        input_files=measured[1] if measured else None,
+        job_status_polling=job.get("JobStatusPolling") is True,
+    )
+    record_ledger_entries(state_store, message_tokens, None, 'QUEUED')
+    return {"jobRunId": None, "duplicate": False}
+
+
+def schedule_table_maintenance(target_table):
+    """Queue the clustering or cleaning run a table's timeline calls for, if any."""
+    # Ingestion queued or in flight owns the table; its files are checked again on the next schedule
+    if table_is_scheduled(state_store, target_table):
+        printdebug("Skipping maintenance for %s: a run is queued or in flight", target_table)
+        return None
+
+    profile = resolve_profile(target_table)
+    settings = maintenance_settings(profile)
+    base_path = hudi_base_path(target_table)
+    with timed('table_health'):
+        health = table_health(base_path)
+    job_type, target_file_bytes = plan_maintenance(health, settings)
+    if job_type is None:
+        printdebug("No maintenance due for %s", target_table, health={k: v for k, v in health.items() if k != 'sizes'})
+        return None
+
+    emr_event = build_maintenance_event(target_table, base_path, job_type, health, settings, target_file_bytes, profile)
+    # The newest instant changes with every write, so a plan is queued once per timeline state
+    request = build_job_run_request(emr_event, content_token('maintenance', target_table, job_type, health['latest_instant']))
+    enqueue_job(
+        state_store, target_table, request,
+        priority=settings["priority"],
+        job_name=request['name'],
+        job_type=job_type,
+        latest_instant=health['latest_instant'],
+    )
+    emit_metric('MaintenanceQueued', 1, unit='Count', JobType=job_type)
+    return job_type
+
+
+def run_maintenance(client, maintenance):
+    """Check every table (or the ones the schedule names) and queue the table services they need."""
+    if not HUDI_MAINTENANCE_ENABLED:
+        printinfo("Maintenance is disabled (HUDI_MAINTENANCE_ENABLED=false), skipping")
+        return {"statusCode": 200, "body": json.dumps({"maintenance": {}, "admitted": []})}
+    tables = maintenance.get("tables") or list_hudi_tables()
+    outcomes = process_records(tables, schedule_table_maintenance)
+    queued = {}
+    for target_table, job_type, error in outcomes:
+        if error is not None:
+            printinfo("❌ Maintenance check failed for %s: %s", target_table, error)
+        elif job_type:
+            queued[target_table] = job_type
+    printinfo("🧹 Checked %s table(s), queued maintenance for %s", len(tables), len(queued), queued=queued)
+    with timed('emr_submit'):
+        admitted = drain_backlog(state_store, client)
+    return {
+        "statusCode": 200,
+        "body": json.dumps({
+            "maintenance": queued,
+            "admitted": [{"target_table": run.get("target_table") or run.get("target_tables"), "jobRunId": run["job_run_id"]} for run in admitted],
+        }),
+    }
+
+
+def poll_job_run(client, run):
+    """Wait in the Lambda until an admitted run reaches a terminal state (JOB_TRACKING_MODE=poll)."""
+    run_id = run['job_run_id']
+    with timed('emr_poll'):
+        polling_interval = 5
+        printdebug("Polling job status...")
+        while True:
+            status = check_job_status(client, run_id, run['application_id'])
+            printinfo("Job status: %s", status, job_run_id=run_id)
+            if status in TERMINAL_STATES:
+                item, changed = update_job_run_state(state_store, run_id, status)
+                if changed and item.get('tables'):
+                    record_table_results(state_store, item, status)
+                return status
+            time.sleep(polling_interval)
+
+
 def lambda_handler(event, context):
     try:
         printinfo("Lambda handler invoked")
-        printdebug(f"Received event without json.dumps: {event}")
-        printdebug(f"Received event: {json.dumps(event)}")
-
-        client = boto3.client("emr-serverless",
-                              aws_access_key_id=os.getenv("DEV_ACCESS_KEY"),
-                              aws_secret_access_key=os.getenv("DEV_SECRET_KEY"),
-                              region_name=os.getenv("DEV_REGION"))
-
-        for record in event.get("Records", []):
-            emr_event = extract_emr_event(record)
-            printdebug(f"Received emr_event: {json.dumps(emr_event)}")
-
-            jar = emr_event.get("jar", [])
-            spark_submit_parameters = ' '.join(emr_event.get("spark_submit_parameters", []))
-            spark_submit_parameters = f'--conf spark.jars={",".join(jar)} {spark_submit_parameters}'
-
-            arguments = emr_event.get("arguments", {})
-            job = emr_event.get("job", {})
-
-            JobName = job.get("job_name")
-            ApplicationId = job.get("ApplicationId", EMR_APPLICATION_ID)
-            ExecutionTime = job.get("ExecutionTime")
-            ExecutionArn = job.get("ExecutionArn", EMR_EXECUTION_ROLE_ARN)
-
-            printdebug(f"Preparing entry point arguments for job: {JobName}")
-            entryPointArguments = []
-            for key, value in arguments.items():
-                if key == "hoodie-conf":
-                    for hoodie_key, hoodie_value in value.items():
-                        entryPointArguments.extend(["--hoodie-conf", f"{hoodie_key}={hoodie_value}"])
-                elif isinstance(value, bool):
-                    if value:
-                        entryPointArguments.append(f"--{key}")
-                else:
-                    entryPointArguments.extend([f"--{key}", f"{value}"])
-
-            printinfo(f"Submitting job: {JobName}")
-            response = client.start_job_run(
-                applicationId=ApplicationId,
-                clientToken=str(uuid.uuid4()),
-                executionRoleArn=ExecutionArn,
-                jobDriver={
-                    'sparkSubmit': {
-                        'entryPoint': "local:///usr/lib/spark/examples/jars/spark-examples.jar",
-                        'entryPointArguments': entryPointArguments,
-                        'sparkSubmitParameters': spark_submit_parameters
-                    },
-                },
-                executionTimeoutMinutes=600,
-                name=JobName
-            )
-
-            run_id = response['jobRunId']
-            printinfo(f"Job submitted with run ID: {run_id}")
-
-            if job.get("JobStatusPolling") is True:
-                polling_interval = 5
-                printdebug("Polling job status...")
-                while True:
-                    status = check_job_status(client, run_id, ApplicationId)
-                    printinfo(f"Job status: {status}")
-                    if status in ["CANCELLED", "FAILED", "SUCCESS"]:
-                        break
-                    time.sleep(polling_interval)
-
-            return {
-                "statusCode": 200,
-                "body": json.dumps(response)
-            }
+        printdebug("Received event", event=event)
+
+        client = get_emr_client()
+
+        # Scheduled table services (EventBridge schedule with a "maintenance" input)
+        if "maintenance" in event:
+            return run_maintenance(client, event["maintenance"] or {})
+
+        # Step 1: Parse every message (job specs resolve concurrently through the shared cache)
+        records = event.get("Records", [])
+        parse_outcomes = process_records(records, extract_emr_event)
+
+        record_outcomes = []
+        messages_by_table = OrderedDict()
+        for record, parsed, error in parse_outcomes:
+            if error is not None:
+                record_outcomes.append((record, None, error))
+                continue
+            parsed_body, emr_event = parsed
+            target_table = parsed_body.get("target_table") or emr_event.get("arguments", {}).get("target-table")
+            messages_by_table.setdefault(target_table, []).append({
+                "record": record,
+                "s3_folder": parsed_body.get("s3_folder"),
+                "emr_event": emr_event,
+                "token": message_token(target_table, parsed_body, record["body"]),
+            })
+
+        # Step 2: One HoodieStreamer run per table goes into the backlog; each message is acknowledged
+        # once its table's run is queued, or failed with it
+        schedule_outcomes = process_records(
+            list(messages_by_table.items()),
+            lambda item: schedule_table_batch(client, *item),
+        )
+
+        scheduled = []
+        for (target_table, messages), response, error in schedule_outcomes:
+            if error is not None:
+                printinfo("❌ Failed to queue job for table %s (%s message(s)): %s", target_table, len(messages), error)
+            else:
+                scheduled.append({
+                    "target_table": target_table,
+                    "jobRunId": response['jobRunId'],
+                    "duplicate": response.get("duplicate", False),
+                    "messageIds": [message["record"].get("messageId") for message in messages],
+                })
+            record_outcomes.extend((message["record"], response, error) for message in messages)
+
+        for record, _, error in record_outcomes:
+            if error is not None:
+                printinfo("❌ Message %s will be retried: %s", record.get('messageId'), error)
+
+        # Step 3: Admit whatever the application has capacity for, across every table's backlog
+        with timed('emr_submit'):
+            admitted = drain_backlog(state_store, client)
+        if JOB_TRACKING_MODE == "poll":
+            for run in admitted:
+                if run.get("job_status_polling"):
+                    poll_job_run(client, run)
+
+        # Back in delivery order, so a failure also fails the later messages of its FIFO group
+        delivery_order = {id(record): index for index, record in enumerate(records)}
+        record_outcomes.sort(key=lambda outcome: delivery_order[id(outcome[0])])
+        failures = batch_item_failures(record_outcomes, message_group=fifo_message_group)
+        printinfo("Queued %s job(s) for %s record(s), admitted %s, %s record(s) failed", len(scheduled), len(records), len(admitted), len(failures['batchItemFailures']))
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "scheduled": scheduled,
+                "admitted": [{"target_table": run.get("target_table") or run.get("target_tables"), "jobRunId": run["job_run_id"]} for run in admitted],
+            }),
+            **failures
+        }
 
     except Exception as e:
-        printcritical(f"An error occurred during job execution: {e}")
+        printcritical("An error occurred during job execution: %s", e)
         return {
             "statusCode": 500,
             "body": json.dumps({"error": str(e)})